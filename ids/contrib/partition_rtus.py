@@ -0,0 +1,34 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "implementation"))
+from ids_lib.util.partition import partition_rtus, shared_power_lines
+
+
+# Splits the RTUs of a grid into partitions for a federation of c2s.
+# Each partition is managed by one regional c2; its LMs have to be started with IDS_C2_ADDRESS pointing to that c2.
+# Example: python3 partition_rtus.py 2 development_configs/rtu_0.json development_configs/rtu_1.json
+def main():
+    parser = argparse.ArgumentParser(description="Partition RTUs by shared power lines")
+    parser.add_argument("regions", type=int, help="number of regional c2s")
+    parser.add_argument("rtu_configs", nargs="+", help="RTU config files as used by the LMs")
+    args = parser.parse_args()
+
+    configs = []
+    for path in args.rtu_configs:
+        with open(path) as f:
+            configs.append({'id': path, 'config': f.read()})
+
+    partitions = partition_rtus(configs, args.regions)
+
+    # Count the power lines that are shared across partitions and thus handled via the parent c2
+    partition_of = {rtu_id: i for i, partition in enumerate(partitions) for rtu_id in partition}
+    cross = sum(weight for (a, b), weight in shared_power_lines(configs).items() if partition_of[a] != partition_of[b])
+
+    print(json.dumps({"partitions": partitions, "cross_partition_power_lines": cross}, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,7 @@ from pymodbus3.constants import Endian
 from pymodbus3.payload import BinaryPayloadDecoder
 from pymodbus3.payload import BinaryPayloadBuilder
 from time import sleep
+import os
 #---------------------------------------------------------------------------# 
 # configure the client logging
 #---------------------------------------------------------------------------# 
@@ -17,7 +18,8 @@ log = logging.getLogger()
 log.setLevel(logging.DEBUG)
 
 #---------------------------------------------------------------------------# 
-client = ModbusClient('192.168.33.1', port=10502)
+# IDS_RTU_HOST / IDS_RTU_PORT are set by sweep.py for each run
+client = ModbusClient(os.getenv('IDS_RTU_HOST', '192.168.33.1'), port=int(os.getenv('IDS_RTU_PORT', 10502)))
 client.connect()
 
 #---------------------------------------------------------------------------#
@@ -4,6 +4,7 @@ This module contains the model types for PYPOWER (:class:`Bus`,
 
 """
 from __future__ import division
+import collections
 import json
 import math
 import os.path
@@ -42,6 +43,14 @@ DEFAULT_SHEETS = {
 }
 
 
+def open_case(path):
+    """Parse the JSON case at *path*. Only JSON cases support switch states.
+    """
+    if os.path.splitext(path)[-1] != '.json':
+        return None
+    return JSON.open(path)
+
+
 def load_case(path, grid_idx, sheetnames):
     """Load the case from *path* and create a PYPOWER case and an entity map.
     """
@@ -99,84 +108,234 @@ def perform_powerflow(case):
     return res[0]
 
 
-def get_cache_entries(cases, entity_map):
-    cache = {}
-    for eid, attrs in entity_map.items():
-        case = case_for_eid(eid, cases)
-        etype = attrs['etype']
-        idx = attrs['idx']
-        data = {}
+class PowerFlow(object):
+    """Solves the power flow of one case step after step.
 
-        if case['success']:
-            if etype == 'RefBus':
-                gen = case['gen'][idx]
-                bus = case['bus'][idx]
-                data['P'] = gen[idx_gen.PG] * BUS_PQ_FACTOR
-                data['Q'] = gen[idx_gen.QG] * BUS_PQ_FACTOR
-                data['Vm'] = bus[idx_bus.VM] * attrs['static']['Vl']
-                data['Va'] = bus[idx_bus.VA]
-            elif etype == 'PQBus':
-                bus = case['bus'][idx]
-                data['P'] = bus[idx_bus.PD] * BUS_PQ_FACTOR
-                data['Q'] = bus[idx_bus.QD] * BUS_PQ_FACTOR
-                data['Vm'] = bus[idx_bus.VM] * attrs['static']['Vl']
-                data['Va'] = bus[idx_bus.VA]
-            elif etype == 'None':
-                bus = case['bus'][idx]
-                data['P'] = 0
-                data['Q'] = 0
-                data['Vm'] = 0
-                data['Va'] = 0
-            # elif etype == 'Grid':
-            #     print("Found it")
-            #     print(eid)
-            #     print(attrs)
-            # data['newgrid'] =
-            # TODO: elif etype is 'ZERO' ...
-            elif etype in ('Branch', 'Transformer'):
-                branch = case['branch'][idx]
-
-                # Compute complex current for branches
-                if etype == 'Branch':
-                    fbus = case['bus'][int(branch[idx_brch.F_BUS])]
-                    tbus = case['bus'][int(branch[idx_brch.T_BUS])]
-                    fbus_v = fbus[idx_bus.VM]
-                    tbus_v = tbus[idx_bus.VM]
-                    base_kv = fbus[idx_bus.BASE_KV]
-
-                    # Use side with higher voltage to calculate I
-                    if fbus_v >= tbus_v:
-                        ir = branch[idx_brch.PF] / fbus_v
-                        ii = branch[idx_brch.QF] / fbus_v
-                    else:
-                        ir = branch[idx_brch.PT] / tbus_v
-                        ii = branch[idx_brch.QT] / tbus_v
+    With *warm_start*, each solve starts from the voltage magnitudes and
+    angles of the previous converged solution instead of a flat start.
+    With a *cache_size* > 0, results are memoised in an LRU cache keyed by
+    the topology (bus types, branch status and taps) and the injections
+    quantised to *quantum* [MW|MVAr].
 
-                    # ir/ii are in [MVA]; [MVA] * 1000 / [kV] = [A]
-                    data['I_real'] = ir * 1000 / base_kv
-                    data['I_imag'] = ii * 1000 / base_kv
+    """
+    def __init__(self, warm_start=True, cache_size=0, quantum=1e-6):
+        self.warm_start = warm_start
+        self.cache_size = cache_size
+        self.quantum = quantum
+        self.hits = 0
+        self.misses = 0
+        self.__cache = collections.OrderedDict()
+        self.__last = None  # (VM, VA) of the last converged solution
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def solve(self, case):
+        key = None
+        if self.cache_size > 0:
+            key = self.__key(case)
+            res = self.__cache.get(key)
+            if res is not None:
+                self.__cache.move_to_end(key)
+                self.hits += 1
+                self.__remember(res)
+                return res
+            self.misses += 1
+
+        if self.warm_start:
+            self.__seed(case)
+        res = perform_powerflow(case)
+        self.__remember(res)
+
+        if key is not None:
+            self.__cache[key] = res
+            if len(self.__cache) > self.cache_size:
+                self.__cache.popitem(last=False)
+        return res
 
-                data['P_from'] = branch[idx_brch.PF] * BRANCH_PQ_FACTOR
-                data['Q_from'] = branch[idx_brch.QF] * BRANCH_PQ_FACTOR
-                data['P_to'] = branch[idx_brch.PT] * BRANCH_PQ_FACTOR
-                data['Q_to'] = branch[idx_brch.QT] * BRANCH_PQ_FACTOR
+    def __remember(self, res):
+        if res['success']:
+            self.__last = (res['bus'][:, idx_bus.VM].copy(),
+                           res['bus'][:, idx_bus.VA].copy())
         else:
-            # Failed to converge.
+            self.__last = None
+
+    def __seed(self, case):
+        bus = case['bus']
+        if self.__last is None or len(self.__last[0]) != len(bus):
+            bus[:, idx_bus.VM] = 1
+            bus[:, idx_bus.VA] = 0
+            return
+        vm, va = self.__last
+        # Buses that were isolated in the last solution (no voltage) or are
+        # isolated now start flat
+        seeded = (vm > 0) & (bus[:, idx_bus.BUS_TYPE] != idx_bus.NONE)
+        bus[:, idx_bus.VM] = numpy.where(seeded, vm, 1)
+        bus[:, idx_bus.VA] = numpy.where(seeded, va, 0)
+
+    def __key(self, case):
+        bus = case['bus']
+        branch = case['branch']
+        injections = numpy.round(
+            bus[:, [idx_bus.PD, idx_bus.QD]] / self.quantum).astype(numpy.int64)
+        return (bus[:, idx_bus.BUS_TYPE].tobytes(),
+                branch[:, [idx_brch.BR_STATUS, idx_brch.TAP]].tobytes(),
+                injections.tobytes())
+
+
+BUS_ATTRS = ('P', 'Q', 'Vm', 'Va')
+BRANCH_ATTRS = ('I_real', 'I_imag', 'P_from', 'Q_from', 'P_to', 'Q_to')
+TRAFO_ATTRS = ('P_from', 'Q_from', 'P_to', 'Q_to')
+
+
+class ResultIndex(object):
+    """Index arrays of the buses, branches and transformers of each grid in
+    *entity_map*, used to extract the results of all entities of one type
+    with a few numpy operations.
+
+    The etype of buses changes with the switch states, the bus type column
+    of the case is kept in sync by :func:`apply_switch_states` and is used
+    instead, so the index only has to be rebuilt if entities are added.
+
+    """
+    def __init__(self, entity_map):
+        self.entities = {}  # eid -> (grid_idx, kind, position)
+        self.grids = {}  # grid_idx -> kind -> index arrays
+        rows = {}
+        for eid, attrs in entity_map.items():
+            etype = attrs['etype']
             if etype in ('RefBus', 'PQBus', 'None'):
-                data['P'] = float('nan')
-                data['Q'] = float('nan')
-                data['Vm'] = float('nan')
-                data['Va'] = float('nan')
+                kind = 'bus'
             elif etype in ('Branch', 'Transformer'):
-                data['P_from'] = float('nan')
-                data['Q_from'] = float('nan')
-                data['P_to'] = float('nan')
-                data['Q_to'] = float('nan')
-                data['I_real'] = float('nan') # Added Stysia
-                data['I_imag'] = float('nan') # Added Stysia
+                kind = etype
+            else:
+                continue
+            grid_idx = int(eid.split('-')[0])
+            grid = rows.setdefault(grid_idx, {
+                'bus': [], 'Vl': [], 'ref': [], 'Branch': [], 'Transformer': []})
+            self.entities[eid] = (grid_idx, kind, len(grid[kind]))
+            grid[kind].append(attrs['idx'])
+            if kind == 'bus':
+                grid['Vl'].append(attrs['static']['Vl'])
+                grid['ref'].append(etype == 'RefBus')
+
+        for grid_idx, grid in rows.items():
+            self.grids[grid_idx] = {
+                'bus': numpy.array(grid['bus'], dtype=int),
+                'Vl': numpy.array(grid['Vl'], dtype=float),
+                'ref': numpy.array(grid['ref'], dtype=bool),
+                'Branch': numpy.array(grid['Branch'], dtype=int),
+                'Transformer': numpy.array(grid['Transformer'], dtype=int),
+            }
+
+
+class CacheEntries(object):
+    """The results of one step as arrays per grid and entity kind. The
+    values of single entities are only looked up when they are requested.
+
+    """
+    def __init__(self, index, grids):
+        self._index = index
+        self._grids = grids  # grid_idx -> kind -> attr -> array
+
+    def value(self, eid, attr):
+        """Return the value of *attr* of entity *eid*, raise a
+        :exc:`KeyError` if the entity has no such result.
+
+        """
+        grid_idx, kind, position = self._index.entities[eid]
+        return self._grids[grid_idx][kind][attr][position]
+
+    def __getitem__(self, eid):
+        grid_idx, kind, position = self._index.entities[eid]
+        return {attr: values[position]
+                for attr, values in self._grids[grid_idx][kind].items()}
+
+
+def get_cache_entries(cases, entity_map, index=None):
+    """Extract the results of the power flows *cases* for all entities of
+    *entity_map*. *index* is the :class:`ResultIndex` of *entity_map*, it
+    is built if not given.
+
+    """
+    if index is None:
+        index = ResultIndex(entity_map)
+    grids = {}
+    for grid_idx, rows in index.grids.items():
+        case = cases[grid_idx]
+        if case['success']:
+            grids[grid_idx] = {
+                'bus': _bus_results(case, rows),
+                'Branch': _branch_results(case, rows['Branch'], True),
+                'Transformer': _branch_results(case, rows['Transformer'],
+                                               False),
+            }
+        else:
+            # Failed to converge.
+            grids[grid_idx] = {
+                'bus': _nan_results(BUS_ATTRS, len(rows['bus'])),
+                'Branch': _nan_results(BRANCH_ATTRS, len(rows['Branch'])),
+                'Transformer': _nan_results(BRANCH_ATTRS,
+                                            len(rows['Transformer'])),
+            }
+    return CacheEntries(index, grids)
+
+
+def _bus_results(case, rows):
+    idx = rows['bus']
+    bus = case['bus'][idx]
+    p = bus[:, idx_bus.PD] * BUS_PQ_FACTOR
+    q = bus[:, idx_bus.QD] * BUS_PQ_FACTOR
+    vm = bus[:, idx_bus.VM] * rows['Vl']
+    va = bus[:, idx_bus.VA].copy()
+
+    # The generator of the reference bus has the same index as the bus
+    ref = rows['ref']
+    gen = case['gen'][idx[ref]]
+    p[ref] = gen[:, idx_gen.PG] * BUS_PQ_FACTOR
+    q[ref] = gen[:, idx_gen.QG] * BUS_PQ_FACTOR
+
+    # Buses of etype 'None'
+    none = bus[:, idx_bus.BUS_TYPE] == idx_bus.NONE
+    for values in (p, q, vm, va):
+        values[none] = 0
+    return {'P': p, 'Q': q, 'Vm': vm, 'Va': va}
+
+
+def _branch_results(case, idx, currents):
+    branch = case['branch'][idx]
+    data = {
+        'P_from': branch[:, idx_brch.PF] * BRANCH_PQ_FACTOR,
+        'Q_from': branch[:, idx_brch.QF] * BRANCH_PQ_FACTOR,
+        'P_to': branch[:, idx_brch.PT] * BRANCH_PQ_FACTOR,
+        'Q_to': branch[:, idx_brch.QT] * BRANCH_PQ_FACTOR,
+    }
+    if currents:
+        # Compute complex current for branches
+        fbus = case['bus'][branch[:, idx_brch.F_BUS].astype(int)]
+        tbus = case['bus'][branch[:, idx_brch.T_BUS].astype(int)]
+        fbus_v = fbus[:, idx_bus.VM]
+        tbus_v = tbus[:, idx_bus.VM]
+        base_kv = fbus[:, idx_bus.BASE_KV]
+
+        # Use side with higher voltage to calculate I
+        from_side = fbus_v >= tbus_v
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            ir = numpy.where(from_side, branch[:, idx_brch.PF] / fbus_v,
+                             branch[:, idx_brch.PT] / tbus_v)
+            ii = numpy.where(from_side, branch[:, idx_brch.QF] / fbus_v,
+                             branch[:, idx_brch.QT] / tbus_v)
+
+        # ir/ii are in [MVA]; [MVA] * 1000 / [kV] = [A]
+        data['I_real'] = ir * 1000 / base_kv
+        data['I_imag'] = ii * 1000 / base_kv
+    return data
 
-        cache[eid] = data
-    return cache
+
+def _nan_results(attrs, n):
+    return {attr: numpy.full(n, float('nan')) for attr in attrs}
 
 
 def make_eid(name, grid_idx):
@@ -433,62 +592,194 @@ class Excel:
 TOPOLOGY related classes and functions
 """
 # rtu_info is a dict of the branch name and "True" or "False" indicator, e.g. {"branch_1: 1. branch_16: 0"}
+# (the tap turn for transformers)
 
-def topology_refresh(ref_topology, rtu_info=""):
-    if rtu_info:
-        with open(ref_topology) as ref_topology_file:
-            data = json.load(ref_topology_file)
-        for branch in rtu_info.keys():
-            for b in data['branch']:
-                if branch in b:
-                    if b[-1] != rtu_info[branch]:
-                        b[-1] = rtu_info[branch]
-            for t in data['trafo']:
-                if branch in t:
-                    if t[-1] != rtu_info[branch]:
-                        t[-1] = rtu_info[branch]
-    conn = connected_buses(data, 'tr_pri')
-    for n in data['bus']:
-        if n[0] not in conn:
-            if n[1] != 'NONE':
-                n[1] = 'NONE'
-        else:
-            if n[1] == 'NONE':
-                n[1] = 'PQ'
+def apply_switch_states(case, raw_case, entity_map, grid_idx, rtu_info,
+                        connectivity=None):
+    """Apply the switch states *rtu_info* in place to the parsed JSON case
+    *raw_case*, the PYPOWER *case* and the *entity_map* of grid *grid_idx*.
+
+    The last entry of a branch row is its online flag, the last entry of a
+    transformer row is its tap turn. Buses that are no longer connected to
+    the reference bus become type NONE, reconnected buses become PQ again.
+    The entity set does not change, only the etype of buses and the static
+    data of branches. *connectivity* is an optional :class:`Connectivity`
+    of *raw_case* that is updated incrementally instead of searching the
+    whole grid. Returns True if anything changed.
+
+    """
+    changed = False
+    for rows in (raw_case['branch'], raw_case['trafo']):
+        for row in rows:
+            if row[0] not in rtu_info or row[-1] == rtu_info[row[0]]:
+                continue
+            row[-1] = rtu_info[row[0]]
+            changed = True
+            if connectivity is not None:
+                connectivity.set_online(row[0], row[-1])
 
-    with open('data/demo_mv_grid.json', 'w+') as outfile:
-        json.dump(data, outfile, sort_keys=True, indent=4)
-    newtopology = 'data/demo_mv_grid.json'
-    return newtopology
+            attrs = entity_map.get(make_eid(row[0], grid_idx))
+            if attrs is None:
+                continue
+            branch = case['branch'][attrs['idx']]
+            if attrs['etype'] == 'Transformer':
+                attrs['static']['tap_turn'] = row[-1]
+                branch[idx_brch.TAP] = 1.0 / attrs['static']['taps'][row[-1]]
+            else:
+                attrs['static']['online'] = bool(row[-1])
+                branch[idx_brch.BR_STATUS] = int(row[-1])
+
+    if not changed:
+        return False
+
+    if connectivity is None:
+        connectivity = Connectivity(raw_case, 'tr_pri')
+    for n in raw_case['bus']:
+        if not connectivity.is_connected(n[0]):
+            if n[1] == 'NONE':
+                continue
+            n[1] = 'NONE'
+            etype = 'None'
+        else:
+            if n[1] != 'NONE':
+                continue
+            n[1] = 'PQ'
+            etype = 'PQBus'
+        attrs = entity_map[make_eid(n[0], grid_idx)]
+        attrs['etype'] = etype
+        case['bus'][attrs['idx']][idx_bus.BUS_TYPE] = getattr(idx_bus, n[1])
+    return True
 
 
 def connected_buses(json_data, init_bus='tr_pri'):
-    g = Graph()
-    g.clear()  # create a new graph each time because we add edges if they exist.
-    connected_nodes = []
-    nodes = {}
-    for node in json_data['bus']:
-        node_name = node[0]
-        nodes[node_name] = g.add_vertex(node_name)
-    branches = {}
-    for branch in json_data['branch']:
-        branch_name = branch[0]
-        if branch[-1]:
-            branches[branch_name] = g.add_edge((branch[1], branch[2]))
-    for branch in json_data['trafo']:
-        branch_name = branch[0]
-        branches[branch_name] = g.add_edge((branch[1], branch[2]))
-    connected_nodes = []
-    for node in json_data['bus']:
-        if g.find_path(init_bus, node[0]) is not None:
-            connected_nodes.append(node[0])
-    return connected_nodes
+    """Return the buses (in file order) that are connected to *init_bus*
+    through online branches and transformers. One BFS, O(V+E).
+    """
+    return Connectivity(json_data, init_bus).connected_buses()
+
+
+class Connectivity(object):
+    """The set of buses connected to *init_bus*, kept up to date while
+    branches are switched.
+
+    Closing a branch only searches the buses that become connected through
+    it. Opening a branch only searches if both of its buses were connected
+    and no parallel branch remains between them, and then stops at the
+    first alternative path or at the smaller part of the split grid.
+
+    """
+    def __init__(self, json_data, init_bus='tr_pri'):
+        self.init_bus = init_bus
+        self.__buses = [node[0] for node in json_data['bus']]
+        # bus -> {neighbour: number of online branches between them}
+        self.__adjacency = {bus: {} for bus in self.__buses}
+        self.__branches = {}  # branch id -> (bus, bus, online)
+        for branch in json_data['branch']:
+            online = bool(branch[-1])
+            self.__branches[branch[0]] = (branch[1], branch[2], online)
+            if online:
+                self.__link(branch[1], branch[2], 1)
+        # Transformers are always online
+        for branch in json_data['trafo']:
+            self.__link(branch[1], branch[2], 1)
+        self.__connected = self.__search([init_bus], set())
+
+    def connected_buses(self):
+        """Return the connected buses in file order."""
+        return [bus for bus in self.__buses if bus in self.__connected]
+
+    def is_connected(self, bus):
+        return bus in self.__connected
+
+    def set_online(self, branch_id, online):
+        """Switch the branch *branch_id*. Unknown ids (e.g. transformers) are
+        ignored.
+        """
+        if branch_id not in self.__branches:
+            return
+        bus1, bus2, was_online = self.__branches[branch_id]
+        online = bool(online)
+        if online == was_online:
+            return
+        self.__branches[branch_id] = (bus1, bus2, online)
+
+        if online:
+            self.__link(bus1, bus2, 1)
+            # Only a branch from a connected to an unconnected bus connects
+            # new buses
+            if (bus1 in self.__connected) != (bus2 in self.__connected):
+                start = bus2 if bus1 in self.__connected else bus1
+                self.__connected = self.__search([start], self.__connected)
+        else:
+            self.__link(bus1, bus2, -1)
+            if bus1 in self.__connected and bus2 in self.__connected and \
+                    bus2 not in self.__adjacency[bus1]:
+                self.__cut(bus1, bus2)
+
+    def __cut(self, bus1, bus2):
+        """Update the connected buses after the last branch between the two
+        connected buses *bus1* and *bus2* was opened.
+
+        Searches from both buses in lockstep. If one search reaches the other
+        bus, nothing changed. Otherwise the search that finishes first has
+        found one of the two parts of the split component (usually the
+        smaller one).
+        """
+        searches = [self.__walk(bus1, bus2), self.__walk(bus2, bus1)]
+        while True:
+            for search in searches:
+                result = next(search)
+                if result is True:
+                    return  # Still connected through another path
+                if result is not None:
+                    if self.init_bus in result:
+                        self.__connected &= result
+                    else:
+                        self.__connected -= result
+                    return
+
+    def __walk(self, start, target):
+        """BFS generator yielding None per step, True if *target* is reached
+        or the set of visited buses when the search is exhausted.
+        """
+        visited = {start}
+        queue = collections.deque([start])
+        while queue:
+            bus = queue.popleft()
+            for neighbour in self.__adjacency.get(bus, ()):
+                if neighbour == target:
+                    yield True
+                if neighbour not in visited:
+                    visited.add(neighbour)
+                    queue.append(neighbour)
+            yield None
+        yield visited
+
+    def __link(self, bus1, bus2, count):
+        for a, b in ((bus1, bus2), (bus2, bus1)):
+            neighbours = self.__adjacency.setdefault(a, {})
+            neighbours[b] = neighbours.get(b, 0) + count
+            if neighbours[b] <= 0:
+                del neighbours[b]
+
+    def __search(self, start, connected):
+        """BFS from *start*, extending the set *connected* (not modified)."""
+        connected = set(connected)
+        connected.update(start)
+        queue = collections.deque(start)
+        while queue:
+            bus = queue.popleft()
+            for neighbour in self.__adjacency.get(bus, ()):
+                if neighbour not in connected:
+                    connected.add(neighbour)
+                    queue.append(neighbour)
+        return connected
 
 
 class Graph(object):
-    def __init__(self, graph_dict={}):
+    def __init__(self, graph_dict=None):
         """ initializes a graph object """
-        self.__graph_dict = graph_dict
+        self.__graph_dict = graph_dict if graph_dict is not None else {}
 
     def vertices(self):
         """ returns the vertices of a graph """
@@ -526,22 +817,26 @@ class Graph(object):
             else:
                 self.__graph_dict[vertex2] = [vertex1]
 
-    def find_path(self, start_vertex, end_vertex, path=None):
+    def find_path(self, start_vertex, end_vertex):
         """ find a path from start_vertex to end_vertex
-            in graph """
-        if path == None:
-            path = []
+            in graph (breadth first, the path is a shortest one) """
         graph = self.__graph_dict
-        path.append(start_vertex)
         if start_vertex == end_vertex:
-            return path
-        if start_vertex not in graph:
-            return None
-        for vertex in graph[start_vertex]:
-            if vertex not in path:
-                extended_path = self.find_path(vertex, end_vertex, path)
-                if extended_path:
-                    return extended_path
+            return [start_vertex]
+        parents = {start_vertex: None}
+        queue = collections.deque([start_vertex])
+        while queue:
+            vertex = queue.popleft()
+            for neighbour in graph.get(vertex, ()):
+                if neighbour in parents:
+                    continue
+                parents[neighbour] = vertex
+                if neighbour == end_vertex:
+                    path = [neighbour]
+                    while parents[path[-1]] is not None:
+                        path.append(parents[path[-1]])
+                    return path[::-1]
+                queue.append(neighbour)
         return None
 
     def __generate_edges(self):
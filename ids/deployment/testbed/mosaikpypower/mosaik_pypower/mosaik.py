@@ -129,10 +129,18 @@ class PyPower(mosaik_api.Simulator):
         self._entities = {}
         self._relations = []  # List of pair-wise related entities (IDs)
         self._ppcs = []  # The pypower cases
-        self._cache = {}  # Cache for load flow outputs
+        self._raw_cases = []  # The parsed grid files, kept to apply switch states
+        self._connectivity = []  # Connected buses of each grid
+        self._cache = model.get_cache_entries([], {})  # Load flow outputs
+        self._result_index = None  # model.ResultIndex of self._entities
+        self._solvers = []  # One model.PowerFlow per case
+        self._warm_start = True
+        self._pf_cache_size = 0
+        self._pf_cache_quantum = 1e-6
 
     def init(self, sid, time_resolution, step_size, pos_loads=True,
-             converge_exception=False):
+             converge_exception=False, warm_start=True, pf_cache_size=0,
+             pf_cache_quantum=1e-6):
 
         logger.debug('Power flow will be computed every %d seconds.' %
                      step_size)
@@ -143,6 +151,11 @@ class PyPower(mosaik_api.Simulator):
         self.step_size = step_size
         self.pos_loads = 1 if pos_loads else -1
         self._converge_exception = converge_exception
+        # Start each power flow from the last solution, optionally reuse the
+        # results of (topology, load vector) combinations solved before
+        self._warm_start = warm_start
+        self._pf_cache_size = pf_cache_size
+        self._pf_cache_quantum = pf_cache_quantum
         # topo
         self.sid = sid
         # self.eid = 'PyPower'
@@ -166,6 +179,11 @@ class PyPower(mosaik_api.Simulator):
             grid_idx = len(self._ppcs)
             ppc, entities = model.load_case(self.gridfile, grid_idx, sheetnames)
             self._ppcs.append(ppc)
+            self._solvers.append(model.PowerFlow(
+                self._warm_start, self._pf_cache_size, self._pf_cache_quantum))
+            raw_case = model.open_case(self.gridfile)
+            self._raw_cases.append(raw_case)
+            self._connectivity.append(model.Connectivity(raw_case) if raw_case is not None else None)
             children = []
             for eid, attrs in sorted(entities.items()):
                 assert eid not in self._entities
@@ -191,56 +209,30 @@ class PyPower(mosaik_api.Simulator):
                 'rel': [],
                 'children': children,
             })
+        self._result_index = model.ResultIndex(self._entities)
         return grids
 
     def step(self, time, inputs, max_advance):
         for ppc in self._ppcs:
             model.reset_inputs(ppc)
 
-        # First change the topology
+        # First change the topology. The switch states are applied to the
+        # cases in memory, the entities stay the same.
         if 'PyPower' in inputs:
             if 'switchstates' in inputs['PyPower'].keys():   # sid: PyPower-0%    grideid: 0-grid
-                self.rtu_info = list(inputs['PyPower']['switchstates'].values())[0] #['RTUSim-0.0-rtu']
+                self.rtu_info = {}
+                for states in inputs['PyPower']['switchstates'].values():  # ['RTUSim-0.0-rtu']
+                    self.rtu_info.update(states)
                 if RECORD_TIMES:
                     model.log_event("NC")
-                self.newgrid = model.topology_refresh(self.newgrid, self.rtu_info)
+                for grid_idx, ppc in enumerate(self._ppcs):
+                    if self._raw_cases[grid_idx] is None:
+                        raise ValueError('Switch states require a JSON grid file')
+                    model.apply_switch_states(ppc, self._raw_cases[grid_idx], self._entities, grid_idx,
+                                              self.rtu_info, self._connectivity[grid_idx])
                 if RECORD_TIMES:
                     model.log_event("NT")
 
-                #Create new entities from the new topology
-                grids =[]
-                grid_idx = 0
-                sheetnames = {}
-                self._entities = {}
-                self._ppcs = []
-                ppc, entities = model.load_case(self.newgrid, grid_idx, sheetnames)
-                self._ppcs.append(ppc)
-                for ppc in self._ppcs:
-                    model.reset_inputs(ppc)
-                children = []
-                for eid, attrs in sorted(entities.items()):
-                    assert eid not in self._entities # problem?
-                    self._entities[eid] = attrs
-                    # We'll only add relations from branches to nodes (and not from
-                    # nodes to branches) because this is sufficient for mosaik to
-                    # build the entity graph.
-                    relations = []
-                    if attrs['etype'] in ['Transformer', 'Branch']:
-                        relations = attrs['related']
-
-                    children.append({
-                        'eid': eid,
-                        'type': attrs['etype'],
-                        'rel': relations,
-                    })
-                grids.append({
-                    'eid': self.grideid, #model.make_eid('grid', grid_idx),
-                    'type': 'Grid',
-                    'newgrid': self.newgrid,
-                    'rel': [],
-                    'children': children,
-                })
-
         # Update all the entities (except for the new command input)
         for eid, attrs in inputs.items():
             if 'PyPower' in eid:
@@ -260,8 +252,8 @@ class PyPower(mosaik_api.Simulator):
 
         # Perform power flow equations
         res = []
-        for ppc in self._ppcs:
-            res.append(model.perform_powerflow(ppc))
+        for ppc, solver in zip(self._ppcs, self._solvers):
+            res.append(solver.solve(ppc))
             if self._converge_exception and not res[-1]['success']:
                 raise RuntimeError(
                     'Loadflow did not converge for eid "%s" at time %i!' %
@@ -269,7 +261,8 @@ class PyPower(mosaik_api.Simulator):
 
         if RECORD_TIMES:
             model.log_event("PFE")
-        self._cache = model.get_cache_entries(res, self._entities)  # cases, entity map
+        self._cache = model.get_cache_entries(res, self._entities,
+                                              self._result_index)
 
         return time + self.step_size
 
@@ -281,7 +274,7 @@ class PyPower(mosaik_api.Simulator):
                     if eid == self.grideid and attr == 'switchstates':
                         val = self.newgrid
                     else:
-                        val = self._cache[eid][attr]
+                        val = self._cache.value(eid, attr)
                         if attr == 'P':
                             val *= self.pos_loads
                         if attr == 'I_imag':
@@ -294,5 +287,12 @@ class PyPower(mosaik_api.Simulator):
 
         return data
 
+    def finalize(self):
+        for grid_idx, solver in enumerate(self._solvers):
+            if solver.cache_size > 0:
+                logger.info('Power flow cache of grid %d: %d hits, %d misses (hit rate %.1f%%)' %
+                            (grid_idx, solver.hits, solver.misses, 100 * solver.hit_rate))
+
+
 def main():
     mosaik_api.start_simulation(PyPower(), 'The mosaik-PYPOWER adapter')
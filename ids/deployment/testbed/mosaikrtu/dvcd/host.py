@@ -0,0 +1,189 @@
+from pymodbus3.device import ModbusControlBlock
+from pymodbus3.factory import ServerDecoder
+from pymodbus3.pdu import ModbusExceptions
+import asyncio
+import logging
+import struct
+import threading
+
+from .server import create_identity
+
+log = logging.getLogger('datablock')
+
+MBAP_HEADER = struct.Struct('>HHHB')  # transaction id, protocol id, length, unit id
+
+
+class HostedRtu(object):
+    """
+    A datablock served by a ServerHost and its traffic counters.
+    """
+    def __init__(self, label, datablock, ip, port, unit):
+        self.label = label
+        self.datablock = datablock
+        self.ip = ip
+        self.port = port
+        self.unit = unit  # Unit ID of the RTU on its port, None = every unit ID
+
+        self.connections = 0  # Open connections to the port of the RTU
+        self.requests = 0  # Requests answered
+        self.errors = 0  # Requests answered with a Modbus exception
+        self.bytes_received = 0
+        self.bytes_sent = 0
+
+    def counters(self):
+        return {'connections': self.connections, 'requests': self.requests, 'errors': self.errors,
+                'bytes_received': self.bytes_received, 'bytes_sent': self.bytes_sent}
+
+
+class ServerHost(object):
+    """
+    Modbus/TCP host serving the datablocks of any number of RTUs from one asyncio event loop (in a background thread).
+    Each RTU is served on its own port, or several RTUs share a port and are told apart by their unit ID. Every port
+    accepts any number of concurrent connections.
+    Like with one Server per RTU, the device identity is process wide (the last added RTU's identity is reported).
+    """
+    def __init__(self):
+        self.rtus = {}  # label -> HostedRtu
+        self.unrouted = 0  # Requests for a unit ID no RTU is configured for
+        self._ports = {}  # (ip, port) -> {unit: HostedRtu}
+        self._servers = {}  # (ip, port) -> asyncio server
+        self._writers = {}  # (ip, port) -> writers of the open connections
+        self._decoder = ServerDecoder()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="modbus-host")
+        self._thread.start()
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+        self._loop.close()
+
+    def _call(self, coroutine):
+        # runs a coroutine in the event loop and waits for its result
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def add(self, label, datablock, identity, ip, port, unit=None):
+        """
+        Start serving a datablock.
+        :param label: Unique name of the RTU
+        :param datablock: DataBlock of the RTU
+        :param identity: Identity dictionary as in the RTU configuration
+        :param ip: Address to listen on
+        :param port: Port to listen on
+        :param unit: Unit ID of the RTU, None = answer requests for every unit ID (the only RTU on the port)
+        :return: HostedRtu holding the counters of the RTU
+        """
+        if label in self.rtus:
+            raise ValueError("RTU {} is already hosted".format(label))
+        units = self._ports.get((ip, port), {})
+        if None in units or (units and unit is None) or unit in units:
+            raise ValueError("Unit {} on {}:{} is already served".format(unit, ip, port))
+
+        rtu = HostedRtu(label, datablock, ip, port, unit)
+        ModbusControlBlock().Identity.update(create_identity(identity))
+        if (ip, port) not in self._servers:
+            units = {}
+            self._call(self._listen(ip, port, units))
+            self._ports[(ip, port)] = units
+        units[unit] = rtu
+        self.rtus[label] = rtu
+        return rtu
+
+    def remove(self, label):
+        """
+        Stop serving a datablock, the port is closed after its last RTU is removed.
+        :return: HostedRtu holding the final counters of the RTU
+        """
+        rtu = self.rtus.pop(label)
+        units = self._ports[(rtu.ip, rtu.port)]
+        del units[rtu.unit]
+        if not units:
+            del self._ports[(rtu.ip, rtu.port)]
+            self._call(self._close((rtu.ip, rtu.port)))
+        return rtu
+
+    def stats(self):
+        """
+        :return: Counters of all hosted RTUs by label
+        """
+        return {label: rtu.counters() for label, rtu in self.rtus.items()}
+
+    def stop(self):
+        """
+        Close all ports and stop the event loop.
+        """
+        for label in list(self.rtus):
+            self.remove(label)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def _listen(self, ip, port, units):
+        writers = set()
+
+        async def handle(reader, writer):
+            writers.add(writer)
+            try:
+                await self._handle(reader, writer, units)
+            finally:
+                writers.discard(writer)
+                writer.close()
+        server = await asyncio.start_server(handle, ip, port, reuse_address=True)
+        self._servers[(ip, port)] = server
+        self._writers[(ip, port)] = writers
+
+    async def _close(self, address):
+        server = self._servers.pop(address)
+        server.close()
+        await server.wait_closed()
+        for writer in self._writers.pop(address):
+            writer.close()
+
+    async def _handle(self, reader, writer, units):
+        peers = list(units.values())
+        for rtu in peers:
+            rtu.connections += 1
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(MBAP_HEADER.size)
+                    transaction_id, protocol_id, length, unit = MBAP_HEADER.unpack(header)
+                    if length < 2:
+                        break  # not a Modbus/TCP frame, the stream cannot be resynchronized
+                    pdu = await reader.readexactly(length - 1)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                request = self._decoder.decode(pdu)
+                if request is None:
+                    break
+                rtu = units.get(unit, units.get(None))
+                if rtu is None:
+                    self.unrouted += 1
+                    response = request.do_exception(ModbusExceptions.GatewayPathUnavailable)
+                else:
+                    try:
+                        response = request.execute(rtu.datablock.store)
+                    except Exception as e:
+                        log.debug("Datablock unable to fulfill request: {}".format(e))
+                        response = request.do_exception(ModbusExceptions.SlaveFailure)
+                if not response.should_respond:
+                    continue
+
+                data = response.encode()
+                packet = MBAP_HEADER.pack(transaction_id, protocol_id, len(data) + 2, unit) + \
+                    struct.pack('>B', response.function_code) + data
+                writer.write(packet)
+                if rtu is not None:
+                    rtu.requests += 1
+                    if response.function_code > 0x80:
+                        rtu.errors += 1
+                    rtu.bytes_received += len(header) + len(pdu)
+                    rtu.bytes_sent += len(packet)
+                await writer.drain()
+        finally:
+            for rtu in peers:
+                rtu.connections -= 1
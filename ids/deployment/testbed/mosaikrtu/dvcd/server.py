@@ -13,6 +13,22 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 ch.setFormatter(formatter)
 log.addHandler(ch)
 
+
+def create_identity(identity):
+    """
+    Modbus device identification from the identity dictionary of a RTU configuration.
+    """
+    device_identity = ModbusDeviceIdentification()
+    device_identity.VendorName = identity["vendorname"]
+    device_identity.ProductCode = identity["productcode"]
+    device_identity.VendorUrl = identity["vendorurl"]
+    device_identity.ProductName = identity["productname"]
+    device_identity.ModelName = identity["modelname"]
+    device_identity.MajorMinorRevision = '0.3'
+    #device_identity.Filter = ''
+    return device_identity
+
+
 class Server(threading.Thread):
     """
     Modbus Server class. Holds a datablock and identity. Serves forever (blocks calling thread).
@@ -32,14 +48,7 @@ class Server(threading.Thread):
         self.framer = ModbusSocketFramer
         self.context = ModbusServerContext(slaves=self.datablock.store, single=True)
 
-        self.identity = ModbusDeviceIdentification()
-        self.identity.VendorName = identity["vendorname"]
-        self.identity.ProductCode = identity["productcode"]
-        self.identity.VendorUrl = identity["vendorurl"]
-        self.identity.ProductName = identity["productname"]
-        self.identity.ModelName = identity["modelname"]
-        self.identity.MajorMinorRevision = '0.3'
-        #self.identity.Filter = ''
+        self.identity = create_identity(identity)
 
     def run(self):
         """
@@ -0,0 +1,106 @@
+# recorder.py
+# Buffered recording of the values written by the RTU simulator
+
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class Recorder(object):
+    """
+    Records (simulation time, wall clock time, device, attribute, value) rows in preallocated numpy columns.
+    Full buffers are handed to a background thread which writes each of them as one .npz file
+    (<directory>/<name>_<chunk>.npz), so the simulation never waits for the file system.
+    Each file holds the columns time, wall_time, key and value and the tables device and attribute, key is the
+    index of a row's device/attribute pair in these tables.
+    """
+
+    def __init__(self, directory, name, capacity=65536):
+        self.directory = directory
+        self.name = name
+        self.capacity = capacity  # Rows per buffer and file
+        self.rows = 0  # Rows recorded in total
+
+        self._keys = {}  # (device, attribute) -> key
+        self._devices = []
+        self._attributes = []
+        self._chunk = 0
+        self._allocate()
+
+        os.makedirs(directory, exist_ok=True)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write_chunks, daemon=True, name="recorder-{}".format(name))
+        self._thread.start()
+
+    def _allocate(self):
+        self._time = np.empty(self.capacity, dtype=np.int64)
+        self._wall_time = np.empty(self.capacity, dtype=np.float64)
+        self._key = np.empty(self.capacity, dtype=np.int32)
+        self._value = np.empty(self.capacity, dtype=np.float64)
+        self._size = 0
+
+    def record(self, sim_time, device, attribute, value):
+        key = self._keys.get((device, attribute))
+        if key is None:
+            key = self._keys[(device, attribute)] = len(self._devices)
+            self._devices.append(device)
+            self._attributes.append(attribute)
+
+        i = self._size
+        self._time[i] = sim_time
+        self._wall_time[i] = time.time()
+        self._key[i] = key
+        self._value[i] = np.nan if value is None else value
+        self._size = i + 1
+        self.rows += 1
+        if self._size == self.capacity:
+            self.flush()
+
+    def flush(self):
+        # hands the rows recorded so far to the writer thread
+        if self._size == 0:
+            return
+        n = self._size
+        self._queue.put(("{}_{:05d}.npz".format(self.name, self._chunk), {
+            'time': self._time[:n],
+            'wall_time': self._wall_time[:n],
+            'key': self._key[:n],
+            'value': self._value[:n],
+            'device': np.array(self._devices),
+            'attribute': np.array(self._attributes),
+        }))
+        self._chunk += 1
+        self._allocate()
+
+    def close(self):
+        # writes the remaining rows and waits for the writer thread
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write_chunks(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            filename, columns = item
+            np.savez(os.path.join(self.directory, filename), **columns)
+
+
+def load_recording(directory, name):
+    """
+    Loads all files of a recording into one table: a dict of the columns time, wall_time, device, attribute and value.
+    """
+    files = sorted(f for f in os.listdir(directory) if f.startswith(name + "_") and f.endswith(".npz"))
+    columns = {'time': [], 'wall_time': [], 'device': [], 'attribute': [], 'value': []}
+    for f in files:
+        with np.load(os.path.join(directory, f)) as chunk:
+            columns['time'].append(chunk['time'])
+            columns['wall_time'].append(chunk['wall_time'])
+            columns['device'].append(chunk['device'][chunk['key']])
+            columns['attribute'].append(chunk['attribute'][chunk['key']])
+            columns['value'].append(chunk['value'])
+    return {column: np.concatenate(values) if values else np.array([]) for column, values in columns.items()}
@@ -8,6 +8,7 @@ import mosaik_api
 import os
 from datetime import datetime
 from mosaikrtu import rtu_model
+from mosaikrtu.recorder import Recorder
 import logging
 logger = logging.getLogger('demo_main')
 ch = logging.StreamHandler()
@@ -19,10 +20,7 @@ logger.addHandler(ch)
 from topology_loader.topology_loader import topology_loader
 from distutils.util import strtobool
 
-try:
-    os.remove('./outputs/output_during_rtu_step.txt')
-except OSError:
-    pass
+RECORDING_DIR = os.path.join('.', 'outputs', 'rtu_readings')  # Directory of the recordings (see recorder.py)
 
 META = {
     'type': 'time-based',
@@ -64,27 +62,22 @@ class MonitoringRTU(mosaik_api.Simulator):
         self._cache = {}
         self.worker = ""
         self.server = ""
+        self.recorder = None  # Recorder of the written values, only if rtu_stats_output is set
         topoloader = topology_loader()
         conf = topoloader.get_config()
         global RECORD_TIMES
         RECORD_TIMES = bool(strtobool(conf['recordtimes'].lower()))
 
-        global RTU_STATS_OUTPUT  # configuriert, ob die Daten in output/readings geschrieben werden sollen
-        RTU_STATS_OUTPUT = False
-        #RTU_STATS_OUTPUT = bool(strtobool(conf['rtu_stats_output'].lower()))
-
-        #### Verena
-        global fd_1
-        fd_1 = open('./outputs/output_during_rtu_step.txt', 'w+')
-        intro_text = "This file saves data generated by the rtu.py file.\nDuring the update process of all components in a simulation step, the file saves the name of the component, the register it should be written to and the value itself.\nThe code responsible for this outputs can be found in the step(self, time, inputs)-method.\n \n"
-        fd_1.write(intro_text)
-        ####
+        global RTU_STATS_OUTPUT  # configuriert, ob die Daten in outputs/rtu_readings aufgezeichnet werden sollen
+        RTU_STATS_OUTPUT = bool(strtobool(conf['rtu_stats_output'].lower()))
 
     def init(self, sid, time_resolution):
         if float(time_resolution) != 1.:
             raise ValueError('MonitoringRTU only supports time_resolution=1., but'
                              ' %s was set.' % time_resolution)
         self.sid = sid
+        if RTU_STATS_OUTPUT:
+            self.recorder = Recorder(RECORDING_DIR, sid)
         return self.meta
 
     def create(self, num, model, rtu_ref=None):
@@ -101,8 +94,16 @@ class MonitoringRTU(mosaik_api.Simulator):
                 )  # create_datablock should take the dt into account
                 self._cache, entities = rtu_model.create_cache(
                     self.conf["registers"])
-                self.server = rtu_model.create_server(self.conf, self.data)
-                self.server.start()
+                # All RTUs of this process are served by one ServerHost
+                self.server = rtu_model.host_rtu(self.conf, self.data)
+
+                # Compiled register layouts, read the switches and write the sensors with one call per step
+                self._switches = [s for s in self._cache if 'switch' in s or 'transformer' in s]
+                self._switch_layout = self.data.layout(
+                    [(self._cache[s]['reg_type'], self._cache[s]['index'], None) for s in self._switches])
+                self._sensors = [s for s in self.conf['registers'] if 'sensor' in s]
+                self._sensor_positions = {s: i for i, s in enumerate(self._sensors)}
+                self._sensor_layout = self.data.layout([self.conf['registers'][s][:3] for s in self._sensors])
             self._rtus.append(rtu)
             children = []
             for eid, attrs in sorted(entities.items()):
@@ -133,30 +134,24 @@ class MonitoringRTU(mosaik_api.Simulator):
         commands[src] = {}
         commands[src][dest] = {}
 
-        fd_1.write("--- Starting one RTU step (for" + str(self.sid) + '.' +
-                   str(self.rtueid) + "). ---\n")
-
-        for s, v in self._cache.items():
-            if 'switch' in s or 'transformer' in s:
-                if self.data.get(
-                        v['reg_type'], v['index'],
-                        1)[0] != v['value']:  # TODO: operation on datablock!
+        for s, state in zip(self._switches, self._switch_layout.get_many()):
+            v = self._cache[s]
+            if state != v['value']:
 
-                    if RTU_STATS_OUTPUT:  # V: write to output file "model_readings.csv"
-                        rtu_model.save_readings(
-                            self.sid, v['reg_type'] + str(v['index']), "state",
-                            v['value'])
+                self._cache[s]['value'] = state
 
-                    self._cache[s]['value'] = self.data.get(
-                        v['reg_type'], v['index'], 1)[0]
-                    switchstates[v['place']] = v['value']
+                if self.recorder is not None:
+                    self.recorder.record(time, s, "state", v['value'])
+                switchstates[v['place']] = v['value']
 
-                    if commands[src][dest] == {}:
-                        commands[src][dest]['switchstates'] = switchstates
-                    else:
-                        commands[src][dest]['switchstates'].update(
-                            switchstates)
+                if commands[src][dest] == {}:
+                    commands[src][dest]['switchstates'] = switchstates
+                else:
+                    commands[src][dest]['switchstates'].update(
+                        switchstates)
 
+        # Registers without a new value keep their content (e.g. values written by a Modbus client)
+        sensor_values = self._sensor_layout.get_many()
         for eid, data in inputs.items():
 
             for attr, values in data.items():  # attr is like I_real etc.
@@ -172,24 +167,15 @@ class MonitoringRTU(mosaik_api.Simulator):
 
                             self._cache[dev_id]["value"] = value
 
-                            self.data.set(
-                                self.conf['registers'][dev_id][0],
-                                self.conf['registers'][dev_id][1], value,
-                                self.conf['registers'][dev_id][2]
-                            )  # V: write the new values to the matching register
-
-                            fd_1.write(
-                                str(eid) + " " +
-                                str(self.conf['registers'][dev_id][1]) + " " +
-                                str(self._cache[dev_id]["value"]) + "\n"
-                            )  # V: Write to output file "output_during_rtu_step.csv" the currently updated value as (name, register, value)
+                            # write the new values to the matching registers (all at once after the loop)
+                            sensor_values[self._sensor_positions[dev_id]] = value
 
-                            if RTU_STATS_OUTPUT:  # V: write to output file "model_readings.csv"
-                                rtu_model.save_readings(
-                                    self.sid, dev_id, attr, value)
+                            if self.recorder is not None:
+                                self.recorder.record(time, dev_id, attr, value)
 
-        fd_1.write("--- One RTU step done (for" + str(self.sid) + '.' +
-                   str(self.rtueid) + "). ---\n\n")
+        self._sensor_layout.set_many(sensor_values)
+        # Modbus clients see the values of the whole step at once
+        self.data.publish()
 
         if bool(switchstates) and RECORD_TIMES:
             rtu_model.log_event("NC")
@@ -200,8 +186,14 @@ class MonitoringRTU(mosaik_api.Simulator):
     def finalize(self):
         #self.worker.stop()
         #print("Worker Stopped")
-        self.server.stop()
-        print("Server Stopped")
+        rtu = self.server.remove(self.conf["label"])
+        print("Server Stopped, {} requests ({} errors), {} bytes received, {} bytes sent".format(
+            rtu.requests, rtu.errors, rtu.bytes_received, rtu.bytes_sent))
+        if not self.server.rtus:
+            self.server.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+            print("Recorded {} values to {}".format(self.recorder.rows, RECORDING_DIR))
         print("\n\n")
         print('Finished')
 
@@ -7,15 +7,17 @@
 import xml.dom.minidom
 from mosaikrtu.dvcd.data import DataBlock
 from mosaikrtu.dvcd.server import Server
+from mosaikrtu.dvcd.host import ServerHost
 from mosaikrtu.dvcd.worker import Worker
 import struct
 from datetime import datetime
 
 import socket
 
-readingfile = './outputs/model_readings.csv'  # Output file to which readings are saved
 logfile = './outputs/times.csv'
 
+_host = None  # ServerHost shared by all RTUs of this process, see host_rtu
+
 
 def create_datablock(conf):  # changes : to include the datatype of the data.
     # from Chromik:
@@ -26,7 +28,7 @@ def create_datablock(conf):  # changes : to include the datatype of the data.
     :param conf: Dictionary holding configuration values. See: load_rtu function
     :return: Modbus datablock object that locks when reading or writing.
     """
-    datablock = DataBlock()
+    datablock = DataBlock(conf.get("generation_register"))
     regs = conf["registers"]
     for reg_label in regs:
         ty, addr, datatype, value = regs[reg_label]
@@ -81,6 +83,35 @@ def create_server(conf, datablock):
     return server
 
 
+def host_rtu(conf, datablock):
+    """
+    Serve the supplied datablock with the configured identity, address and unit ID from the ServerHost of this
+    process. All RTUs of a process share one host (one event loop for all their connections).
+    :param conf: Dictionary holding configuration values. See: load_rtu function
+    :param datablock: Modbus datablock object.
+    :return: ServerHost serving the RTU, stop serving it with host.remove(conf["label"])
+    """
+    global _host
+    if _host is None or not _host.running:
+        _host = ServerHost()
+    _host.add(conf["label"], datablock, conf["identity"], conf["ip"], conf["port"], conf.get("unit"))
+
+    print("[*] Modbus-Server hosted @ {}:{} for RTU".format(
+        conf["ip"], conf["port"]))
+    return _host
+
+
+def release_host():
+    """
+    Stop the ServerHost of this process and all RTUs still hosted by it, e.g. after a run that failed before its RTUs
+    were removed. The next host_rtu starts a new host.
+    """
+    global _host
+    if _host is not None and _host.running:
+        _host.stop()
+    _host = None
+
+
 def create_worker(conf, datablock, cache):
     """
     Create a Client with supplied datablock and configured values to pull.
@@ -177,12 +208,21 @@ def load_rtu(path):
 
         code = root.getElementsByTagName("code")[0].childNodes[0].data
 
+        # Optional: holding register index at which the DataBlock publishes its generation
+        generation_tags = root.getElementsByTagName("generation")
+        generation_register = int(generation_tags[0].childNodes[0].data) if generation_tags else None
+        # Optional: unit ID of the RTU if several RTUs share the port of a ServerHost
+        unit_tags = root.getElementsByTagName("unit")
+        unit = int(unit_tags[0].childNodes[0].data) if unit_tags else None
+
         conf["label"] = label
         conf["ip"] = ip
         conf["port"] = port
         conf["identity"] = identity
         conf["registers"] = registers
         conf["code"] = code
+        conf["generation_register"] = generation_register
+        conf["unit"] = unit
     except:
         print("[-] Problem loading configuration XML: '{}'.".format(path))
         raise
@@ -209,13 +249,3 @@ def log_event(event):
     fd = open(logfile, 'a')
     fd.write(myCsvRow)
     fd.close()
-
-
-# V: This is the standard method to save readings from the RTU simulator (rtu.py)
-# It (now) saves the RTU ID (RTUSim-0), the current time, the device ID (e.g. sensor_1), the attribute (I_real, Vm) and the value itself
-def save_readings(rtu_id, dev_id, attr, value):
-    myCsvRow = "{};{};{};{};{}\n".format(rtu_id, format(datetime.now()),
-                                         dev_id, attr, value)
-    fd = open(readingfile, 'a')
-    fd.write(myCsvRow)
-    fd.close()
\ No newline at end of file
@@ -0,0 +1,191 @@
+# sweep.py
+"""
+Sweep runner
+Runs the test scenario for every combination of a parameter grid in a pool of processes. Each run gets its own working
+directory (configuration, RTU configurations, outputs) and its own range of ports, the results of all runs are collected
+in one CSV table.
+
+The parameter grid is a JSON object mapping config.cfg entries (e.g. pv_count, profile_file, rt_factor, end) and the
+sweep parameters "seed" and "attack_script" to a list of values or a single fixed value:
+
+    {"pv_count": [10, 35], "seed": [1, 2, 3], "attack_script": [null, "manipulation/attack_trafo.py"], "end": 3600}
+
+Paths of input files are relative to the data directory like in config.cfg, attack scripts relative to the testbed.
+"""
+
+import argparse
+import contextlib
+import copy
+import csv
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+import traceback
+import xml.dom.minidom
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+TESTBED_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, TESTBED_DIR)
+
+BASE_CONFIG = os.path.join(TESTBED_DIR, "data", "config.cfg")
+PORTS_PER_RUN = 4  # mosaik, web visualization, RTU 1, RTU 2
+INPUT_FILES = ('pv_data', 'gen_data', 'profile_file', 'grid_file')  # Config entries holding paths of input files
+RTU_FILES = ('rtu_file_1', 'rtu_file_2')
+SWEEP_PARAMETERS = ('seed', 'attack_script')  # Parameters that are not written to config.cfg
+DEFAULT_SEED = 23
+
+
+def parameter_grid(grid):
+    # yields every combination of the values in grid as a dict
+    keys = sorted(grid)
+    values = [grid[key] if isinstance(grid[key], list) else [grid[key]] for key in keys]
+    for combination in itertools.product(*values):
+        yield dict(zip(keys, combination))
+
+
+def read_config(path):
+    # reads a config.cfg file ("<key> <value>" per line) into a dict
+    conf = {}
+    with open(path) as in_stream:
+        for line in in_stream:
+            line = line.rstrip()
+            if line:
+                key, value = line.split(" ", 1)
+                conf[key] = value
+    return conf
+
+
+def write_config(path, conf):
+    with open(path, "w") as out_stream:
+        for key, value in conf.items():
+            out_stream.write("{} {}\n".format(key, value))
+
+
+def write_rtu_file(source, target, port):
+    # copies the RTU configuration XML with another Modbus port
+    document = xml.dom.minidom.parse(source)
+    document.documentElement.getElementsByTagName("port")[0].childNodes[0].data = str(port)
+    with open(target, "w") as out_stream:
+        document.writexml(out_stream)
+
+
+def prepare_run(run_dir, params, port):
+    # creates the working directory of one run, returns the config of the run
+    os.makedirs(os.path.join(run_dir, "data"), exist_ok=True)
+
+    conf = read_config(BASE_CONFIG)
+    conf.update({key: value for key, value in params.items() if key not in SWEEP_PARAMETERS})
+    # Input files stay in the testbed, os.path.join("data", <absolute path>) is the absolute path
+    for key in INPUT_FILES:
+        if key in conf:
+            conf[key] = os.path.join(TESTBED_DIR, "data", conf[key])
+    for i, key in enumerate(RTU_FILES):
+        name = "rtu_{}.xml".format(i)
+        write_rtu_file(os.path.join(TESTBED_DIR, "data", conf[key]), os.path.join(run_dir, "data", name),
+                       port + 2 + i)
+        conf[key] = name
+    conf['db_file'] = os.path.join("outputs", "demo.hdf5")
+    write_config(os.path.join(run_dir, "data", "config.cfg"), conf)
+    return conf
+
+
+def run(run_id, params, run_dir, port):
+    # executes one run in its working directory, returns its row of the results table
+    result = {'run': run_id, 'status': 'failed', 'elapsed': '', 'attack_returncode': '', 'run_dir': run_dir,
+              'error': ''}
+    result.update(params)
+    cwd = os.getcwd()
+    attacks = []
+    os.makedirs(os.path.join(run_dir, "outputs"), exist_ok=True)
+    with open(os.path.join(run_dir, "outputs", "sweep.log"), "w") as log:
+        try:
+            prepare_run(run_dir, params, port)
+            # All simulators read data/config.cfg and write to outputs/ relative to the working directory
+            os.chdir(run_dir)
+
+            import test_scenario
+            from topology_loader.topology_loader import topology_loader
+            test_scenario.configure(topology_loader().get_config())
+
+            sim_config = copy.deepcopy(test_scenario.sim_config)
+            sim_config['WebVis']['cmd'] = 'mosaik-web -s 0.0.0.0:{} %(addr)s'.format(port + 1)
+
+            def started():
+                attack_script = params.get('attack_script')
+                if attack_script:
+                    env = dict(os.environ, IDS_RTU_HOST='127.0.0.1', IDS_RTU_PORT=str(port + 2),
+                               IDS_RTU_PORT_1=str(port + 3))
+                    attacks.append(subprocess.Popen([sys.executable, os.path.join(TESTBED_DIR, attack_script)],
+                                                    cwd=run_dir, env=env, stdout=log, stderr=subprocess.STDOUT))
+
+            with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+                result['elapsed'] = round(test_scenario.run_world(sim_config, ('127.0.0.1', port),
+                                                                  params.get('seed', DEFAULT_SEED), started), 3)
+            result['status'] = 'ok'
+        except Exception as e:
+            traceback.print_exc(file=log)
+            result['error'] = repr(e)
+        finally:
+            for attack in attacks:
+                if attack.poll() is None:
+                    attack.terminate()
+                result['attack_returncode'] = attack.wait()
+            # Worker processes are reused: RTUs left over by a failed run would block the ports of the next run
+            from mosaikrtu import rtu_model
+            rtu_model.release_host()
+            os.chdir(cwd)
+    return result
+
+
+def write_results(path, results):
+    params = sorted({key for result in results for key in result} -
+                    {'run', 'status', 'elapsed', 'attack_returncode', 'run_dir', 'error'})
+    fields = ['run'] + params + ['status', 'elapsed', 'attack_returncode', 'run_dir', 'error']
+    with open(path, "w", newline="") as out_stream:
+        writer = csv.DictWriter(out_stream, fieldnames=fields)
+        writer.writeheader()
+        for result in sorted(results, key=lambda r: r['run']):
+            writer.writerow(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the test scenario for a grid of parameters in parallel")
+    parser.add_argument("grid", help="JSON file with the parameter grid")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of parallel runs")
+    parser.add_argument("--output", default=os.path.join("outputs", "sweep"), help="directory for the runs")
+    parser.add_argument("--port-base", type=int, default=20000,
+                        help="first port, run i uses the {} ports from port-base + {} * i".format(PORTS_PER_RUN,
+                                                                                                   PORTS_PER_RUN))
+    args = parser.parse_args()
+
+    with open(args.grid) as in_stream:
+        runs = list(parameter_grid(json.load(in_stream)))
+    output = os.path.abspath(args.output)
+    os.makedirs(output, exist_ok=True)
+    results_file = os.path.join(output, "results.csv")
+    print("Starting {} runs with {} workers.".format(len(runs), args.workers))
+
+    start_time = time.time()
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(run, i, params, os.path.join(output, "run_{}".format(i)),
+                                   args.port_base + PORTS_PER_RUN * i)
+                   for i, params in enumerate(runs)]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            # Rewritten after every run, so the table of an aborted sweep is complete up to that point
+            write_results(results_file, results)
+            print("Run {} {} ({}/{})".format(result['run'], result['status'], len(results), len(runs)))
+
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    print("Finished {} runs ({} failed) in {:.1f}s, results in {}".format(len(runs), failed,
+                                                                        time.time() - start_time, results_file))
+
+
+# Needed to execute file as main
+if __name__ == '__main__':
+    main()
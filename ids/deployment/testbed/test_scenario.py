@@ -52,8 +52,24 @@ def main():
     # needed to load configurations
     topoloader = topology_loader()
     conf = topoloader.get_config()
+    configure(conf)
 
-    # configuration
+    if RECORD_TIMES:
+        try:
+            os.remove('./outputs/times.csv')
+        except OSError:
+            pass
+
+    while True:
+        elapsed_time = run_world()
+        print("Elapsed time: {}".format(elapsed_time))
+        print("\n")
+        print("End of the simulation.")
+        print("Running simulation again because it was so fun!")
+
+
+def configure(conf):
+    # sets the configuration of the scenario from a config dict (see topology_loader)
     global START
     START = conf['start']
 
@@ -97,59 +113,58 @@ def main():
     global RECORD_TIMES
     RECORD_TIMES = bool(strtobool(conf['recordtimes'].lower()))
 
-    if RECORD_TIMES:
-        try:
-            os.remove('./outputs/times.csv')
-        except OSError:
-            pass
+    global DB_FILE
+    DB_FILE = conf.get('db_file', 'data/config_files/demo.hdf5')
     # End of configuration
-    
-    while True:
-        random.seed(23)
-        # Will be used later to calculate to complete simulation times
-        start_time = time.time()
 
-        print("\n")
 
-        # Creation of the world
-        world = mosaik.World(sim_config)
-        print("Created the simulation world.")
-        print("________________________________")
-        print("\n")
+def run_world(config=sim_config, addr=None, seed=23, started=None):
+    # runs the scenario once in a new world and returns the elapsed time
+    # addr: (host, port) mosaik listens on, started: called after the scenario was created
+    random.seed(seed)
+    # Will be used later to calculate to complete simulation times
+    start_time = time.time()
 
-        # Creation of the scenario
-        print("Started simulation scenario creation.")
-        create_scenario(world)
-        print("Created the simulation scenario.")
-        print("________________________________")
-        print("\n")
+    print("\n")
 
-        # Run the simualtion world
-        print("Started simulation run.")
-        #Since the simulation is partly running very slowly, we let it take all the time it needs,
-        #otherwise the loggs are not readable due to the real-time factor warnings
+    # Creation of the world
+    if addr is None:
+        world = mosaik.World(config)
+    else:
+        world = mosaik.World(config, addr=addr)
+    print("Created the simulation world.")
+    print("________________________________")
+    print("\n")
 
-        def ignore_rt_check(rt_factor, rt_start, rt_strict, sim):
-            pass
-        mosaik.scheduler.rt_check = ignore_rt_check
+    # Creation of the scenario
+    print("Started simulation scenario creation.")
+    create_scenario(world)
+    print("Created the simulation scenario.")
+    print("________________________________")
+    print("\n")
 
-        world.run(until=END, rt_factor=RT_FACTOR)
+    if started is not None:
+        started()
 
-        # if RT_FACTOR == 0:
-        #     world.run(until=END)  # As fast as possible
-        # else:
-        #     world.run(until=END, rt_factor=RT_FACTOR)  # slowed down by RT_FACTOR
+    # Run the simualtion world
+    print("Started simulation run.")
+    #Since the simulation is partly running very slowly, we let it take all the time it needs,
+    #otherwise the loggs are not readable due to the real-time factor warnings
 
+    def ignore_rt_check(rt_factor, rt_start, rt_strict, sim):
+        pass
+    mosaik.scheduler.rt_check = ignore_rt_check
 
-        print("Finished simulation run.")
-        print("________________________________")
-        print("\n")
+    if RT_FACTOR == 0:
+        world.run(until=END)  # As fast as possible
+    else:
+        world.run(until=END, rt_factor=RT_FACTOR)  # slowed down by RT_FACTOR
 
-        elapsed_time = time.time() - start_time
-        print("Elapsed time: {}".format(elapsed_time))
-        print("\n")
-        print("End of the simulation.")
-        print("Running simulation again because it was so fun!")
+    print("Finished simulation run.")
+    print("________________________________")
+    print("\n")
+
+    return time.time() - start_time
 
 
 def create_scenario(world):
@@ -192,7 +207,7 @@ def create_scenario(world):
 
     # Start the database
     db = world.start('DB', step_size=60, duration=END)
-    hdf5 = db.Database(filename='data/config_files/demo.hdf5')
+    hdf5 = db.Database(filename=DB_FILE)
 
     # Connect all entities
     # Connecting houses, pvs and gens to the grid
@@ -17,6 +17,39 @@ def run_c2():
         config.cert = os.getenv('IDS_CERT')
         config.private_key = os.getenv('IDS_PRIVATE_KEY')
         config.private_key_password = os.getenv('IDS_PRIVATE_KEY_PASSWORD')
+        config.lm_suspect_after = float(os.getenv('IDS_LM_SUSPECT_AFTER', config.lm_suspect_after))
+        config.lm_dead_after = float(os.getenv('IDS_LM_DEAD_AFTER', config.lm_dead_after))
+        config.nm_suspect_after = float(os.getenv('IDS_NM_SUSPECT_AFTER', config.nm_suspect_after))
+        config.nm_dead_after = float(os.getenv('IDS_NM_DEAD_AFTER', config.nm_dead_after))
+        config.liveness_check_interval = float(os.getenv('IDS_LIVENESS_CHECK_INTERVAL',
+                                                         config.liveness_check_interval))
+        config.attach_workers = int(os.getenv('IDS_ATTACH_WORKERS', config.attach_workers))
+        config.attach_backoff_initial = float(os.getenv('IDS_ATTACH_BACKOFF_INITIAL', config.attach_backoff_initial))
+        config.attach_backoff_max = float(os.getenv('IDS_ATTACH_BACKOFF_MAX', config.attach_backoff_max))
+        config.rebalance_threshold = float(os.getenv('IDS_REBALANCE_THRESHOLD', config.rebalance_threshold))
+        config.rebalance_interval = float(os.getenv('IDS_REBALANCE_INTERVAL', config.rebalance_interval))
+        # Format: <lm address>=<nm address>,<lm address>=<nm address>,...
+        config.nm_affinity = dict(pair.split('=', 1) for pair in os.getenv('IDS_NM_AFFINITY', '').split(',') if pair)
+        # Federation: regional c2s register with their parent c2. All c2s of a federation share one certificate.
+        config.parent_address = os.getenv('IDS_PARENT_C2_ADDRESS')
+        config.parent_cert = os.getenv('IDS_PARENT_C2_CERT', config.cert)
+        config.federation_report_buffer = int(os.getenv('IDS_FEDERATION_REPORT_BUFFER',
+                                                        config.federation_report_buffer))
+        config.incident_window = float(os.getenv('IDS_INCIDENT_WINDOW', config.incident_window))
+        config.incident_radius = int(os.getenv('IDS_INCIDENT_RADIUS', config.incident_radius))
+        config.global_check_interval = float(os.getenv('IDS_GLOBAL_CHECK_INTERVAL', config.global_check_interval))
+        config.global_alignment_window = float(os.getenv('IDS_GLOBAL_ALIGNMENT_WINDOW',
+                                                         config.global_alignment_window))
+        config.global_state_estimation = os.getenv('IDS_GLOBAL_STATE_ESTIMATION', 'false').lower() in ('1', 'true')
+        config.global_residual_threshold = float(os.getenv('IDS_GLOBAL_RESIDUAL_THRESHOLD',
+                                                           config.global_residual_threshold))
+        config.log_file = os.getenv('IDS_LOG_FILE')
+        config.log_max_bytes = int(os.getenv('IDS_LOG_MAX_BYTES', config.log_max_bytes))
+        config.log_backup_count = int(os.getenv('IDS_LOG_BACKUP_COUNT', config.log_backup_count))
+        config.log_sample_rate = float(os.getenv('IDS_LOG_SAMPLE_RATE', config.log_sample_rate))
+        tail_rate = os.getenv('IDS_LOG_TAIL_RATE')
+        config.log_tail_rate = float(tail_rate) if tail_rate else None
+        config.log_queue_size = int(os.getenv('IDS_LOG_QUEUE_SIZE', config.log_queue_size))
 
         # Run c2 forever
         asyncio.run(opc_c2server.main(config))
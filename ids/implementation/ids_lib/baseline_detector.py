@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class BaselineDetector:
+    """
+        Streaming anomaly detection for all meters of an LM.
+        Every statistic is one array over all (channel, meter) pairs (channels: current, voltage), so an update is a
+        few vectorised operations with O(1) state per meter:
+
+        - EWMA mean and variance: the learned baseline of each measurement
+        - CUSUM on the standardised deviation from the baseline: sustained drift in one direction, even if every
+          single step stays well within the fixed thresholds
+        - Run length of the rate of change: measurements that move in the same direction for too many consecutive
+          cycles are implausibly smooth for a physical signal with noise
+    """
+
+    def __init__(self, n_meters, alpha=0.05, cusum_slack=0.5, cusum_threshold=8.0, max_run=60, warmup=30,
+                 noise_floor=(0.1, 0.005), min_std=(1e-3, 1.0)):
+        self.alpha = alpha  # Weight of a new sample in the EWMA statistics
+        self.cusum_slack = cusum_slack  # Deviation (in standard deviations) tolerated per sample by CUSUM
+        self.cusum_threshold = cusum_threshold  # CUSUM value that indicates drift
+        self.max_run = max_run  # Number of consecutive steps in the same direction that is considered implausible
+        self.warmup = warmup  # Samples required before a meter is checked
+        # Minimum standard deviation (current, voltage), relative to the baseline mean and absolute
+        self.noise_floor = np.asarray(noise_floor, dtype=np.float64).reshape(2, 1)
+        self.min_std = np.asarray(min_std, dtype=np.float64).reshape(2, 1)
+
+        shape = (2, n_meters)
+        self.samples = 0
+        self.mean = np.zeros(shape)
+        self.variance = np.zeros(shape)
+        self.last = np.zeros(shape)
+        self.cusum_high = np.zeros(shape)
+        self.cusum_low = np.zeros(shape)
+        self.run = np.zeros(shape, dtype=np.int64)
+        self.direction = np.zeros(shape, dtype=np.int8)
+
+    def update(self, values):
+        """
+            Adds one sample per meter. values has shape (2, n_meters) with currents in row 0 and voltages in row 1.
+            Returns (drift, smooth): boolean arrays of shape (2, n_meters). Both are False during the warm-up.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if self.samples == 0:
+            self.mean[:] = values
+            self.last[:] = values
+            self.samples = 1
+            return np.zeros(values.shape, dtype=bool), np.zeros(values.shape, dtype=bool)
+
+        # Standardised deviation from the baseline before it absorbs the new sample. Modbus and simulation readings
+        # are piecewise constant, their variance collapses between load steps. The noise floor keeps an ordinary
+        # step from producing huge scores.
+        std = np.maximum(np.sqrt(self.variance), np.maximum(self.noise_floor * np.abs(self.mean), self.min_std))
+        z = (values - self.mean) / std
+
+        deviation = values - self.mean
+        self.mean += self.alpha * deviation
+        self.variance = (1 - self.alpha) * (self.variance + self.alpha * deviation ** 2)
+
+        self.cusum_high = np.maximum(0.0, self.cusum_high + z - self.cusum_slack)
+        self.cusum_low = np.maximum(0.0, self.cusum_low - z - self.cusum_slack)
+
+        direction = np.sign(values - self.last).astype(np.int8)
+        self.run = np.where((direction != 0) & (direction == self.direction), self.run + 1,
+                            (direction != 0).astype(np.int64))
+        self.direction = direction
+        self.last[:] = values
+
+        self.samples += 1
+        if self.samples <= self.warmup:
+            self.cusum_high[:] = 0
+            self.cusum_low[:] = 0
+            return np.zeros(values.shape, dtype=bool), np.zeros(values.shape, dtype=bool)
+
+        drift = (self.cusum_high > self.cusum_threshold) | (self.cusum_low > self.cusum_threshold)
+        smooth = self.run >= self.max_run
+
+        # Restart the detection after an alarm so a persisting anomaly is reported periodically, not every cycle
+        self.cusum_high[drift] = 0
+        self.cusum_low[drift] = 0
+        self.run[smooth] = 0
+
+        return drift, smooth
@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+from asyncua import Client
+from asyncua.crypto.security_policies import SecurityPolicyBasic256Sha256
+
+
+class ParentEventListener:
+    """ Listens to events from the parent c&c server"""
+
+    def __init__(self, federation):
+        self.__federation = federation
+
+    async def event_notification(self, event):
+        msg = event.Message.Text
+        if msg == "reconfigureRegions":
+            await self.__federation.refresh_cross_regions()
+        # All other events of the parent are meant for its own monitors
+
+
+class FederationClient:
+    """
+        Connects a regional c2 to its parent c2.
+        The regional c2 forwards the LMs of its partition and batches of violation reports to the parent and receives
+        the border regions that cross partition boundaries in return.
+    """
+
+    def __init__(self, config, logger):
+        self.config = config
+        self.logger = logger
+
+        self.client = None
+        self.__idx = None
+        self.__parent = None
+
+        # Border regions between one of our LMs and an LM of another partition
+        self.cross_regions = []
+        # Set whenever cross_regions changed, reset by the c2 after reconfiguring
+        self.changed = False
+
+        # Ids of the LMs the parent currently knows about
+        self.__forwarded_lms = set()
+        # Reports that still have to be forwarded to the parent
+        self.__pending_reports = []
+
+    async def connect(self) -> None:
+        """Connects to the parent c2 and registers this c2 as a region. Retries until the parent is reachable."""
+        while True:
+            client = Client(url=self.config.parent_address)
+            await client.set_security(
+                SecurityPolicyBasic256Sha256,
+                certificate=self.config.cert,
+                private_key=self.config.private_key,
+                private_key_password=self.config.private_key_password,
+                server_certificate=self.config.parent_cert
+            )
+            try:
+                await client.connect()
+                await client.load_data_type_definitions()
+
+                self.__idx = await client.get_namespace_index(self.config.opc_domain)
+                root = client.get_root_node()
+
+                subscription = await client.create_subscription(100, ParentEventListener(self))
+                await subscription.subscribe_events()
+
+                self.__parent = await root.get_child(["0:Objects", f"{self.__idx}:C2"])
+                await self.__parent.call_method(f"{self.__idx}:registerRegion",
+                                                str(self.config.uuid), self.config.c2_address)
+                break
+            except Exception as e:
+                self.logger.error(f"Could not register with parent c2 on '{self.config.parent_address}': {e}. "
+                                  f"Retrying in 5 seconds")
+                try:
+                    await client.disconnect()
+                except Exception:
+                    pass
+                await asyncio.sleep(5)
+
+        # A restarted parent does not know our LMs anymore
+        self.__forwarded_lms = set()
+        self.client = client
+        self.logger.info(f"Registered as region '{self.config.uuid}' with parent c2")
+
+    async def refresh_cross_regions(self) -> None:
+        """Reloads the cross partition border regions the parent has assigned to this region"""
+        config_node = await self.client.get_root_node() \
+            .get_child(["0:Objects", f"{self.__idx}:{self.config.uuid}", f"{self.__idx}:config"])
+        config = await config_node.get_value()
+        self.cross_regions = list(config.regions)
+        self.changed = True
+        self.logger.info(f"Received {len(self.cross_regions)} cross partition border regions from parent c2")
+
+    def add_report(self, report) -> None:
+        """Queues a violation report for forwarding. The oldest reports are dropped if the parent is unreachable."""
+        self.__pending_reports.append(report)
+        if len(self.__pending_reports) > self.config.federation_report_buffer:
+            del self.__pending_reports[:-self.config.federation_report_buffer]
+
+    async def sync(self, local_monitors) -> None:
+        """Forwards new and removed LMs and all pending violation reports to the parent"""
+        if self.client is None:
+            return
+
+        current = {lm['id']: lm for lm in local_monitors}
+        for lm_id in set(current) - self.__forwarded_lms:
+            lm = current[lm_id]
+            await self.__parent.call_method(f"{self.__idx}:registerRegionLM", str(self.config.uuid),
+                                            lm['id'], lm['address'], lm['rtu_config'])
+            self.__forwarded_lms.add(lm_id)
+
+        for lm_id in self.__forwarded_lms - set(current):
+            await self.__parent.call_method(f"{self.__idx}:unregisterRegionLM", str(self.config.uuid), lm_id)
+            self.__forwarded_lms.discard(lm_id)
+
+        if self.__pending_reports:
+            # Send all pending reports as one json array instead of one call per report
+            count = len(self.__pending_reports)
+            await self.__parent.call_method(f"{self.__idx}:reportViolations", str(self.config.uuid),
+                                            json.dumps(self.__pending_reports[:count]))
+            del self.__pending_reports[:count]
@@ -14,6 +14,39 @@ class C2Config:
     private_key = None  # Private key for certificate
     private_key_password = None  # Private key password
 
+    lm_suspect_after = 5  # Seconds without heartbeat until an LM is suspected to have failed
+    lm_dead_after = 10  # Seconds without heartbeat until an LM is removed
+    nm_suspect_after = 5  # Seconds without heartbeat until an NM is suspected to have failed
+    nm_dead_after = 10  # Seconds without heartbeat until an NM is removed
+    liveness_check_interval = 1  # Seconds between two checks of the heartbeat deadlines
+
+    attach_workers = 8  # Maximum number of monitors the c2 attaches to concurrently
+    attach_backoff_initial = 2  # Seconds until a monitor that could not be attached is retried
+    attach_backoff_max = 60  # Upper bound for the retry delay of a monitor
+
+    rebalance_threshold = 25  # Difference in cpu load (percent) between NMs that triggers a rebalancing
+    rebalance_interval = 60  # Minimum number of seconds between two rebalancings
+    nm_affinity = {}  # Optional mapping of LM addresses to the address of their preferred NM
+
+    parent_address = None  # OPC Server Url of the parent c&c server. None if this c2 is not part of a federation
+    parent_cert = None  # Certificate used by the parent c&c server
+    federation_report_buffer = 1024  # Maximum number of violation reports buffered while the parent is unreachable
+
+    incident_window = 10  # Seconds after the last report until an incident is closed
+    incident_radius = 2  # Maximum distance (hops in the component graph) between reports of the same incident
+
+    global_check_interval = 0  # Seconds between two checks of the grid wide requirements. 0 disables the checks
+    global_alignment_window = 2  # Maximum age difference (seconds) of LM snapshots that are checked together
+    global_state_estimation = False  # Enables the detection of manipulated meters by state estimation (req 9)
+    global_residual_threshold = 3.0  # Normalised residual above which a meter is considered manipulated
+
+    log_file = None  # JSON lines file for the logs of the c2 and all monitors. None disables file output
+    log_max_bytes = 10 * 1024 * 1024  # Size at which the log file is rotated
+    log_backup_count = 5  # Number of rotated log files that are kept
+    log_sample_rate = 0  # Maximum log messages per second and monitor below WARNING. 0 keeps all messages
+    log_tail_rate = None  # Maximum log lines per second below WARNING printed to the console. None = all, 0 = none
+    log_queue_size = 10000  # Log messages buffered before new messages are dropped
+
     def __str__(self):
         return f'''
             Running c&c server with config:
@@ -26,6 +59,28 @@ class C2Config:
                 cert: {self.cert}
                 private_key: {self.private_key}
                 private_key_password: ****
+                lm_suspect_after / lm_dead_after: {self.lm_suspect_after} / {self.lm_dead_after}
+                nm_suspect_after / nm_dead_after: {self.nm_suspect_after} / {self.nm_dead_after}
+                liveness_check_interval: {self.liveness_check_interval}
+                attach_workers: {self.attach_workers}
+                attach_backoff_initial / attach_backoff_max: {self.attach_backoff_initial} / {self.attach_backoff_max}
+                rebalance_threshold: {self.rebalance_threshold}
+                rebalance_interval: {self.rebalance_interval}
+                nm_affinity: {self.nm_affinity}
+                parent_address: {self.parent_address}
+                parent_cert: {self.parent_cert}
+                federation_report_buffer: {self.federation_report_buffer}
+                incident_window: {self.incident_window}
+                incident_radius: {self.incident_radius}
+                global_check_interval: {self.global_check_interval}
+                global_alignment_window: {self.global_alignment_window}
+                global_state_estimation: {self.global_state_estimation}
+                global_residual_threshold: {self.global_residual_threshold}
+                log_file: {self.log_file}
+                log_max_bytes / log_backup_count: {self.log_max_bytes} / {self.log_backup_count}
+                log_sample_rate: {self.log_sample_rate}
+                log_tail_rate: {self.log_tail_rate}
+                log_queue_size: {self.log_queue_size}
         '''
 
     def default_config(self):
@@ -21,6 +21,18 @@ class LMConfig:
 
     rtu_modbus_host = None  # Modbus hostname of the RTU to monitor
     rtu_modbus_port = None  # Modbus port of the RTU to monitor
+    rtu_generation_register = None  # Holding register of the RTU's step generation (2 registers). None = not used
+
+    rules_file = None  # JSON file with the requirement rules. None = ids_lib/config/rules.json
+    req_periods = {}  # Evaluation period in seconds per requirement, overrides the defaults of ReqCheckerLocal
+    cycle_budget = 0  # Maximum seconds spent on scheduled requirement checks per cycle. 0 = unlimited
+
+    baseline_detection = False  # Enables the statistical baseline detection of requirement 10 (not tuned yet)
+    baseline_cusum_threshold = 8.0  # CUSUM value (in standard deviations) that indicates drift
+    baseline_max_run = 60  # Consecutive readings changing in the same direction that are considered implausible
+    baseline_warmup = 30  # Readings used to learn the baseline before a meter is checked
+    baseline_noise_floor_current = 0.1  # Minimum standard deviation of the current baseline, relative to its mean
+    baseline_noise_floor_voltage = 0.005  # Minimum standard deviation of the voltage baseline, relative to its mean
 
     def __init__(self):
         pass
@@ -17,6 +17,8 @@ class NMConfig:
     private_key = None  # Encrypted Private Key
     private_key_password = None  # Private Key Password
 
+    rules_file = None  # JSON file with the requirement rules. None = ids_lib/config/rules.json
+
     def __init__(self):
         pass
 
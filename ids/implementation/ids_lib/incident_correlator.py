@@ -0,0 +1,197 @@
+import heapq
+import itertools
+import json
+import time
+from collections import deque
+
+
+def _ids(reference) -> list:
+    """power_lines_in/out of a bus are either {'id': ...} or {'ids': [...]}"""
+    if not reference:
+        return []
+    if 'ids' in reference:
+        return list(reference['ids'])
+    return [reference['id']]
+
+
+class ComponentGraph:
+    """Undirected graph of buses, power lines, meters and switches built from the RTU configs of the LMs"""
+
+    def __init__(self):
+        self.__adjacency = {}
+        # Neighbourhoods are cached until the topology changes
+        self.__neighbourhoods = {}
+
+    def add_rtu_config(self, rtu_config) -> None:
+        rtu = json.loads(rtu_config) if isinstance(rtu_config, str) else rtu_config
+
+        for bus in rtu.get('buses', []):
+            for power_line_id in _ids(bus.get('power_lines_in')) + _ids(bus.get('power_lines_out')):
+                self.__connect(bus['id'], power_line_id)
+        for component in rtu.get('meters', []) + rtu.get('switches', []):
+            self.__connect(component['id'], component['bus_id'])
+            self.__connect(component['id'], component['power_line_id'])
+
+        self.__neighbourhoods = {}
+
+    def __connect(self, a, b) -> None:
+        self.__adjacency.setdefault(a, set()).add(b)
+        self.__adjacency.setdefault(b, set()).add(a)
+
+    def neighbours(self, component) -> set:
+        return self.__adjacency.get(component, set())
+
+    def neighbourhood(self, component, radius) -> dict:
+        """Returns {component: distance} of all components within radius hops (breadth first)"""
+        key = (component, radius)
+        result = self.__neighbourhoods.get(key)
+        if result is not None:
+            return result
+
+        result = {component: 0}
+        frontier = [component]
+        for distance in range(1, radius + 1):
+            next_frontier = []
+            for c in frontier:
+                for n in self.neighbours(c):
+                    if n not in result:
+                        result[n] = distance
+                        next_frontier.append(n)
+            frontier = next_frontier
+
+        self.__neighbourhoods[key] = result
+        return result
+
+
+class IncidentCorrelator:
+    """
+        Groups violation reports that are close in time and topology into incidents.
+        A report joins the open incident of any component within `radius` hops that was violated during the last
+        `window` seconds; if it touches several incidents they are merged. Each report costs
+        O(size of its neighbourhood), merges move the smaller incident into the larger one.
+
+        Every violation scores its component with 1 and its direct neighbours with 0.5. A fault at a bus raises
+        violations on the adjacent lines and meters, so the bus collects the highest score and becomes the root cause
+        candidate of the incident.
+    """
+
+    def __init__(self, graph, window=10, radius=2, history=256):
+        self.graph = graph
+        self.window = window
+        self.radius = radius
+
+        self.__ids = itertools.count(1)
+        self.__open = {}  # incident id -> incident
+        self.__index = {}  # component -> id of the open incident it belongs to
+        self.__expiry = []  # heap of (last report time, incident id), stale entries are skipped
+        self.closed = deque(maxlen=history)
+
+    def add(self, report) -> dict:
+        """Adds a violation report {"timestamp", "requirement", "component_id"} and returns its incident"""
+        timestamp = int(report['timestamp'])
+        component = report['component_id']
+        self.expire(timestamp)
+
+        neighbourhood = self.graph.neighbourhood(component, self.radius)
+        touched = {self.__index[c] for c in neighbourhood if c in self.__index}
+
+        if not touched:
+            incident = self.__new_incident(timestamp)
+        else:
+            incidents = sorted((self.__open[i] for i in touched), key=lambda i: len(i['components']), reverse=True)
+            incident = incidents[0]
+            for other in incidents[1:]:
+                self.__merge(incident, other)
+
+        self.__add_to_incident(incident, report, timestamp, component)
+        return incident
+
+    def expire(self, now) -> None:
+        """Closes all incidents without reports during the last window seconds"""
+        while self.__expiry and self.__expiry[0][0] + self.window < now:
+            last, incident_id = heapq.heappop(self.__expiry)
+            incident = self.__open.get(incident_id)
+            if incident is None or incident['last'] != last:
+                continue
+            del self.__open[incident_id]
+            for c in incident['components']:
+                if self.__index.get(c) == incident_id:
+                    del self.__index[c]
+            incident['open'] = False
+            self.closed.append(incident)
+
+    def __new_incident(self, timestamp) -> dict:
+        incident = {
+            "id": next(self.__ids),
+            "start": timestamp,
+            "last": timestamp,
+            "open": True,
+            "components": {},  # component -> number of reports
+            "requirements": set(),
+            "reports": 0,
+            "duplicates": 0,  # Same requirement and component reported again (e.g. by LM and NM)
+            "seen": set(),
+            "scores": {},
+            "root_cause": None
+        }
+        self.__open[incident['id']] = incident
+        return incident
+
+    def __add_to_incident(self, incident, report, timestamp, component) -> None:
+        incident['reports'] += 1
+        incident['requirements'].add(report['requirement'])
+        incident['components'][component] = incident['components'].get(component, 0) + 1
+        self.__index[component] = incident['id']
+
+        key = (report['requirement'], component)
+        if key in incident['seen']:
+            incident['duplicates'] += 1
+        else:
+            incident['seen'].add(key)
+            self.__score(incident, component, 1.0)
+            for n in self.graph.neighbours(component):
+                self.__score(incident, n, 0.5)
+
+        if timestamp > incident['last']:
+            incident['last'] = timestamp
+        heapq.heappush(self.__expiry, (incident['last'], incident['id']))
+
+    def __score(self, incident, component, value) -> None:
+        scores = incident['scores']
+        scores[component] = scores.get(component, 0) + value
+        root = incident['root_cause']
+        if root is None or scores[component] > scores[root]:
+            incident['root_cause'] = component
+
+    def __merge(self, incident, other) -> None:
+        """Moves all reports of other into incident"""
+        del self.__open[other['id']]
+        for c, count in other['components'].items():
+            incident['components'][c] = incident['components'].get(c, 0) + count
+            self.__index[c] = incident['id']
+        for c, score in other['scores'].items():
+            self.__score(incident, c, score)
+        incident['requirements'] |= other['requirements']
+        incident['seen'] |= other['seen']
+        incident['reports'] += other['reports']
+        incident['duplicates'] += other['duplicates']
+        incident['start'] = min(incident['start'], other['start'])
+        incident['last'] = max(incident['last'], other['last'])
+
+    def incidents_since(self, timestamp) -> list:
+        """Returns all incidents (open and closed) with reports later than timestamp in json serializable form"""
+        # Incidents are otherwise only closed when a new report arrives
+        self.expire(time.time())
+        incidents = [i for i in itertools.chain(self.closed, self.__open.values()) if i['last'] > timestamp]
+        return [{
+            "type": "incident",
+            "id": i['id'],
+            "open": i['open'],
+            "start": i['start'],
+            "last": i['last'],
+            "root_cause": i['root_cause'],
+            "components": sorted(i['components']),
+            "requirements": sorted(i['requirements']),
+            "reports": i['reports'],
+            "duplicates": i['duplicates']
+        } for i in incidents]
@@ -0,0 +1,114 @@
+import heapq
+import time
+from enum import Enum
+
+
+class MonitorState(Enum):
+    ALIVE = 0
+    SUSPECT = 1
+    DEAD = 2
+
+
+class LivenessTracker:
+    """
+        Deadline ordered liveness tracking for monitors.
+        Each monitor has exactly one pending deadline in a min-heap. A heartbeat only updates the last-seen timestamp
+        (O(1)); the deadline is pushed back lazily when it expires, so each monitor costs O(log N) per grace period
+        independent of the heartbeat rate.
+    """
+
+    def __init__(self, grace_periods):
+        # Maps monitor type (e.g. "LM", "NM") to a tuple (suspect_after, dead_after) in seconds
+        self.__grace_periods = grace_periods
+        # Maps monitor id to its record: {"type", "last_seen", "state", "deadline"}
+        self.__monitors = {}
+        # Heap of (deadline, monitor_id). Entries whose deadline differs from the record are stale and skipped.
+        self.__deadlines = []
+
+    def watch(self, monitor_id, monitor_type, now=None):
+        """Starts tracking a monitor. Registration counts as a sign of life."""
+        if now is None:
+            now = time.monotonic()
+
+        suspect_after, _ = self.__grace_periods[monitor_type]
+        self.__monitors[monitor_id] = {
+            "type": monitor_type,
+            "last_seen": now,
+            "state": MonitorState.ALIVE,
+            "deadline": None
+        }
+        self.__schedule(monitor_id, now + suspect_after)
+
+    def forget(self, monitor_id):
+        """Stops tracking a monitor. Pending heap entries become stale."""
+        self.__monitors.pop(monitor_id, None)
+
+    def is_watched(self, monitor_id):
+        return monitor_id in self.__monitors
+
+    def state(self, monitor_id):
+        record = self.__monitors.get(monitor_id)
+        return record["state"] if record else None
+
+    def beat(self, monitor_id, now=None):
+        """
+            Records a heartbeat. Returns the transition (monitor_id, old_state, new_state) if a suspected monitor
+            recovered, None otherwise. Heartbeats of unknown monitors are ignored.
+        """
+        record = self.__monitors.get(monitor_id)
+        if record is None:
+            return None
+        if now is None:
+            now = time.monotonic()
+
+        record["last_seen"] = now
+        if record["state"] == MonitorState.SUSPECT:
+            record["state"] = MonitorState.ALIVE
+            suspect_after, _ = self.__grace_periods[record["type"]]
+            self.__schedule(monitor_id, now + suspect_after)
+            return monitor_id, MonitorState.SUSPECT, MonitorState.ALIVE
+        return None
+
+    def expire(self, now=None):
+        """
+            Processes all deadlines that have passed and returns the resulting state transitions as a list of
+            (monitor_id, old_state, new_state). Dead monitors are no longer tracked.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        transitions = []
+        while self.__deadlines and self.__deadlines[0][0] <= now:
+            deadline, monitor_id = heapq.heappop(self.__deadlines)
+            record = self.__monitors.get(monitor_id)
+            if record is None or record["deadline"] != deadline:
+                continue
+
+            suspect_after, dead_after = self.__grace_periods[record["type"]]
+            if record["state"] == MonitorState.ALIVE:
+                due = record["last_seen"] + suspect_after
+                if due > now:
+                    # A heartbeat arrived in the meantime
+                    self.__schedule(monitor_id, due)
+                    continue
+                record["state"] = MonitorState.SUSPECT
+                transitions.append((monitor_id, MonitorState.ALIVE, MonitorState.SUSPECT))
+                self.__schedule(monitor_id, record["last_seen"] + dead_after)
+
+            elif record["state"] == MonitorState.SUSPECT:
+                due = record["last_seen"] + dead_after
+                if due > now:
+                    self.__schedule(monitor_id, due)
+                    continue
+                del self.__monitors[monitor_id]
+                transitions.append((monitor_id, MonitorState.SUSPECT, MonitorState.DEAD))
+
+        return transitions
+
+    def next_deadline(self):
+        """Returns the earliest pending deadline (may be stale) or None"""
+        return self.__deadlines[0][0] if self.__deadlines else None
+
+    def __schedule(self, monitor_id, deadline):
+        self.__monitors[monitor_id]["deadline"] = deadline
+        heapq.heappush(self.__deadlines, (deadline, monitor_id))
@@ -0,0 +1,147 @@
+import json
+import os
+import queue
+import threading
+import time
+
+from termcolor import colored
+
+
+class LogSink:
+    """
+        Buffered, non-blocking sink for the log messages of the c2 and all monitors.
+        submit() only samples and enqueues a record, so it is safe to call on the asyncua event loop. A background
+        thread writes the records in batches as JSON lines to a size-rotated file and prints a colored tail to the
+        console. The tail can be rate limited, warnings and errors are always printed.
+    """
+
+    important = ("WARNING", "ERROR", "CRITICAL")  # Severities that are never sampled or rate limited
+
+    colors = ['red', 'green', 'yellow', 'blue', 'magenta', 'cyan', 'white']
+
+    def __init__(self, path=None, max_bytes=10 * 1024 * 1024, backup_count=5, sample_rate=0, tail_rate=None,
+                 queue_size=10000, flush_interval=1.0):
+        self.path = path  # JSON lines file. None disables file output
+        self.max_bytes = max_bytes  # Size at which the file is rotated
+        self.backup_count = backup_count  # Number of rotated files that are kept
+        self.sample_rate = sample_rate  # Maximum records per second and source below WARNING. 0 = keep all
+        # Maximum lines per second below WARNING printed to the console. None = all lines, 0 = no console output
+        self.tail_rate = tail_rate
+        self.flush_interval = flush_interval  # Maximum delay of a record in seconds
+
+        self.dropped = 0  # Records dropped because the queue was full
+        self.sampled = 0  # Records dropped by sampling
+
+        self.__queue = queue.Queue(maxsize=queue_size)
+        # Per source token buckets for sampling: {source: [tokens, last_refill]}
+        self.__buckets = {}
+        self.__color_mapping = {}
+        self.__file = None
+        self.__thread = None
+        self.__running = False
+
+    def start(self) -> None:
+        if self.path is not None:
+            self.__file = open(self.path, "a")
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, name="log-sink", daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """Writes all queued records and stops the background thread"""
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+        if self.__file is not None:
+            self.__file.close()
+
+    def submit(self, record) -> bool:
+        """
+            Queues a record {"time", "source", "uuid", "severity", "message"} without blocking.
+            Returns False if the record was sampled out or dropped.
+        """
+        if self.sample_rate and record.get("severity") not in self.important:
+            if not self.__take_token(record.get("uuid")):
+                self.sampled += 1
+                return False
+
+        try:
+            self.__queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def __take_token(self, source) -> bool:
+        now = time.monotonic()
+        bucket = self.__buckets.get(source)
+        if bucket is None:
+            bucket = self.__buckets[source] = [self.sample_rate, now]
+
+        bucket[0] = min(self.sample_rate, bucket[0] + (now - bucket[1]) * self.sample_rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def __run(self) -> None:
+        tail_tokens = self.tail_rate or 0
+        tail_refill = time.monotonic()
+        tail_skipped = 0
+
+        while self.__running or not self.__queue.empty():
+            # Collect everything that arrived within one flush interval into a single batch
+            batch = []
+            try:
+                batch.append(self.__queue.get(timeout=self.flush_interval))
+                while True:
+                    batch.append(self.__queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not batch:
+                continue
+
+            if self.__file is not None:
+                self.__file.write("".join(json.dumps(record, default=str) + "\n" for record in batch))
+                self.__file.flush()
+                if self.__file.tell() >= self.max_bytes:
+                    self.__rotate()
+
+            if self.tail_rate is None:
+                for record in batch:
+                    print(self.__format(record))
+            elif self.tail_rate:
+                now = time.monotonic()
+                tail_tokens = min(self.tail_rate, tail_tokens + (now - tail_refill) * self.tail_rate)
+                tail_refill = now
+                for record in batch:
+                    if record.get("severity") not in self.important:
+                        if tail_tokens < 1:
+                            tail_skipped += 1
+                            continue
+                        tail_tokens -= 1
+                    if tail_skipped:
+                        print(f"... {tail_skipped} log lines not shown")
+                        tail_skipped = 0
+                    print(self.__format(record))
+
+    def __format(self, record) -> str:
+        text = f"[{record['source']} {record['uuid']}] [{record['severity']}]: {record['time']} - {record['message']}"
+        color = self.__color_mapping.get(record['uuid'])
+        if color is None:
+            color = self.colors[len(self.__color_mapping) % len(self.colors)]
+            self.__color_mapping[record['uuid']] = color
+        return colored(text, color, attrs=['reverse'])
+
+    def __rotate(self) -> None:
+        """Rotates like logging.handlers.RotatingFileHandler: file -> file.1 -> file.2 ..."""
+        self.__file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.__file = open(self.path, "a")
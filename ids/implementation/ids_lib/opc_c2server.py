@@ -5,8 +5,9 @@ import uuid
 from enum import Enum
 import itertools
 import logging
+import queue
 import datetime
-from termcolor import colored
+import time
 import websockets
 
 from asyncua import ua, Server, Client
@@ -16,7 +17,16 @@ from asyncua.crypto.security_policies import SecurityPolicyBasic256Sha256
 from asyncua.server.user_managers import CertificateUserManager
 
 from .util.generate_border_regions import calculateFromJSON
+from .util.nm_assignment import assign_neighborhood_monitors, load_imbalance, load_model, predicted_max_load, \
+    region_cost
+from .util.partition import shared_power_lines
 from .config.config_c2 import C2Config
+from .liveness_tracker import LivenessTracker, MonitorState
+from .c2_federation import FederationClient
+from .log_sink import LogSink
+from .telemetry import FleetTelemetry
+from .incident_correlator import ComponentGraph, IncidentCorrelator
+from .req_checker_global import ReqCheckerGlobal
 
 
 class C2Status(Enum):
@@ -27,35 +37,34 @@ class C2Status(Enum):
     SHOULD_RECONFIGURE = 4
 
 
-class ColoredLogger(logging.Handler):
+class LogSinkHandler(logging.Handler):
+    """ Passes the log messages of the c2 itself to the log sink"""
+
+    def __init__(self, uuid):
+        super().__init__()
+        self.uuid = uuid
+
     def emit(self, record):
-        now = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
-        text = f"[C2] [{record.levelname}]: {now} - {record.getMessage()}"
-        print(colored(text, "white", attrs=['reverse']))
+        log_sink.submit({
+            "time": datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f'),
+            "source": "C2",
+            "uuid": self.uuid,
+            "severity": record.levelname,
+            "message": record.getMessage()
+        })
 
 
 class LogEventListener:
-    """ Listens to log-events from monitors"""
-
-    def __init__(self):
-        self.colorMapping = {}
-        self.colors = ['red',
-                       'green',
-                       'yellow',
-                       'blue',
-                       'magenta',
-                       'cyan',
-                       'white']
+    """ Listens to log-events from monitors and passes them to the log sink without blocking the event loop"""
 
     async def event_notification(self, event):
-        text = f"[{event.type} {event.uuid}] [{event.severity}]: {event.Time} - {event.message}"
-        color = self.colorMapping.get(event.uuid)
-        if color is None:
-            color = self.colors[len(self.colorMapping) % len(self.colors)]
-            self.colorMapping[event.uuid] = color
-
-        out = colored(text, color, attrs=['reverse'])
-        print(out)
+        log_sink.submit({
+            "time": event.Time,
+            "source": event.type,
+            "uuid": str(event.uuid),
+            "severity": event.severity,
+            "message": event.message
+        })
 
 
 class ReqViolationEventListener:
@@ -67,51 +76,72 @@ class ReqViolationEventListener:
                   "requirement": event.requirement,
                   "component_id": event.component_id
                   }
-        c2.reports.append(report)
-        c2.reports = c2.reports[-256:]
-        pass
+        c2.add_report(report)
+
+
+class UsageDataListener:
+    """ Listens to changes of the usage data (cpu and memory load, cycle time) published by monitors"""
+
+    def __init__(self, telemetry):
+        self.__telemetry = telemetry
+
+    def usage_notification(self, monitor, usage):
+        monitor['cpu_load'] = usage.cpu_load
+        monitor['memory_load'] = usage.memory_load
+        self.__telemetry.record(monitor['id'], monitor['type'], usage)
+
+
+class SnapshotListener:
+    """ Listens to the RTU data published by LMs and passes it to the global requirement checker"""
+
+    def __init__(self, checker):
+        self.__checker = checker
+
+    def snapshot_notification(self, monitor, rtu_data):
+        self.__checker.update(monitor['id'], rtu_data, time.monotonic())
+
+
+class MonitorEventDispatcher:
+    """ Demultiplexes the events and data changes of a monitor subscription to their listeners"""
+
+    def __init__(self, monitor, listeners, usage_listener, snapshot_listener=None):
+        self.__monitor = monitor
+        # Maps the node id of an event type to its listener
+        self.__listeners = listeners
+        self.__usage_listener = usage_listener
+        self.__snapshot_listener = snapshot_listener
+        # Node id of the data node of an LM, if subscribed
+        self.data_node_id = None
+
+    def datachange_notification(self, node, val, data):
+        if val is None:
+            return
+        if node.nodeid == self.data_node_id:
+            self.__snapshot_listener.snapshot_notification(self.__monitor, val)
+        else:
+            self.__usage_listener.usage_notification(self.__monitor, val)
+
+    async def event_notification(self, event):
+        listener = self.__listeners.get(event.EventType)
+        if listener is None:
+            logger.error("Received event of unknown type '%r'" % event)
+            return
+        await listener.event_notification(event)
 
 
 class HeartbeatEventListener:
     """
-        Listens to all heartbeat events to ensure all registered monitors are running at all times.
-         If a monitor hasn't sent a heartbeat during the last 5 seconds, an error will be logged.
+        Listens to all heartbeat events and forwards them to the liveness tracker.
+        Failure detection itself happens in C2.watch_liveness, independent of heartbeat traffic.
     """
 
-    def __init__(self):
-        print("Heartbeat init")
-        self.nodes = dict()
-        self.time_span = datetime.timedelta(hours=0, minutes=0, seconds=10)
+    def __init__(self, liveness_tracker):
+        self.__liveness_tracker = liveness_tracker
 
     async def event_notification(self, event):
-        event_node_id = event.sender
-
-        # if node is nonexistent in dictionary, add it to it with the timestamp
-        if not self.nodes.get(event_node_id):
-            self.nodes[event_node_id] = event.Time
-            logger.info("Node with identifier " + str(event_node_id) + " has sent it's first heartbeat!")
-
-        # if node is existent in dictionary, update the timestamp
-        elif self.nodes.get(event_node_id) != event.Time:
-            self.nodes[event_node_id] = event.Time
-            # if event_node_id == "demo_nm_1": # testing purposes
-
-        # check the timestamps. If a monitor hasn't sent a heartbeat for the past 3 seconds, log an error message
-        # and trigger a reconfiguration of border region
-        # print("##############################")
-        # for node, time in self.nodes.items():
-        #    print(node)
-        #    print(time)
-        #    print("+++++++++++++++++++++++++++")
-        # print("##############################")
-
-        for key in list(self.nodes.keys()):
-            # print(datetime.datetime.now(tz=datetime.timezone.utc) - self.nodes[key].replace(tzinfo=datetime.timezone.utc))
-            if datetime.datetime.now(tz=datetime.timezone.utc) - self.nodes[key].replace(tzinfo=datetime.timezone.utc) \
-                    > self.time_span:
-                logger.error(f"There was no heartbeat for %s seconds from: %s", str(self.time_span.seconds), str(key))
-                await c2.delete_monitor(key)
-                del self.nodes[key]
+        transition = self.__liveness_tracker.beat(str(event.sender))
+        if transition is not None:
+            logger.info("Monitor %s has recovered and sends heartbeats again", transition[0])
 
 
 class C2:
@@ -132,14 +162,54 @@ class C2:
         # TODO: Refactor this
         self.reports = []
 
+        # Groups reports into incidents based on the topology described by the RTU configs of the LMs
+        self.incidents = IncidentCorrelator(ComponentGraph(), self.config.incident_window, self.config.incident_radius)
+
         self.__log_event_listener = LogEventListener()
+        self.__violation_event_listener = ReqViolationEventListener()
 
-        self.__heartbeat_event_listener = HeartbeatEventListener()
+        # Deadline ordered failure detection, checked periodically by watch_liveness
+        self.__liveness_tracker = LivenessTracker({
+            "LM": (self.config.lm_suspect_after, self.config.lm_dead_after),
+            "NM": (self.config.nm_suspect_after, self.config.nm_dead_after),
+        })
+        self.__heartbeat_event_listener = HeartbeatEventListener(self.__liveness_tracker)
+        self.__liveness_task = None  # Task running watch_liveness, cancelled when run ends
+        self.__global_check_task = None  # Task running run_global_checks, cancelled when run ends
+        # Usage time series of all monitors, served via the websocket
+        self.telemetry = FleetTelemetry()
+        self.__usage_data_listener = UsageDataListener(self.telemetry)
+
+        # Grid wide requirements, checked on the snapshots of all LMs by run_global_checks
+        self.__global_violations = queue.SimpleQueue()
+        self.global_checker = None
+        self.__snapshot_listener = None
+        if self.config.global_check_interval > 0:
+            self.global_checker = ReqCheckerGlobal(self.__global_violations, logger,
+                                                   self.config.global_alignment_window,
+                                                   state_estimation=self.config.global_state_estimation,
+                                                   residual_threshold=self.config.global_residual_threshold)
+            self.__snapshot_listener = SnapshotListener(self.global_checker)
+
+        # Time of the last configuration of the network, used to rate limit rebalancing
+        self.__last_configuration = 0
+        # Cost of the border regions of each LM and border regions written to each NM by the last configuration
+        self.__lm_costs = {}
+        self.__nm_configs = None
+
+        # Federation: regions registered with this c2 (as parent) and the connection to our parent c2 (as region)
+        self.__regions = {}
+        self.__regions_changed = False
+        self.__federation = FederationClient(self.config, logger) if self.config.parent_address else None
+        self.__federation_task = None
 
     async def _init(self) -> None:
         """Initializes the OPC Server"""
 
         logger.info(self.config)
+        # Limits the number of monitors we attach to concurrently
+        self.__attach_slots = asyncio.Semaphore(self.config.attach_workers)
+
         # initialize user-manager for managing lms and nms and their certificates
         cert_user_manager = CertificateUserManager()
         self.__server = Server(user_manager=cert_user_manager)
@@ -149,6 +219,8 @@ class C2:
         self.__server.set_security_policy([ua.SecurityPolicyType.Basic256Sha256_SignAndEncrypt])
         await cert_user_manager.add_user(self.config.lm_cert, name="lm")
         await cert_user_manager.add_user(self.config.nm_cert, name="nm")
+        # Regional c2s of a federation use the same certificate as this c2
+        await cert_user_manager.add_user(self.config.cert, name="c2")
 
         #set endpoint
         await server.init()
@@ -188,6 +260,12 @@ class C2:
                                                 ua.Variant(defaultConfig, ua.VariantType.ExtensionObject))
         await var.set_modelling_rule(True)
 
+        # Regional c2s receive their cross partition border regions in the same format as NMs
+        self.opcRegionType = await server.nodes.base_object_type.add_object_type(idx, "Region")
+        var = await self.opcRegionType.add_variable(idx, "config",
+                                                    ua.Variant(defaultConfig, ua.VariantType.ExtensionObject))
+        await var.set_modelling_rule(True)
+
         # Add C2 Object and add methods for registering
         c2 = await server.nodes.objects.add_object(idx, "C2")
 
@@ -202,6 +280,29 @@ class C2:
                             [ua.VariantType.Guid, ua.VariantType.String],
                             [ua.VariantType.StatusCode])
 
+        # Methods used by regional c2s
+        await c2.add_method(self.__idx,
+                            "registerRegion",
+                            self.registerRegion,
+                            [ua.VariantType.String, ua.VariantType.String],
+                            [ua.VariantType.StatusCode])
+        await c2.add_method(self.__idx,
+                            "registerRegionLM",
+                            self.registerRegionLM,
+                            [ua.VariantType.String, ua.VariantType.String, ua.VariantType.String,
+                             ua.VariantType.String],
+                            [ua.VariantType.StatusCode])
+        await c2.add_method(self.__idx,
+                            "unregisterRegionLM",
+                            self.unregisterRegionLM,
+                            [ua.VariantType.String, ua.VariantType.String],
+                            [ua.VariantType.StatusCode])
+        await c2.add_method(self.__idx,
+                            "reportViolations",
+                            self.reportViolations,
+                            [ua.VariantType.String, ua.VariantType.String],
+                            [ua.VariantType.StatusCode])
+
     @uamethod
     async def registerLM(self, parent, id: str, address: str, config: str) -> ua.StatusCode:
         """Registers an LM with this C2. Triggers reconfiguration of the network as border_regions will have changed."""
@@ -209,13 +310,22 @@ class C2:
         logger.info(f"LM with id: '{id}' has registered")
         self.__local_monitors.append({
             "id": id,
+            "type": "LM",
             "address": address,
             "rtu_config": config,
             "client": None,
-            "log_subscription": None,
-            "violation_subscription": None
+            "subscription": None,
+            "backoff": 0,
+            "next_attempt": 0
         })
 
+        self.__liveness_tracker.watch(id, "LM")
+
+        try:
+            self.incidents.graph.add_rtu_config(config)
+        except (ValueError, KeyError) as e:
+            logger.error(f"Could not add the RTU config of LM '{id}' to the component graph: {e}")
+
         # schedule recalculation as new LM is available
         self.status = C2Status.SHOULD_RECONFIGURE
 
@@ -232,27 +342,101 @@ class C2:
         # Create internal Object
         self.__neighborhood_monitors.append({
             "id": id,
+            "type": "NM",
             "border_regions": [],
             "address": addr,
             "opc_ref": opc_ref,
             "client": None,
-            "log_subscription": None,
-            "violation_subscription": None
+            "subscription": None,
+            "backoff": 0,
+            "next_attempt": 0
         })
 
+        self.__liveness_tracker.watch(id, "NM")
+
         # A new NM is available so leave waiting status
         if self.status == C2Status.WAITING_FOR_NM:
             self.status = C2Status.SHOULD_RECONFIGURE
 
         return ua.StatusCodes.Good
 
-    async def connect_event_handlers(self, monitors, cert):
+    @uamethod
+    async def registerRegion(self, parent, id: str, address: str) -> ua.StatusCode:
+        """Registers a regional c2. A region that registers again (e.g. after a reconnect) keeps its LMs."""
+
+        logger.info(f"Region with id: '{id}' has registered")
+        if id not in self.__regions:
+            opc_ref = await self.__server.nodes.objects.add_object(self.__idx, id, self.opcRegionType)
+            self.__regions[id] = {
+                "id": id,
+                "opc_ref": opc_ref,
+                "local_monitors": {},
+                "border_regions": []
+            }
+        self.__regions[id]['address'] = address
+        self.__regions_changed = True
 
-        for monitor in monitors:
-            # Skip if we are already connected
-            if monitor['client'] is not None:
-                continue
+        return ua.StatusCodes.Good
+
+    @uamethod
+    async def registerRegionLM(self, parent, region_id: str, id: str, address: str, config: str) -> ua.StatusCode:
+        """Registers an LM managed by a regional c2. Triggers recalculation of the cross partition border regions."""
+
+        region = self.__regions.get(region_id)
+        if region is None:
+            return ua.StatusCodes.BadNotFound
+
+        region['local_monitors'][id] = {"id": id, "address": address, "rtu_config": config}
+        try:
+            self.incidents.graph.add_rtu_config(config)
+        except (ValueError, KeyError) as e:
+            logger.error(f"Could not add the RTU config of LM '{id}' to the component graph: {e}")
+        self.__regions_changed = True
+
+        return ua.StatusCodes.Good
+
+    @uamethod
+    async def unregisterRegionLM(self, parent, region_id: str, id: str) -> ua.StatusCode:
+        """Removes an LM that its regional c2 has removed"""
+
+        region = self.__regions.get(region_id)
+        if region is None or region['local_monitors'].pop(id, None) is None:
+            return ua.StatusCodes.BadNotFound
 
+        self.__regions_changed = True
+        return ua.StatusCodes.Good
+
+    @uamethod
+    async def reportViolations(self, parent, region_id: str, reports: str) -> ua.StatusCode:
+        """Receives a batch of violation reports (json array) from a regional c2"""
+
+        for report in json.loads(reports):
+            self.add_report(report)
+
+        return ua.StatusCodes.Good
+
+    def add_report(self, report) -> None:
+        """Stores a violation report for the visualization and forwards it to the parent c2 if there is one"""
+        self.reports.append(report)
+        self.reports = self.reports[-256:]
+        self.incidents.add(report)
+        if self.__federation is not None:
+            self.__federation.add_report(report)
+
+    async def connect_event_handlers(self, monitors):
+        """
+            Attaches to all monitors we are not connected to yet. Takes a list of (monitor, server_certificate) pairs.
+            Monitors are attached concurrently by at most config.attach_workers workers, so a single unreachable
+            monitor does not delay the others. Failed monitors are retried with exponential backoff.
+        """
+        now = time.monotonic()
+        pending = [(monitor, cert) for monitor, cert in monitors
+                   if monitor['client'] is None and monitor['next_attempt'] <= now]
+        await asyncio.gather(*(self.__attach_monitor(monitor, cert) for monitor, cert in pending))
+
+    async def __attach_monitor(self, monitor, cert):
+        """Connects to a monitor and subscribes to its log, violation and heartbeat events with one subscription"""
+        async with self.__attach_slots:
             # Create listening client
             client = Client(url=monitor['address'])
             await client.set_security(
@@ -266,70 +450,71 @@ class C2:
             try:
                 await client.connect()
                 logger.info(f"c2 connected to monitor {monitor['id']}")
-            except BaseException as e:
+            except Exception:
+                self.__backoff(monitor)
                 logger.error(f"Connection error while connecting to monitor '{monitor['id']}' "
-                             f"on '{monitor['address']}'. Retrying soon.")
-                continue
+                             f"on '{monitor['address']}'. Retrying in {monitor['backoff']} seconds.")
+                return
 
-            await client.load_data_type_definitions()
-            monitor['client'] = client
-
-            # Get event definition
-            root = client.get_root_node()
-            violation_event_type = \
-                await root.get_child(["0:Types", "0:EventTypes", "0:BaseEventType", "2:ReqViolationEvent"])
-            log_event_type = \
-                await root.get_child(["0:Types", "0:EventTypes", "0:BaseEventType", "2:LogEvent"])
-            heartbeat_event_type = \
-                await root.get_child(["0:Types", "0:EventTypes", "0:BaseEventType", "2:Heartbeat"])
-
-            # Register event handlers
-            log_handler = self.__log_event_listener
-            log_subscription = await client.create_subscription(1000, log_handler)
-            while True:
-                try:
-                    await log_subscription.subscribe_events(evtypes=log_event_type)
-                    break
-                except asyncio.exceptions.TimeoutError:
-                    # TODO: refine error message
-                    logger.error(
-                        "Connection timeout while subscribing to events. Retrying in 5 seconds")
-                    await asyncio.sleep(5)
-            monitor['log_subscription'] = log_subscription
-
-            violation_handler = ReqViolationEventListener()
-            violation_subscription = await client.create_subscription(1000, violation_handler)
-            while True:
-                try:
-                    await violation_subscription.subscribe_events(evtypes=violation_event_type)
-                    break
-                except asyncio.exceptions.TimeoutError:
-                    # TODO: refine error message
-                    logger.error(
-                        "Connection timeout while subscribing to events. Retrying in 5 seconds")
-                    await asyncio.sleep(5)
-            monitor['violation_subscription'] = violation_subscription
-
-            heartbeat_handler = self.__heartbeat_event_listener
-            heartbeat_subscription = await client.create_subscription(1000, heartbeat_handler)
-            while True:
+            try:
+                await client.load_data_type_definitions()
+
+                # Get event definitions and map them to their listeners
+                root = client.get_root_node()
+                listeners = {}
+                event_types = []
+                for event_name, listener in (("LogEvent", self.__log_event_listener),
+                                             ("ReqViolationEvent", self.__violation_event_listener),
+                                             ("Heartbeat", self.__heartbeat_event_listener)):
+                    event_type = await root.get_child(["0:Types", "0:EventTypes", "0:BaseEventType",
+                                                       f"2:{event_name}"])
+                    listeners[event_type.nodeid] = listener
+                    event_types.append(event_type)
+
+                # Register a single subscription for all event types and the usage data of the monitor
+                dispatcher = MonitorEventDispatcher(monitor, listeners, self.__usage_data_listener,
+                                                    self.__snapshot_listener)
+                subscription = await client.create_subscription(1000, dispatcher)
+                await subscription.subscribe_events(evtypes=event_types)
+
+                idx = await client.get_namespace_index(self.config.opc_domain)
+                usage_node = await root.get_child(["0:Objects", f"{idx}:{monitor['type']}", f"{idx}:usage"])
+                await subscription.subscribe_data_change(usage_node)
+
+                # The global checker needs the measurements of every LM
+                if monitor['type'] == "LM" and self.global_checker is not None:
+                    data_node = await root.get_child(["0:Objects", f"{idx}:LM", f"{idx}:data"])
+                    dispatcher.data_node_id = data_node.nodeid
+                    await subscription.subscribe_data_change(data_node)
+            except Exception as e:
+                self.__backoff(monitor)
+                logger.error(f"Error while subscribing to events of monitor '{monitor['id']}': {e}. "
+                             f"Retrying in {monitor['backoff']} seconds.")
                 try:
-                    await heartbeat_subscription.subscribe_events(evtypes=heartbeat_event_type)
-                    break
-                except asyncio.exceptions.TimeoutError:
-                    # TODO: refine error message
-                    logger.error(
-                        "Connection timeout while subscribing to heartbeatevents. Retrying in 5 seconds")
-                    await asyncio.sleep(5)
+                    await client.disconnect()
+                except Exception:
+                    pass
+                return
+
+        monitor['client'] = client
+        monitor['subscription'] = subscription
+        monitor['backoff'] = 0
+
+        # Notify Monitor that they are registered and we are listening to events
+        await (await self.__server.get_event_generator()).trigger(message="isRegistered")
 
-            # Notify Monitor that they are registered and we are listening to events
-            await (await self.__server.get_event_generator()).trigger(message="isRegistered")
+    def __backoff(self, monitor):
+        """Doubles the retry delay of a monitor that could not be attached"""
+        monitor['backoff'] = min(max(monitor['backoff'] * 2, self.config.attach_backoff_initial),
+                                 self.config.attach_backoff_max)
+        monitor['next_attempt'] = time.monotonic() + monitor['backoff']
 
     def check_current_configuration(self) -> bool:
         """Does a sanity check if recalculation of configuration configuration is possible"""
 
-        # Check that we have more than 1 LM
-        if len(self.__local_monitors) < 2:
+        # Check that we have more than 1 LM. A regional c2 may also have a single LM with cross partition border regions
+        cross_regions = self.__federation.cross_regions if self.__federation is not None else []
+        if len(self.__local_monitors) < 2 and not (self.__local_monitors and cross_regions):
             logger.error(f"skipping calculate_border_region as we do not have enough LMs registered. "
                          f"Needed: >2 but currently only have {len(self.__local_monitors)}")
             self.status = C2Status.WAITING_FOR_LM
@@ -349,8 +534,12 @@ class C2:
     async def configure_network(self) -> None:
         """Configures the IDS communication network"""
 
+        if self.global_checker is not None:
+            self.global_checker.set_local_monitors(self.__local_monitors)
+
         # Checks if configuring is even possible
         if not self.check_current_configuration():
+            self.__nm_configs = None
             return
 
         # Convenience
@@ -361,17 +550,9 @@ class C2:
         for nm in neighborhood_monitors:
             nm['border_regions'] = []
 
-        # Assign each NM to an LM
-        # TODO: Add affinity to NM so NM_xyz is always connected to LM_xyz.
-        #  This may be desirable, e.g. if they are physically close to each other
-        #  To do this the LM/NM probably needs to tell us which LM/NM id should be used
-        #  For now we just assign based on their order of registration
-        nm_index = 0
-        for lm in local_monitors:
-            lm['assigned_nm'] = neighborhood_monitors[nm_index]
-            nm_index += 1
-
         # For each pair of local monitors calculate the border region
+        opc_border_regions = []
+        lm_costs = {lm['id']: 0 for lm in local_monitors}
         for pair in itertools.combinations(local_monitors, 2):
             lm_1 = pair[0]
             lm_2 = pair[1]
@@ -381,17 +562,51 @@ class C2:
                                                      {'id': lm_2['id'], 'config': lm_2['rtu_config']})
 
             # Generate config
-            opc_border_region = ua.BorderRegion()
-            opc_border_region.uuid = uuid.uuid4()
-            opc_border_region.lm_1_id = lm_1['id']
-            opc_border_region.lm_2_id = lm_2['id']
-            opc_border_region.lm_1_address = lm_1['address']
-            opc_border_region.lm_2_address = lm_2['address']
-            opc_border_region.region_definition = json.dumps(border_region)
-
-            # Assign border_region to both participating NMs
+            opc_border_region = create_opc_border_region(lm_1, lm_2, border_region)
+            opc_border_regions.append((lm_1, lm_2, opc_border_region))
+
+            # Both LMs' NMs have to evaluate this border region
+            if isinstance(border_region, dict):
+                cost = sum(region_cost(region) for region in border_region.values())
+                lm_costs[lm_1['id']] += cost
+                lm_costs[lm_2['id']] += cost
+
+        # Border regions between our LMs and LMs of other partitions, assigned by the parent c2
+        cross_regions = []
+        if self.__federation is not None:
+            lms_by_id = {lm['id']: lm for lm in local_monitors}
+            for opc_border_region in self.__federation.cross_regions:
+                lm = lms_by_id.get(opc_border_region.lm_1_id) or lms_by_id.get(opc_border_region.lm_2_id)
+                if lm is None:
+                    continue
+                cross_regions.append((lm, opc_border_region))
+                border_region = json.loads(opc_border_region.region_definition)
+                lm_costs[lm['id']] += sum(region_cost(region) for region in border_region.values())
+
+        # Assign each LM a distinct NM. Expensive LMs get the least loaded NMs
+        assignment = assign_neighborhood_monitors(local_monitors, neighborhood_monitors, lm_costs,
+                                                  self.config.rebalance_threshold, self.config.nm_affinity)
+        for lm in local_monitors:
+            lm['assigned_nm'] = assignment[lm['id']]
+        self.__lm_costs = lm_costs
+
+        # Assign border_region to both participating NMs
+        for lm_1, lm_2, opc_border_region in opc_border_regions:
             lm_1['assigned_nm']['border_regions'].append(opc_border_region)
             lm_2['assigned_nm']['border_regions'].append(opc_border_region)
+        for lm, opc_border_region in cross_regions:
+            lm['assigned_nm']['border_regions'].append(opc_border_region)
+
+        # The border regions get new uuids on every calculation, so they are compared by their definition
+        nm_configs = {nm['id']: [(region.lm_1_id, region.lm_2_id, region.region_definition)
+                                 for region in nm['border_regions']]
+                      for nm in neighborhood_monitors}
+        if nm_configs == self.__nm_configs:
+            logger.info("Assignment and border regions are unchanged, the NMs keep their config")
+            self.status = C2Status.RUNNING
+            self.__last_configuration = time.monotonic()
+            return
+        self.__nm_configs = nm_configs
 
         # Assign config to each monitor via OPC:
         for nm in neighborhood_monitors:
@@ -409,14 +624,108 @@ class C2:
 
         # leave status C2Status.SHOULD_RECONFIGURE
         self.status = C2Status.RUNNING
+        self.__last_configuration = time.monotonic()
+
+    async def configure_federation(self) -> None:
+        """
+            Calculates the border regions between LMs of different regions and assigns each of them to both regions.
+            Border regions inside a region are handled by the regional c2 itself.
+        """
+        self.__regions_changed = False
+        regions = list(self.__regions.values())
+        for region in regions:
+            region['border_regions'] = []
+
+        region_of = {}
+        configs = []
+        for region in regions:
+            for lm in region['local_monitors'].values():
+                region_of[lm['id']] = region
+                configs.append({'id': lm['id'], 'config': lm['rtu_config']})
+
+        # Only pairs of LMs that actually share power lines can form a border region
+        for lm_1_id, lm_2_id in shared_power_lines(configs):
+            region_1, region_2 = region_of[lm_1_id], region_of[lm_2_id]
+            if region_1 is region_2:
+                continue
+
+            lm_1 = region_1['local_monitors'][lm_1_id]
+            lm_2 = region_2['local_monitors'][lm_2_id]
+            border_region = calculate_border_regions({'id': lm_1['id'], 'config': lm_1['rtu_config']},
+                                                     {'id': lm_2['id'], 'config': lm_2['rtu_config']})
+            opc_border_region = create_opc_border_region(lm_1, lm_2, border_region)
+            region_1['border_regions'].append(opc_border_region)
+            region_2['border_regions'].append(opc_border_region)
+
+        for region in regions:
+            opc_region_config = await region['opc_ref'].get_child([f"{self.__idx}:config"])
+            config = ua.NMConfig()
+            config.uuid = uuid.uuid4()
+            config.regions = region['border_regions']
+            await opc_region_config.write_value(config)
+
+        logger.info(f"Configured {len(regions)} regions with "
+                    f"{sum(len(region['border_regions']) for region in regions) // 2} cross partition border regions")
+
+        # Notify regional c2s so they can reload
+        await (await self.__server.get_event_generator()).trigger(message="reconfigureRegions")
+
+    async def sync_federation(self) -> None:
+        """Exchanges LMs, reports and cross partition border regions with the parent c2"""
+        federation = self.__federation
+        if federation.changed:
+            federation.changed = False
+            self.status = C2Status.SHOULD_RECONFIGURE
+
+        try:
+            await federation.sync(self.__local_monitors)
+        except Exception as e:
+            logger.error(f"Lost connection to parent c2: {e}. Reconnecting.")
+            federation.client = None
+            self.__federation_task = asyncio.create_task(federation.connect())
+
+    def check_load_balance(self) -> None:
+        """
+            Schedules a reconfiguration if the load of the NMs has drifted apart by more than the threshold and a new
+            assignment would lower the load of the most loaded NM
+        """
+        if self.status != C2Status.RUNNING:
+            return
+        if time.monotonic() - self.__last_configuration < self.config.rebalance_interval:
+            return
+
+        # Spare NMs without an LM are idle by design and do not count
+        imbalance = load_imbalance(self.__local_monitors)
+        if imbalance <= self.config.rebalance_threshold:
+            return
+
+        # The load of the border regions moves with their LM, only rebalance if the most loaded NM gets relieved
+        rate, base = load_model(self.__local_monitors, self.__neighborhood_monitors, self.__lm_costs)
+        current = {lm['id']: lm['assigned_nm'] for lm in self.__local_monitors if lm.get('assigned_nm') is not None}
+        proposed = assign_neighborhood_monitors(self.__local_monitors, self.__neighborhood_monitors, self.__lm_costs,
+                                                self.config.rebalance_threshold, self.config.nm_affinity)
+        if predicted_max_load(proposed, self.__lm_costs, rate, base) < \
+                predicted_max_load(current, self.__lm_costs, rate, base):
+            logger.info(f"NM load differs by {imbalance:.1f}% cpu. Rebalancing border regions.")
+            self.status = C2Status.SHOULD_RECONFIGURE
 
     # Intermediate between reported requirement violations and "webvis" website
     async def websocket_handle(self, ws, path):
         async for message in ws:
             message_json = json.loads(message)
 
+            # Violation reports of the virtual grid arrive in batches (JSON arrays)
+            if isinstance(message_json, list):
+                for report in message_json:
+                    if report.get("type") == "report":
+                        self.add_report(report)
+                continue
+
             # Differentiate message types for future extensibility of communication between Visualization <-> C2
-            if message_json["type"] == "query":
+            if message_json["type"] == "report":
+                self.add_report(message_json)
+
+            elif message_json["type"] == "query":
                 last_timestamp = message_json["timestamp"]
 
                 # Gather all reports that happened later than the last timestamp
@@ -430,7 +739,64 @@ class C2:
                     # Package reports in json array
                     await ws.send(json.dumps(new_reports))
 
+            elif message_json["type"] == "incidents":
+                # Correlated incidents that received reports later than the given timestamp
+                incidents = self.incidents.incidents_since(message_json["timestamp"])
+                if len(incidents) > 0:
+                    await ws.send(json.dumps(incidents))
+
+            elif message_json["type"] == "telemetry":
+                # Usage time series of the monitors, e.g. {"type": "telemetry", "resolution": 60, "since": <ts>}
+                try:
+                    reply = self.telemetry.query(message_json.get("resolution", 1),
+                                                 message_json.get("since", 0),
+                                                 message_json.get("monitors"))
+                except ValueError as e:
+                    reply = {"type": "error", "message": str(e)}
+                await ws.send(json.dumps(reply))
+
+    async def run_global_checks(self):
+        """Periodically checks the grid wide requirements and reports violations like those of the monitors"""
+        while True:
+            await asyncio.sleep(self.config.global_check_interval)
+            try:
+                self.global_checker.check_requirements()
+            except Exception as e:
+                logger.error(f"Exception in global requirement checker: {e}")
+
+            while not self.__global_violations.empty():
+                violation = self.__global_violations.get_nowait()
+                self.add_report({"type": "report",
+                                 "timestamp": int(time.time()),
+                                 "requirement": violation["req_id"],
+                                 "component_id": violation["component_id"]
+                                 })
+
+    async def watch_liveness(self):
+        """Periodically expires heartbeat deadlines and removes monitors that are considered dead"""
+        while True:
+            await asyncio.sleep(self.config.liveness_check_interval)
+            for monitor_id, _, new_state in self.__liveness_tracker.expire():
+                # A failed removal (e.g. a dead connection to an LM) must not stop the failure detection
+                try:
+                    if new_state == MonitorState.SUSPECT:
+                        logger.warning("Monitor %s is suspected to have failed, no heartbeat for %s seconds",
+                                       monitor_id, self.__grace_period(monitor_id, 0))
+                    elif new_state == MonitorState.DEAD:
+                        logger.error("There was no heartbeat for %s seconds from: %s",
+                                     self.__grace_period(monitor_id, 1), monitor_id)
+                        await self.delete_monitor(monitor_id)
+                except Exception as e:
+                    logger.error(f"Exception while removing monitor {monitor_id}: {e}")
+
+    def __grace_period(self, monitor_id, index):
+        if any(monitor['id'] == monitor_id for monitor in self.__neighborhood_monitors):
+            return (self.config.nm_suspect_after, self.config.nm_dead_after)[index]
+        return (self.config.lm_suspect_after, self.config.lm_dead_after)[index]
+
     async def delete_monitor(self, monitorId):
+        self.__liveness_tracker.forget(monitorId)
+        self.telemetry.forget(monitorId)
         for monitor in self.__neighborhood_monitors:
             if monitorId == monitor['id']:
                 self.__neighborhood_monitors.remove(monitor)
@@ -459,14 +825,30 @@ class C2:
         async with self.__server:
             async with websockets.serve(self.websocket_handle, "0.0.0.0", 8777):
                 logger.info("[WEBSOCKET] Started websocket at localhost:8777")
-                while True:
-                    # TODO only trigger this if new monitors have registered.
-                    await self.connect_event_handlers(self.__neighborhood_monitors, self.config.nm_cert)
-                    await self.connect_event_handlers(self.__local_monitors, self.config.lm_cert)
-                    await asyncio.sleep(2)
-                    # Check every tick if we need to recalculate
-                    if self.status == C2Status.SHOULD_RECONFIGURE:
-                        await self.configure_network()
+                self.__liveness_task = asyncio.create_task(self.watch_liveness())
+                if self.global_checker is not None:
+                    self.__global_check_task = asyncio.create_task(self.run_global_checks())
+                if self.__federation is not None:
+                    self.__federation_task = asyncio.create_task(self.__federation.connect())
+                try:
+                    while True:
+                        # TODO only trigger this if new monitors have registered.
+                        await self.connect_event_handlers(
+                            [(nm, self.config.nm_cert) for nm in self.__neighborhood_monitors] +
+                            [(lm, self.config.lm_cert) for lm in self.__local_monitors])
+                        await asyncio.sleep(2)
+                        # Check every tick if we need to recalculate
+                        self.check_load_balance()
+                        if self.__federation is not None:
+                            await self.sync_federation()
+                        if self.status == C2Status.SHOULD_RECONFIGURE:
+                            await self.configure_network()
+                        if self.__regions_changed:
+                            await self.configure_federation()
+                finally:
+                    self.__liveness_task.cancel()
+                    if self.__global_check_task is not None:
+                        self.__global_check_task.cancel()
 
 
 def calculate_border_regions(conf1, conf2):
@@ -479,13 +861,33 @@ def calculate_border_regions(conf1, conf2):
         return "ERROR BR"
 
 
+def create_opc_border_region(lm_1, lm_2, border_region):
+    opc_border_region = ua.BorderRegion()
+    opc_border_region.uuid = uuid.uuid4()
+    opc_border_region.lm_1_id = lm_1['id']
+    opc_border_region.lm_2_id = lm_2['id']
+    opc_border_region.lm_1_address = lm_1['address']
+    opc_border_region.lm_2_address = lm_2['address']
+    opc_border_region.region_definition = json.dumps(border_region)
+    return opc_border_region
+
+
 async def main(config: C2Config):
     # Setup Logging for this package
+    global log_sink
+    log_sink = LogSink(path=config.log_file,
+                       max_bytes=config.log_max_bytes,
+                       backup_count=config.log_backup_count,
+                       sample_rate=config.log_sample_rate,
+                       tail_rate=config.log_tail_rate,
+                       queue_size=config.log_queue_size)
+    log_sink.start()
+
     global logger
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.INFO)
 
-    handler = ColoredLogger()
+    handler = LogSinkHandler(str(config.uuid))
     logger.addHandler(handler)
     logger.propagate = False
 
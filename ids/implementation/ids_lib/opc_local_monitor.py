@@ -19,6 +19,11 @@ from pymodbus3.client.sync import ModbusTcpClient as ModbusClient
 
 from .config.config_lm import LMConfig
 from .req_checker_local import ReqCheckerLocal
+from .baseline_detector import BaselineDetector
+from .rule_engine import load_rules
+
+
+GENERATION_RETRIES = 3  # Readings of a RTU step before values of different steps are accepted
 
 
 class OPCNetworkLogger(logging.Handler):
@@ -43,6 +48,8 @@ class C2EventListener:
             logger.propagate = False
         elif msg.startswith('lmRemoved_'):
             pass
+        elif msg == "reconfigureRegions":
+            pass  # Only relevant for regional c2s of a federation
         else:
             logger.error("Received unhandled event from server '%r'" % event)
 
@@ -57,7 +64,11 @@ class LM:
         self.log = queue.SimpleQueue()  # Queue for buffering log messages until they can be sent via OPC
         self.violation_queue = queue.SimpleQueue()  # Queue for buffering violation messages until they are sent by the LM
         self.isRegistered = False  # True if this LM has registered with the c2
+        self.cycle_time = 0.0  # Duration of the last evaluation cycle in seconds, published with the usage data
         self.__modbus_client = None  # Client connected to Modbus RTU
+        self.__snapshot = None  # Last reading, checked by the requirement checker
+        self.__switch_states = None  # Switch values of the last reading
+        self.__urgent = False  # True if the last reading requires an immediate check of all requirements
 
     async def __init(self) -> None:
         """Initialize LM. Register with c&c server and connect to RTU"""
@@ -115,6 +126,7 @@ class LM:
         _, _ = await new_struct(server, idx, "UsageData", [
             new_struct_field("cpu_load", ua.VariantType.Float),
             new_struct_field("memory_load", ua.VariantType.Float),
+            new_struct_field("cycle_time", ua.VariantType.Float),
         ])
 
         # Load all new data structures to server
@@ -186,7 +198,17 @@ class LM:
 
         # Set up requirement checker
         global req_checker
-        req_checker = ReqCheckerLocal(self.__rtu_conf, self.opc_lm_data_ref, self.violation_queue, logger)
+        baseline_detector = None
+        if self.config.baseline_detection:
+            baseline_detector = BaselineDetector(len(self.__rtu_conf["meters"]),
+                                                 cusum_threshold=self.config.baseline_cusum_threshold,
+                                                 max_run=self.config.baseline_max_run,
+                                                 warmup=self.config.baseline_warmup,
+                                                 noise_floor=(self.config.baseline_noise_floor_current,
+                                                              self.config.baseline_noise_floor_voltage))
+        req_checker = ReqCheckerLocal(self.__rtu_conf, self.violation_queue, logger, baseline_detector,
+                                      self.config.req_periods, self.config.cycle_budget,
+                                      load_rules(self.config.rules_file))
 
         # heartbeat event to check if component is still alive and connected to c2 server
         # should not print anything in the console, only if not available (error message)
@@ -302,14 +324,19 @@ class LM:
 
         await self._log_to_opc()
 
-    async def _read_modbus(self) -> bool:
-        """Reads current sensor values via modbus and saves readings to data node."""
-
-        # Connect to Modbus if not already connected
-        if not self.__modbus_client:
-            await self.__connect_to_rtu()
-            return False
-
+    def __read_generation(self):
+        """Reads the step generation of the RTU, None if the RTU has no generation register"""
+        if self.config.rtu_generation_register is None:
+            return None
+        hr_data = self.__modbus_client.read_holding_registers(self.config.rtu_generation_register, 2, unit=1)
+        return BinaryPayloadDecoder.from_registers(hr_data.registers, endian=Endian.Big).decode_32bit_uint()
+
+    def __read_rtu_data(self):
+        """
+            Reads all switches and meters of the RTU into a new data object. The safety thresholds of each meter are
+            checked as soon as it is decoded.
+            Returns the data object and the safety threshold violations of the reading.
+        """
         # Create new data object for this reading
         opc_data = ua.RTUData()
         opc_data.ts = time.time()  # Note that this is ingestion time into our system and not measurement time
@@ -320,35 +347,78 @@ class LM:
         switches = self.__rtu_conf["switches"]
         meters = self.__rtu_conf["meters"]
 
+        violations = []
+        for s in switches:
+            # Get coil index from config file
+            co_index = int(s["co_index"])
+            # Read value at coil index from modbus
+            # Note: the length of a coil register is 1 byte
+            coil_data = self.__modbus_client.read_coils(co_index, 1, unit=1)
+            # Create new data object to store switch data
+            switch_data = ua.SwitchData()
+            switch_data.id = s["id"]
+            switch_data.value = coil_data.bits[:1]
+            opc_data.switches.append(switch_data)
+
+        for m in meters:
+            # Get holding registers indices from config file
+            hr_index_current = int(m["hr_index_current"])
+            hr_index_voltage = int(m["hr_index_voltage"])
+            # Read and decode hr values from modbus
+            # Note: the length of a holding register is 8 bytes
+            hr_data_current = self.__modbus_client.read_holding_registers(hr_index_current, 8, unit=1)
+            hr_data_voltage = self.__modbus_client.read_holding_registers(hr_index_voltage, 8, unit=1)
+            decoder_current = BinaryPayloadDecoder.from_registers(hr_data_current.registers, endian=Endian.Big)
+            decoder_voltage = BinaryPayloadDecoder.from_registers(hr_data_voltage.registers, endian=Endian.Big)
+            # Create new data object to store meter data
+            meter_data = ua.MeterData()
+            meter_data.id = m["id"]
+            meter_data.current = decoder_current.decode_64bit_float()
+            meter_data.voltage = decoder_voltage.decode_64bit_float()
+            opc_data.meters.append(meter_data)
+
+            # Safety thresholds are checked on the raw values, before anything is published
+            violations += req_checker.check_meter_thresholds(meter_data)
+
+        return opc_data, violations
+
+    async def _read_modbus(self) -> bool:
+        """Reads current sensor values via modbus and saves readings to data node."""
+
+        # Connect to Modbus if not already connected
+        if not self.__modbus_client:
+            await self.__connect_to_rtu()
+            return False
+
+        urgent = False
         try:
-            for s in switches:
-                # Get coil index from config file
-                co_index = int(s["co_index"])
-                # Read value at coil index from modbus
-                # Note: the length of a coil register is 1 byte
-                coil_data = self.__modbus_client.read_coils(co_index, 1, unit=1)
-                # Create new data object to store switch data
-                switch_data = ua.SwitchData()
-                switch_data.id = s["id"]
-                switch_data.value = coil_data.bits[:1]
-                opc_data.switches.append(switch_data)
-
-            for m in meters:
-                # Get holding registers indices from config file
-                hr_index_current = int(m["hr_index_current"])
-                hr_index_voltage = int(m["hr_index_voltage"])
-                # Read and decode hr values from modbus
-                # Note: the length of a holding register is 8 bytes
-                hr_data_current = self.__modbus_client.read_holding_registers(hr_index_current, 8, unit=1)
-                hr_data_voltage = self.__modbus_client.read_holding_registers(hr_index_voltage, 8, unit=1)
-                decoder_current = BinaryPayloadDecoder.from_registers(hr_data_current.registers, endian=Endian.Big)
-                decoder_voltage = BinaryPayloadDecoder.from_registers(hr_data_voltage.registers, endian=Endian.Big)
-                # Create new data object to store meter data
-                meter_data = ua.MeterData()
-                meter_data.id = m["id"]
-                meter_data.current = decoder_current.decode_64bit_float()
-                meter_data.voltage = decoder_voltage.decode_64bit_float()
-                opc_data.meters.append(meter_data)
+            # The RTU is read every cycle, also if it did not publish a new step: values written by Modbus clients
+            # do not change the generation. The generation only tells whether a reading mixes two steps.
+            generation = self.__read_generation()
+            for _ in range(GENERATION_RETRIES):
+                opc_data, violations = self.__read_rtu_data()
+                if generation is None:
+                    break
+                # The reading is consistent if the RTU did not publish a step while it was read
+                after = self.__read_generation()
+                if after == generation:
+                    break
+                generation = after
+            else:
+                logger.warning("RTU published new values during %d consecutive readings" % GENERATION_RETRIES)
+
+            # Only the threshold violations of the accepted reading (the last one if no reading was consistent) count
+            if violations:
+                req_checker.report_thresholds(violations)
+                urgent = True
+
+            # A changed switch state invalidates all consistency checks
+            switch_states = [d.value for d in opc_data.switches]
+            if switch_states != self.__switch_states:
+                urgent = True
+            self.__switch_states = switch_states
+            self.__snapshot = opc_data
+            self.__urgent = urgent
 
             # Write new reading into data node
             await self.opc_lm_data_ref.write_value(opc_data)
@@ -395,6 +465,7 @@ class LM:
         usage_data = ua.UsageData()
         usage_data.cpu_load = psutil.cpu_percent(interval=0)
         usage_data.memory_load = psutil.virtual_memory().percent
+        usage_data.cycle_time = self.cycle_time
         await self.opc_lm_usage_ref.write_value(usage_data)
 
     async def run(self) -> None:
@@ -410,14 +481,18 @@ class LM:
                 try:
                     await self.__heartbeat_event_generator.trigger()
                     if await self._read_modbus():
+                        # Threshold violations found while reading are reported right away
+                        await self._report_violation_via_opc(self.violation_queue)
+
                         #save start time of evaluation
-                        time_elapsed = time.clock()
+                        time_elapsed = time.perf_counter()
 
-                        await req_checker.check_requirements()
+                        await req_checker.check_requirements(self.__snapshot, self.__urgent)
                         await self._report_violation_via_opc(self.violation_queue)
 
                         #print duration of the last evaluation cycle in seconds
-                        time_elapsed = time.clock() - time_elapsed
+                        time_elapsed = time.perf_counter() - time_elapsed
+                        self.cycle_time = time_elapsed
                         logger.info("Last cycle took (sec) %f", time_elapsed)
                 except Exception as err:
                     logger.error("Exception in local monitor: %s", err)
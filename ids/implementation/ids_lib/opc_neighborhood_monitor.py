@@ -12,6 +12,7 @@ from asyncua.server.user_managers import CertificateUserManager
 
 from .config.config_nm import NMConfig
 from .req_checker_neighborhood import ReqCheckerNeighborhood
+from .rule_engine import load_rules
 
 class OPCNetworkLogger(logging.Handler):
     """ Hooks normal logging functions and queues messages to also be emitted via OPC"""
@@ -39,6 +40,8 @@ class C2EventListener:
             pass
             #logger.debug(msg[10:])
             #nm.unregister_lm(msg[10:])
+        elif msg == "reconfigureRegions":
+            pass  # Only relevant for regional c2s of a federation
         else:
             logger.error("Received unhandled event from server '%r'" % event)
 
@@ -68,6 +71,7 @@ class NM:
         self.log_queue = queue.SimpleQueue()  # Queue for buffering log messages until they can be sent via OPC
         self.violation_queue = queue.SimpleQueue()  # Queue for buffering violation messages until they are sent vio OPC
         self.isRegistered = False  # True if this NM has registered with the c2
+        self.cycle_time = 0.0  # Duration of the last evaluation of all LMs in seconds, published with the usage data
 
         self.lm_to_check = []
 
@@ -135,7 +139,8 @@ class NM:
 
         # Set up requirement checker
         global req_checker
-        req_checker = ReqCheckerNeighborhood(self.__br, self.client_lms, self.violation_queue, logger)
+        req_checker = ReqCheckerNeighborhood(self.__br, self.client_lms, self.violation_queue, logger,
+                                             load_rules(self.config.rules_file))
 
         # System related statistics
         opcNMType = await server.nodes.base_object_type.add_object_type(idx, "NeighborhoodMonitor")
@@ -143,6 +148,7 @@ class NM:
         _, _ = await new_struct(server, idx, "UsageData", [
             new_struct_field("cpu_load", ua.VariantType.Float),
             new_struct_field("memory_load", ua.VariantType.Float),
+            new_struct_field("cycle_time", ua.VariantType.Float),
         ])
 
         # Load all new data structures to server
@@ -315,6 +321,7 @@ class NM:
         usage_data = ua.UsageData()
         usage_data.cpu_load = psutil.cpu_percent(interval=0)
         usage_data.memory_load = psutil.virtual_memory().percent
+        usage_data.cycle_time = self.cycle_time
         await self.opc_nm_usage_ref.write_value(usage_data)
 
     async def run(self):
@@ -330,13 +337,15 @@ class NM:
 
                 # Iterate over all LMs that have reported to have new data
                 if len(self.lm_to_check) > 0:
+                    self.cycle_time = 0.0
                     for lm in self.lm_to_check:
-                        time_elapsed = time.clock()
+                        time_elapsed = time.perf_counter()
 
                         await req_checker.check_requirements(lm)
                         await self._report_violation_via_opc(self.violation_queue)
 
-                        time_elapsed = time.clock() - time_elapsed
+                        time_elapsed = time.perf_counter() - time_elapsed
+                        self.cycle_time += time_elapsed
                         logger.info("Last cycle took %f", time_elapsed)
                     self.lm_to_check = []
                 # Publish log messages via OPC
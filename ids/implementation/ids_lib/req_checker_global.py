@@ -0,0 +1,278 @@
+import json
+import time
+
+import numpy as np
+
+from .state_estimator import StateEstimator
+
+
+def _ids(reference) -> list:
+    """power_lines_in/out of a bus are either {'id': ...} or {'ids': [...]}"""
+    if not reference:
+        return []
+    if 'ids' in reference:
+        return list(reference['ids'])
+    return [reference['id']]
+
+
+class ReqCheckerGlobal:
+    """
+        Checks requirements of the global scope on the latest snapshots of all LMs.
+        Snapshots are written into flat numpy arrays with one entry per (LM, meter). The topology of all RTU configs is
+        compiled once into index arrays, so every check is a handful of vectorised operations independent of the number
+        of LMs. Only snapshots received at most `alignment_window` seconds before the newest snapshot are considered.
+    """
+
+    def __init__(self, violations_queue, logger, alignment_window=2.0, balance_tolerance=0.1,
+                 relative_balance_tolerance=0.05, energised_fraction=0.5, state_estimation=False,
+                 residual_threshold=3.0):
+        self.__vio_queue = violations_queue
+        self.logger = logger
+        self.alignment_window = alignment_window  # Maximum age difference of snapshots checked together (seconds)
+        self.balance_tolerance = balance_tolerance  # Absolute tolerance of req 5
+        self.relative_balance_tolerance = relative_balance_tolerance  # Tolerance of req 5 relative to the feed-in
+        self.energised_fraction = energised_fraction  # A line is energised above this fraction of its v_ref
+        self.state_estimation = state_estimation  # Enables the bad data detection of req 9
+        self.residual_threshold = residual_threshold  # Normalised residual above which a meter is reported (req 9)
+
+        self.set_local_monitors([])
+
+    def set_local_monitors(self, local_monitors) -> None:
+        """Compiles the RTU configs of all LMs into index arrays. Called whenever the set of LMs changes."""
+        lm_index = self.__lm_index = {lm['id']: i for i, lm in enumerate(local_monitors)}
+
+        line_ids = []
+        line_index = {}
+        v_ref = []
+        lines_in, lines_out = set(), set()
+        bus_index = {}
+        kcl = []
+        zero_injection = []  # Per bus: True if the bus has neither load nor generation
+        line_from, line_to = {}, {}  # Line index -> bus index of the bus the line leaves / enters
+        meter_lm, meter_line, meter_bus, meter_ids = [], [], [], []
+        # Maps LM id to {meter id: position in the meter arrays}
+        self.__meter_positions = {}
+        # Maps LM id to {switch id: line index}
+        self.__switch_lines = {}
+
+        rtus = [json.loads(lm['rtu_config']) for lm in local_monitors]
+
+        # Lines, buses and meters are compiled in separate passes, so an LM can reference lines and buses that are only
+        # defined by a later LM
+        for rtu in rtus:
+            for power_line in rtu['power_lines']:
+                if power_line['id'] not in line_index:
+                    line_index[power_line['id']] = len(line_ids)
+                    line_ids.append(power_line['id'])
+                    v_ref.append(float(power_line['v_ref']))
+
+        # Buses shared by several RTUs get the lines and the zero_injection mark of all their definitions
+        for rtu in rtus:
+            for bus in rtu['buses']:
+                lines_in.update(_ids(bus['power_lines_in']))
+                lines_out.update(_ids(bus['power_lines_out']))
+                if bus['id'] not in bus_index:
+                    bus_index[bus['id']] = len(kcl)
+                    kcl.append(([], []))
+                    zero_injection.append(False)
+                bus_i = bus_index[bus['id']]
+                zero_injection[bus_i] = zero_injection[bus_i] or bool(bus.get('zero_injection', False))
+                for line_i in (line_index[i] for i in _ids(bus['power_lines_in']) if i in line_index):
+                    if line_i not in kcl[bus_i][0]:
+                        kcl[bus_i][0].append(line_i)
+                        line_to[line_i] = bus_i
+                for line_i in (line_index[i] for i in _ids(bus['power_lines_out']) if i in line_index):
+                    if line_i not in kcl[bus_i][1]:
+                        kcl[bus_i][1].append(line_i)
+                        line_from[line_i] = bus_i
+
+        # The boundary currents only balance if no current is injected inside the grid (req 5)
+        self.__balanced_grid = bool(zero_injection) and all(zero_injection)
+
+        for lm, rtu in zip(local_monitors, rtus):
+            positions = self.__meter_positions[lm['id']] = {}
+            for m in rtu['meters']:
+                if m['power_line_id'] not in line_index:
+                    continue
+                if m['bus_id'] not in bus_index:
+                    # Bus that no RTU defines, without Kirchhoff constraint
+                    bus_index[m['bus_id']] = len(kcl)
+                    kcl.append(([], []))
+                    zero_injection.append(False)
+                positions[m['id']] = len(meter_lm)
+                meter_lm.append(lm_index[lm['id']])
+                meter_line.append(line_index[m['power_line_id']])
+                meter_bus.append(bus_index[m['bus_id']])
+                meter_ids.append(m['id'])
+
+            self.__switch_lines[lm['id']] = {s['id']: line_index[s['power_line_id']]
+                                             for s in rtu['switches'] if s['power_line_id'] in line_index}
+
+        self.__line_ids = line_ids
+        self.__v_ref = np.array(v_ref, dtype=np.float64)
+        self.__meter_lm = np.array(meter_lm, dtype=np.int64)
+        self.__meter_line = np.array(meter_line, dtype=np.int64)
+
+        # Lines that only enter / only leave buses of the monitored grid are its boundary (req 5)
+        self.__feed_lines = np.array([line_index[i] for i in lines_in - lines_out if i in line_index], dtype=np.int64)
+        self.__load_lines = np.array([line_index[i] for i in lines_out - lines_in if i in line_index], dtype=np.int64)
+
+        # Lines that are measured by meters of more than one LM (req 6)
+        lms_per_line = {}
+        for lm_i, line_i in zip(meter_lm, meter_line):
+            lms_per_line.setdefault(line_i, set()).add(lm_i)
+        self.__cross_lines = np.zeros(len(line_ids), dtype=bool)
+        self.__cross_lines[[line_i for line_i, lms in lms_per_line.items() if len(lms) > 1]] = True
+
+        self.__meter_ids = meter_ids
+        self.__meter_bus = np.array(meter_bus, dtype=np.int64)
+        # Both ends of every line whose buses are known, used to orient the measured current magnitudes (req 9)
+        oriented = sorted(set(line_from) & set(line_to))
+        self.__oriented_lines = np.array(oriented, dtype=np.int64)
+        self.__oriented_from = np.array([line_from[i] for i in oriented], dtype=np.int64)
+        self.__oriented_to = np.array([line_to[i] for i in oriented], dtype=np.int64)
+        # Kirchhoff's law only holds at buses without load or generation, marked with "zero_injection" in the RTU config
+        self.__estimator = None
+        if self.state_estimation and meter_lm:
+            kcl = [row for row, zero in zip(kcl, zero_injection) if zero and (row[0] or row[1])]
+            self.__estimator = StateEstimator(len(zero_injection), len(line_ids), meter_bus, meter_line, kcl,
+                                              threshold=self.residual_threshold)
+        # Open switches per LM as sets of line indices
+        self.__open_lines = {}
+
+        self.current = np.full(len(meter_lm), np.nan)
+        self.voltage = np.full(len(meter_lm), np.nan)
+        self.ts = np.full(len(local_monitors), -np.inf)
+        # Per LM: (meter ids in the order of the last snapshot, their positions)
+        self.__order_cache = {}
+
+    def update(self, lm_id, rtu_data, received=None) -> None:
+        """Stores the RTUData snapshot of an LM, received is its time of arrival (time.monotonic(), default now)"""
+        positions = self.__meter_positions.get(lm_id)
+        if positions is None or not rtu_data.meters:
+            return
+
+        # LMs publish their meters in a fixed order, so the position lookup is only done once per LM
+        order = tuple(m.id for m in rtu_data.meters)
+        cached = self.__order_cache.get(lm_id)
+        if cached is None or cached[0] != order:
+            known = [i for i, meter_id in enumerate(order) if meter_id in positions]
+            cached = (order, np.array(known, dtype=np.int64),
+                      np.array([positions[order[i]] for i in known], dtype=np.int64))
+            self.__order_cache[lm_id] = cached
+        _, known, target = cached
+
+        current = np.array([m.current for m in rtu_data.meters], dtype=np.float64)
+        voltage = np.array([m.voltage for m in rtu_data.meters], dtype=np.float64)
+        self.current[target] = current[known]
+        self.voltage[target] = voltage[known]
+        # RTUData.ts is an OPC Float (float32), at the current epoch its resolution is 128 seconds
+        self.ts[self.__lm_index[lm_id]] = time.monotonic() if received is None else received
+
+        # Note: switch is open <=> switch.value = False. The LMs publish the value as a list of coil bits.
+        switch_lines = self.__switch_lines[lm_id]
+        self.__open_lines[lm_id] = {switch_lines[d.id] for d in rtu_data.switches if d.id in switch_lines and
+                                    not (d.value[0] if isinstance(d.value, list) else d.value)}
+
+    def check_requirements(self) -> None:
+        """Check all requirements of the global scope"""
+        if len(self.current) == 0 or not np.isfinite(self.ts).any():
+            return
+
+        # Time alignment: only use meters of LMs whose snapshot is close to the newest one
+        fresh_lms = self.ts >= np.max(self.ts) - self.alignment_window
+        fresh = fresh_lms[self.__meter_lm] & ~np.isnan(self.current) & ~np.isnan(self.voltage)
+
+        n_lines = len(self.__line_ids)
+        lines = self.__meter_line[fresh]
+        counts = np.bincount(lines, minlength=n_lines)
+        line_current = np.bincount(lines, weights=self.current[fresh], minlength=n_lines)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            line_current = line_current / counts
+
+        self._check_req_5(counts, line_current)
+        self._check_req_6(fresh, lines, counts, line_current)
+        if self.__estimator is not None:
+            self._check_req_9(fresh, fresh_lms)
+
+    def _check_req_5(self, counts, line_current):
+        """
+            Checks Requirement 5: The current fed into the monitored grid matches the current leaving it.
+            Only checked if every bus of the grid is marked zero_injection, loads and generators (e.g. PV) at a bus
+            inject current that is not measured on the boundary lines.
+        """
+        if not self.__balanced_grid or len(self.__feed_lines) == 0 or len(self.__load_lines) == 0:
+            return
+        # Only meaningful if every boundary line is measured in the aligned snapshot
+        if not (counts[self.__feed_lines].all() and counts[self.__load_lines].all()):
+            return
+
+        feed_in = line_current[self.__feed_lines].sum()
+        load = line_current[self.__load_lines].sum()
+        tolerance = max(self.balance_tolerance, self.relative_balance_tolerance * feed_in)
+        if abs(feed_in - load) > tolerance:
+            self.__vio_queue.put_nowait({
+                "req_id": 5,
+                "component_id": "grid"}
+            )
+            self.logger.error("Requirement 5 violated! Current fed into the grid is %s, current leaving it is %s",
+                              round(feed_in, 2), round(load, 2))
+
+    def _check_req_6(self, fresh, lines, counts, line_current):
+        """
+            Checks Requirement 6: LMs agree on whether a line shared between regions is energised, and lines that are
+            not energised carry no current.
+        """
+        n_lines = len(self.__line_ids)
+        energised = self.voltage[fresh] > self.energised_fraction * self.__v_ref[lines]
+        energised_count = np.bincount(lines, weights=energised, minlength=n_lines)
+
+        disagree = self.__cross_lines & (energised_count > 0) & (energised_count < counts)
+        dead_with_current = (counts > 0) & (energised_count == 0) & (line_current > self.balance_tolerance)
+
+        for line_i in np.flatnonzero(disagree | dead_with_current):
+            self.__vio_queue.put_nowait({
+                "req_id": 6,
+                "component_id": self.__line_ids[line_i]}
+            )
+            if disagree[line_i]:
+                self.logger.error("Requirement 6 violated! LMs disagree whether line %s is energised",
+                                  self.__line_ids[line_i])
+            else:
+                self.logger.error("Requirement 6 violated! Line %s is not energised but carries %s",
+                                  self.__line_ids[line_i], round(line_current[line_i], 3))
+
+    def _check_req_9(self, fresh, fresh_lms):
+        """Checks Requirement 9: The measurements of every meter are consistent with the estimated grid state."""
+        lm_ids = list(self.__lm_index)
+        open_lines = set()
+        for lm_id in (lm_ids[i] for i in np.flatnonzero(fresh_lms)):
+            open_lines |= self.__open_lines.get(lm_id, set())
+
+        voltage_pu = self.voltage / self.__v_ref[self.__meter_line]
+        suspicious, residuals = self.__estimator.bad_data(voltage_pu, self.__signed_current(voltage_pu, fresh), fresh,
+                                                          open_lines)
+        for i in suspicious:
+            self.__vio_queue.put_nowait({
+                "req_id": 9,
+                "component_id": self.__meter_ids[i]}
+            )
+            self.logger.error("Requirement 9 violated! Measurements of %s deviate from the estimated state "
+                              "(normalised residual %s)", self.__meter_ids[i], round(residuals[i], 2))
+
+    def __signed_current(self, voltage_pu, fresh):
+        """
+            The meters measure current magnitudes. The current flows from the bus with the higher voltage to the one
+            with the lower voltage, so a line carries negative current if the voltage at the bus it enters is higher
+            than at the bus it leaves.
+        """
+        n_buses = self.__estimator.n_buses
+        buses = self.__meter_bus[fresh]
+        counts = np.bincount(buses, minlength=n_buses)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            bus_voltage = np.bincount(buses, weights=voltage_pu[fresh], minlength=n_buses) / counts
+
+        sign = np.ones(len(self.__line_ids))
+        reverse = bus_voltage[self.__oriented_to] > bus_voltage[self.__oriented_from]  # False if not measured (NaN)
+        sign[self.__oriented_lines[reverse]] = -1.0
+        return np.abs(self.current) * sign[self.__meter_line]
@@ -1,256 +1,129 @@
-import asyncio
 import logging
+import time
+
+import numpy as np
+
+from .rule_engine import RulePlan, load_rules
+
+# Requirements of the local scope that are not declared as rules: (requirement, method, default period in seconds,
+# priority). All other requirements are read from the rules file (see rule_engine), lower priority values are evaluated
+# first. Rules of the "threshold" scope (requirements 7 and 8) are not scheduled but checked on each meter as soon as
+# it is decoded from Modbus (see check_meter_thresholds).
+REQUIREMENTS = (
+    (10, "_check_req_10", 1, 1),
+)
 
 
 class ReqCheckerLocal:
 
-    def __init__(self, rtu_config, data_ref, violations_queue, logger):
+    def __init__(self, rtu_config, violations_queue, logger, baseline_detector=None, periods=None, cycle_budget=0,
+                 rules=None):
         self.__rtu_conf = rtu_config
-        self.__data_ref = data_ref
         self.__vio_queue = violations_queue
         self.logger = logger
+        # Optional statistical detector for requirement 10
+        self.__baseline_detector = baseline_detector
+
+        # Rules are compiled once for this RTU
+        if rules is None:
+            rules = load_rules()
+        self.__plan = RulePlan(rules, rtu_config, "local")
+        # Safety thresholds are compiled per meter, so a meter can be checked before the rest of the RTU is read
+        self.__threshold_plans = {m["id"]: RulePlan(rules, {"meters": [m]}, "threshold")
+                                  for m in rtu_config["meters"]}
+
+        # Rules with the same requirement id are scheduled together
+        requirements = {}
+        for rule in self.__plan.rules:
+            requirements.setdefault(rule.id, []).append(rule)
+        schedule = [(req, self.__rule_check(compiled), compiled[0].period, compiled[0].priority)
+                    for req, compiled in requirements.items()]
+        schedule += [(req, getattr(self, method), period, priority) for req, method, period, priority in REQUIREMENTS]
+
+        # Evaluation periods, overridable per requirement: {requirement: seconds}
+        if periods is None:
+            periods = {}
+        self.__schedule = [(req, check, periods.get(req, period), priority)
+                           for req, check, period, priority in schedule]
+        self.__schedule.sort(key=lambda entry: entry[3])
+        self.__next_due = {req: 0 for req, _, _, _ in self.__schedule}
+        # Maximum time in seconds spent on scheduled checks per cycle. 0 = unlimited
+        self.cycle_budget = cycle_budget
+
+    async def check_requirements(self, data, urgent=False):
+        """
+            Check all requirements of the local scope that are due on the given snapshot (RTUData).
+            If urgent (e.g. a switch changed or a safety threshold was exceeded) all requirements are due.
+            Requirements skipped because the cycle budget is used up stay due for the next cycle.
+        """
+        start = time.monotonic()
+        arrays = None
+        for req, check, period, _ in self.__schedule:
+            if not urgent and start < self.__next_due[req]:
+                continue
+            if self.cycle_budget and time.monotonic() - start > self.cycle_budget:
+                break
+            # The snapshot is converted once per cycle for all rules
+            if arrays is None:
+                arrays = self.__plan.arrays(data)
+            await check(data, arrays)
+            self.__next_due[req] = start + period
+
+    def check_meter_thresholds(self, meter_data) -> list:
+        """
+            Checks the safety thresholds (rules of the threshold scope, Requirements S7 and S8) on the decoded Modbus
+            values of one meter (MeterData). Called right after the meter is decoded, before the reading is published
+            via OPC. Returns the violations, they are queued by report_thresholds once the reading is accepted.
+        """
+        plan = self.__threshold_plans[meter_data.id]
+        return plan.evaluate(plan.meter_arrays([meter_data]))
+
+    def report_thresholds(self, violations) -> None:
+        """Queues the safety threshold violations returned by check_meter_thresholds"""
+        self.__report(violations)
+
+    def __rule_check(self, rules):
+        async def check(data, arrays):
+            self.__report(self.__plan.evaluate(arrays, rules))
+        return check
+
+    def __report(self, violations):
+        for rule, component_id, value in violations:
+            # Add violation to queue
+            self.__vio_queue.put_nowait({
+                "req_id": rule.id,
+                "component_id": component_id}
+            )
+
+            # Report to console
+            self.logger.error("Requirement %s violated! %s: %s at %s (%s %s)", rule.id, rule.description,
+                              round(float(value), 3), component_id, rule.op_name,
+                              rule.threshold_of(component_id))
+
+    async def _check_req_10(self, data, arrays=None):
+        """Checks Requirement 10: Meter readings follow their learned baseline without sustained drift and are not
+        implausibly smooth."""
+        if self.__baseline_detector is None:
+            return
 
-    async def check_requirements(self):
-        """Check all requirements of the local scope"""
-
-        #self.logger.error(self.__rtu_conf)
-
-        await asyncio.gather(
-            self._check_req_1(),
-            self._check_req_2(),
-            self._check_req_3(),
-            self._check_req_4(),
-            self._check_req_7(),
-            self._check_req_8()
-        )
-
-    async def _check_req_1(self):
-        """Check Requirement 1: Incoming current matches outgoing current at one bus."""
-        data = await self.__data_ref.read_value()
-
-        for bus in self.__rtu_conf["buses"]:
-            power_lines_incoming = bus["power_lines_in"]
-            power_lines_outgoing = bus["power_lines_out"]
-
-            # Get ids from incoming and outgoing power lines
-            power_lines_in_ids = []
-            if "id" in power_lines_incoming:
-                power_lines_in_ids.append(power_lines_incoming["id"])
-            elif "ids" in power_lines_incoming:
-                power_lines_in_ids = power_lines_incoming["ids"]
-            power_lines_out_ids = []
-            if "id" in power_lines_outgoing:
-                power_lines_out_ids.append(power_lines_outgoing["id"])
-            elif "ids" in power_lines_outgoing:
-                power_lines_out_ids = power_lines_outgoing["ids"]
-
-            # Get current for incoming and outgoing power lines
-            readings_in = []
-            readings_out = []
-            # for m in self.__rtu_conf["meters"]:
-            #     if m["power_line_id"] in power_lines_in_ids and m["bus_id"] == bus["id"]:
-            #         d = get_meter_data(data, m)
-            #         readings_in.append(d)
-            #     elif m["power_line_id"] in power_lines_out_ids and m["bus_id"] == bus["id"]:
-            #         d = get_meter_data(data, m)
-            #         readings_out.append(d)
-
-            for m in self.__rtu_conf["meters"]:
-                if m["power_line_id"] in power_lines_in_ids:
-                    power_lines_in_ids.remove(m["power_line_id"]) # Only one meter per branch shall be checked
-                    d = get_meter_data(data, m)
-                    readings_in.append(d)
-                elif m["power_line_id"] in power_lines_out_ids:
-                    power_lines_out_ids.remove(m["power_line_id"]) # Only one meter per branch shall be checked
-                    d = get_meter_data(data, m)
-                    readings_out.append(d)
-
-            # Calculate sum for incoming and outcoming current
-            sum_current_in = 0
-            sum_current_out = 0
-
-            calc = "calculation: in "
-
-            for d in readings_in:
-                sum_current_in += d.current
-                calc += "+ {}".format(d.current)
-
-            calc += "  =  "
-
-            for d in readings_out:
-                sum_current_out += d.current
-                calc += "{} + ".format(d.current)
-
-            calc += " out"
-
-            # Check if sums are equal
-            if abs(round(sum_current_in, 2) - round(sum_current_out, 2)) > 0.1:
-                # Add violation to queue
-                self.__vio_queue.put_nowait({
-                    "req_id": 1,
-                    "component_id": bus["id"]}
-                )
-
-                # Report to console
-                self.logger.error("Requirement 1 violated! Sum of incoming current at bus %s is %s, "
-                            "and sum of outgoing current is %s. " + calc, bus["id"], round(sum_current_in, 2),
-                            round(sum_current_out, 2))
-
-    async def _check_req_2(self):
-        """Checks Requirement 2: All voltages reported at one bus are equal."""
-        data = await self.__data_ref.read_value()
-
-        for bus in self.__rtu_conf["buses"]:
-            # Get the voltage readings from each meter on this bus
-            voltage_readings = []
-            for m in self.__rtu_conf["meters"]:
-                #TODO: using the bus id of a meter might be unrealistic as all meters on a powerline
-                # do also need to measure the same voltage
-                if m["bus_id"] == bus["id"]:
-                    voltage_readings.append(get_meter_data(data, m))
-
-            ref_voltage = round(voltage_readings[0].voltage, 2)
-            for d in voltage_readings:
-                if not (ref_voltage - 0.05 <= round(d.voltage, 2) <= ref_voltage + 0.05):
-                    # Add violation to queue
-                    self.__vio_queue.put_nowait({
-                        "req_id": 2,
-                        "component_id": bus["id"]}
-                    )
-
-                    # Report to console
-                    self.logger.error("Requirement 2 violated! Voltage on bus %s measured by %s : %s (!= %s)",
-                                bus["id"], d.id, round(d.voltage, 2), ref_voltage)
-
-    async def _check_req_3(self):
-        """Checks Requirement 3 (local scope): There is no current on a power line with an open switch."""
-        data = await self.__data_ref.read_value()
-
-        #self.logger.info("Data to be checked: {}\n\n\n".format(data))
-
-        # Get all power lines with open switch
-        open_switch_lines = []
-        for s in self.__rtu_conf["switches"]:
-            d = get_switch_data(data, s)
-
-            #self.logger.info("Switch: {}\n\n".format(d.value))
-
-            # Note: switch is open <=> switch.value = False
-            if not d.value[0]:
-                power_line_id = s["power_line_id"]
-                open_switch_lines.append(power_line_id)
-
-        #self.logger.info("Open switch lines found: {}\n\n\n".format(open_switch_lines))
-
-
-        # Get all local power lines
-        power_lines_local = []
-        for power_line in self.__rtu_conf["power_lines"]:
-            if power_line["id"] in open_switch_lines:
-                power_lines_local.append(power_line["id"])
-
-        # Get values of all meters on local power line with open switch
-        for m in self.__rtu_conf["meters"]:
-            if m["power_line_id"] in power_lines_local:
-                d = get_meter_data(data, m)
-                # If current != 0
-                if d.current:
-                    # Add violation to queue
-                    self.__vio_queue.put_nowait({
-                        "req_id": 3,
-                        "component_id": m["power_line_id"]}
-                    )
-
-                    # Report to console
-                    self.logger.error("Requirement 3 (local) violated! There is current on line %s with "
-                                "an open switch", m["power_line_id"])
-
-    async def _check_req_4(self):
-        """Checks Requirement 4 (local scope): Measured voltage and current remain the same over the length of a
-        power line. """
-        data = await self.__data_ref.read_value()
-
-        for power_line in self.__rtu_conf["power_lines"]:
-            # Get all meter ids from local power line
-            pl_meters = []
-            for m in self.__rtu_conf["meters"]:
-                if m["power_line_id"] == power_line["id"]:
-                    d = get_meter_data(data, m)
-                    pl_meters.append(d)
-
-            # Compare the values with one another
-            ref_current = round(pl_meters[0].current, 2)
-            ref_voltage = round(pl_meters[0].voltage, 2)
-            for d in pl_meters:
-                if not (ref_current - 0.05 <= round(d.current, 2) <= ref_current + 0.05):
-                    # Add violation to queue
-                    self.__vio_queue.put_nowait({
-                        "req_id": 4,
-                        "component_id": power_line["id"]}
-                    )
-
-                    # Report to console
-                    self.logger.error("Requirement 4 (local) violated! Current on line %s measured by %s : %s (!= %s)",
-                                power_line["id"], d.id, round(d.current, 2), ref_current)
-
-                if not (ref_voltage - 0.05 <= round(d.voltage, 2) <= ref_voltage + 0.05):
-                    # Add violation to queue
-                    self.__vio_queue.put_nowait({
-                        "req_id": 4,
-                        "component_id": power_line["id"]}
-                    )
-
-                    # Report to console
-                    self.logger.error("Requirement 4 (local) violated! Voltage on line %s measured by %s : %s (!= %s)",
-                                power_line["id"], d.id, round(d.voltage, 2), ref_voltage)
-
-    async def _check_req_7(self):
-        """Checks Requirement S7: Safety threshold regarding current is met at every meter."""
-        data = await self.__data_ref.read_value()
         meter_config = self.__rtu_conf["meters"]
-        for m in meter_config:
-            max_current = float(m["s_current"])
-            d = get_meter_data(data, m)
-            temp_current = d.current
-            if temp_current > max_current:
-                # Add violation to queue
-                self.__vio_queue.put_nowait({
-                    "req_id": 7,
-                    "component_id": m["id"]}
-                )
-
-                # Report to console
-                self.logger.error("Requirement 7 violated! Max current in %s should be < %s but is currently %s",
-                            m["id"], max_current, round(temp_current, 3))
-
-    async def _check_req_8(self):
-        """Checks Requirement S8: Safety threshold regarding voltage is met at every meter."""
-        # Get meter data from server
-        data = await self.__data_ref.read_value()
-        meter_config = self.__rtu_conf["meters"]
-        for m in meter_config:
-            max_voltage = float(m["s_voltage"])
-            d = get_meter_data(data, m)
-            temp_voltage = d.voltage
-            if temp_voltage > max_voltage:
-                # Add violation to queue
-                self.__vio_queue.put_nowait({
-                    "req_id": 8,
-                    "component_id": m["id"]}
-                )
-
-                # Report to console
-                self.logger.error("Requirement 8 violated! Max voltage in %s should be < %s but is currently %s",
-                            m["id"], max_voltage, round(temp_voltage, 3))
-
-
-def get_meter_data(data, m):
-    for d in data.meters:
-        if d.id == m["id"]:
-            return d
-
+        # The LM publishes the meters in the order of the config
+        if len(data.meters) != len(meter_config):
+            return
+
+        values = np.array([[d.current for d in data.meters], [d.voltage for d in data.meters]])
+        drift, smooth = self.__baseline_detector.update(values)
+
+        for channel, meter_index in zip(*np.nonzero(drift | smooth)):
+            m = meter_config[meter_index]
+            self.__vio_queue.put_nowait({
+                "req_id": 10,
+                "component_id": m["id"]}
+            )
+
+            # Report to console
+            self.logger.error("Requirement 10 violated! %s of %s %s (currently %s)",
+                              ("Current", "Voltage")[channel], m["id"],
+                              "drifts away from its baseline" if drift[channel, meter_index] else
+                              "changes implausibly smoothly", round(values[channel, meter_index], 3))
 
-def get_switch_data(data, s):
-    for d in data.switches:
-        if d.id == s["id"]:
-            return d
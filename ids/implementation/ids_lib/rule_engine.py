@@ -0,0 +1,272 @@
+import json
+import operator
+import os
+
+import numpy as np
+
+'''
+    Declarative requirement rules.
+
+    A rule evaluates one value for each bus, line or meter ("for_each") of a topology (RTU config or border region) and
+    reports the component if the value is violated_if {"<op>": <threshold>}. The threshold is a constant or
+    {"config": "<attribute>"} of the component in the topology (e.g. the s_current of a meter).
+
+    The value is the sum of the rule's terms (optionally multiplied by "sign" and made absolute by "abs"). Each term
+    aggregates an attribute ("current", "voltage") over a set of meters of the component:
+        bus:   "at_bus" (meters at the bus), "incoming" / "outgoing" (first meter of each incoming / outgoing line)
+        line:  "on_line" (meters on the line)
+        meter: "self"
+    Aggregates: "sum", "max", "min", "max_abs", "spread" (largest difference to the first meter of the set).
+    "round" in a term rounds the measurements before aggregation, "round" in the rule rounds each term and the value.
+
+    Optional: "only": "open_switch" restricts line rules to lines with an open switch, "window":
+    {"evaluations": n, "violations": k} reports a component only if k of its last n evaluations were violated,
+    "period" and "priority" control the scheduling and "scopes" lists the checkers that execute the rule
+    ("local", "neighborhood", "threshold").
+
+    Each rule is compiled once per topology into index arrays, so an evaluation is a few numpy reductions.
+'''
+
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "rules.json")
+
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+AGGREGATES = ("sum", "max", "min", "max_abs", "spread")
+
+
+def load_rules(path=None) -> list:
+    """Loads the rules from a JSON file, the default rules replicate the requirements 1, 2, 3, 4, 7 and 8"""
+    with open(path or DEFAULT_RULES_FILE, 'r') as file:
+        rules = json.load(file)
+    for rule in rules:
+        validate_rule(rule)
+    return rules
+
+
+def validate_rule(rule) -> None:
+    """Raises ValueError if a rule is malformed"""
+    if rule.get("for_each") not in ("bus", "line", "meter"):
+        raise ValueError(f"Rule {rule.get('id')}: for_each must be one of bus, line, meter")
+    if len(rule.get("violated_if", {})) != 1 or list(rule["violated_if"])[0] not in OPERATORS:
+        raise ValueError(f"Rule {rule.get('id')}: violated_if needs exactly one of {list(OPERATORS)}")
+    for term in rule.get("terms", []):
+        if term.get("aggregate") not in AGGREGATES:
+            raise ValueError(f"Rule {rule.get('id')}: aggregate must be one of {AGGREGATES}")
+        if term.get("attribute") not in ("current", "voltage"):
+            raise ValueError(f"Rule {rule.get('id')}: attribute must be current or voltage")
+    if not rule.get("terms"):
+        raise ValueError(f"Rule {rule.get('id')}: at least one term is required")
+
+
+def _ids(reference) -> list:
+    """power_lines_in/out of a bus are either {'id': ...} or {'ids': [...]}"""
+    if not reference:
+        return []
+    if 'ids' in reference:
+        return list(reference['ids'])
+    return [reference['id']]
+
+
+class CompiledRule:
+    """A rule bound to the components of one topology"""
+
+    def __init__(self, rule, components, member_lists, plan):
+        self.id = rule["id"]
+        self.description = rule.get("description", "")
+        self.period = rule.get("period", 1)
+        self.priority = rule.get("priority", 0)
+        self.for_each = rule["for_each"]
+        self.round = rule.get("round")
+        self.abs = rule.get("abs", False)
+        (op, threshold), = rule["violated_if"].items()
+        self.op = OPERATORS[op]
+        self.op_name = op
+
+        self.component_ids = [c["id"] for c in components]
+        if isinstance(threshold, dict):
+            self.threshold = np.array([float(c[threshold["config"]]) for c in components])
+        else:
+            self.threshold = float(threshold)
+
+        # Per term: (attribute, sign, aggregate, rounding, flat member indices, segment starts, segment lengths,
+        # non-empty groups)
+        self.terms = []
+        valid = np.ones(len(components), dtype=bool)
+        for term, members in zip(rule["terms"], member_lists):
+            lengths = np.array([len(m) for m in members], dtype=np.int64)
+            flat = np.array([i for m in members for i in m], dtype=np.int64)
+            starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+            nonempty = lengths > 0
+            # Only sums are defined over empty sets
+            if term["aggregate"] != "sum":
+                valid &= nonempty
+            self.terms.append((term["attribute"], term.get("sign", 1), term["aggregate"], term.get("round"), flat,
+                               starts[nonempty], lengths[nonempty], nonempty))
+        self.valid = valid
+
+        # Lines with an open switch: maps switches to the index of their line
+        self.only_open_switch = rule.get("only") == "open_switch"
+        if self.only_open_switch:
+            line_index = {line_id: i for i, line_id in enumerate(self.component_ids)}
+            switches = [(i, line_index[s["power_line_id"]]) for i, s in enumerate(plan.switches)
+                        if s["power_line_id"] in line_index]
+            self.switch_positions = np.array([i for i, _ in switches], dtype=np.int64)
+            self.switch_lines = np.array([line for _, line in switches], dtype=np.int64)
+
+        window = rule.get("window")
+        self.history = None
+        if window:
+            self.required = window["violations"]
+            self.history = np.zeros((len(components), window["evaluations"]), dtype=bool)
+            self.history_position = 0
+
+    def threshold_of(self, component_id):
+        if isinstance(self.threshold, float):
+            return self.threshold
+        return self.threshold[self.component_ids.index(component_id)]
+
+    def evaluate(self, current, voltage, switch_closed):
+        """Returns (indices of violating components, values of all components)"""
+        n = len(self.component_ids)
+        value = np.zeros(n)
+        for attribute, sign, aggregate, decimals, flat, starts, lengths, nonempty in self.terms:
+            x = (current if attribute == "current" else voltage)[flat]
+            if decimals is not None:
+                x = np.round(x, decimals)
+            result = np.zeros(n)
+            if len(starts):
+                if aggregate == "sum":
+                    result[nonempty] = np.add.reduceat(x, starts)
+                elif aggregate == "max":
+                    result[nonempty] = np.maximum.reduceat(x, starts)
+                elif aggregate == "min":
+                    result[nonempty] = np.minimum.reduceat(x, starts)
+                elif aggregate == "max_abs":
+                    result[nonempty] = np.maximum.reduceat(np.abs(x), starts)
+                elif aggregate == "spread":
+                    first = np.repeat(x[starts], lengths)
+                    result[nonempty] = np.maximum.reduceat(np.abs(x - first), starts)
+            if self.round is not None:
+                result = np.round(result, self.round)
+            value += sign * result
+        if self.abs:
+            value = np.abs(value)
+        if self.round is not None:
+            # Keeps differences of rounded values from exceeding a tolerance by a floating point error
+            value = np.round(value, self.round)
+
+        # Missing measurements (NaN) never violate a rule
+        with np.errstate(invalid='ignore'):
+            violated = self.op(value, self.threshold) & self.valid & ~np.isnan(value)
+
+        if self.only_open_switch:
+            open_lines = np.zeros(n, dtype=bool)
+            open_lines[self.switch_lines[~switch_closed[self.switch_positions]]] = True
+            violated &= open_lines
+
+        if self.history is not None:
+            self.history[:, self.history_position] = violated
+            self.history_position = (self.history_position + 1) % self.history.shape[1]
+            violated = self.history.sum(axis=1) >= self.required
+
+        return np.flatnonzero(violated), value
+
+
+class RulePlan:
+    """All rules of one scope compiled for one topology (RTU config or border region)"""
+
+    def __init__(self, rules, topology, scope):
+        self.meters = topology.get("meters", [])
+        self.switches = topology.get("switches", [])
+        self.meter_ids = [m["id"] for m in self.meters]
+        self.switch_ids = [s["id"] for s in self.switches]
+
+        meters_on_line = {}
+        meters_at_bus = {}
+        for i, m in enumerate(self.meters):
+            meters_on_line.setdefault(m["power_line_id"], []).append(i)
+            meters_at_bus.setdefault(m["bus_id"], []).append(i)
+
+        components = {
+            "bus": topology.get("buses", []),
+            "line": topology.get("power_lines", []),
+            "meter": self.meters,
+        }
+
+        def members(for_each, selection, component, index):
+            if for_each == "meter" and selection == "self":
+                return [index]
+            if for_each == "line" and selection == "on_line":
+                return meters_on_line.get(component["id"], [])
+            if for_each == "bus" and selection == "at_bus":
+                return meters_at_bus.get(component["id"], [])
+            if for_each == "bus" and selection in ("incoming", "outgoing"):
+                lines = _ids(component["power_lines_in" if selection == "incoming" else "power_lines_out"])
+                # Only one meter per line is used
+                return [meters_on_line[line][0] for line in lines if line in meters_on_line]
+            raise ValueError(f"Meter selection '{selection}' is not defined for {for_each}")
+
+        self.rules = []
+        for rule in rules:
+            if scope not in rule.get("scopes", ["local"]):
+                continue
+            selected = components[rule["for_each"]]
+            member_lists = [[members(rule["for_each"], term["meters"], c, i) for i, c in enumerate(selected)]
+                            for term in rule["terms"]]
+            self.rules.append(CompiledRule(rule, selected, member_lists, self))
+
+    def arrays(self, *datas):
+        """
+            Converts RTUData snapshots into measurement arrays in the order of the plan:
+            (current, voltage, switch_closed). Meters and switches missing in all snapshots are NaN / closed.
+        """
+        meter_data = {}
+        switch_data = {}
+        for data in datas:
+            for d in data.meters:
+                meter_data.setdefault(d.id, d)
+            for d in data.switches:
+                switch_data.setdefault(d.id, d)
+
+        nan = float('nan')
+        current = np.array([meter_data[i].current if i in meter_data else nan for i in self.meter_ids])
+        voltage = np.array([meter_data[i].voltage if i in meter_data else nan for i in self.meter_ids])
+        # Note: switch is open <=> switch.value = False. The LMs publish the value as a list of coil bits.
+        switch_closed = np.array([_switch_value(switch_data[i]) if i in switch_data else True
+                                  for i in self.switch_ids], dtype=bool)
+        return current, voltage, switch_closed
+
+    def meter_arrays(self, meters):
+        """
+            Converts single MeterData values (e.g. of a meter that was just decoded) into measurement arrays in the
+            order of the plan. Meters not given are NaN, all switches are closed.
+        """
+        meter_data = {d.id: d for d in meters}
+        nan = float('nan')
+        current = np.array([meter_data[i].current if i in meter_data else nan for i in self.meter_ids])
+        voltage = np.array([meter_data[i].voltage if i in meter_data else nan for i in self.meter_ids])
+        return current, voltage, np.ones(len(self.switch_ids), dtype=bool)
+
+    def evaluate(self, arrays, rules=None):
+        """Evaluates the given (default: all) rules. Returns a list of (rule, component id, value)."""
+        current, voltage, switch_closed = arrays
+        violations = []
+        for rule in self.rules if rules is None else rules:
+            indices, values = rule.evaluate(current, voltage, switch_closed)
+            for i in indices:
+                violations.append((rule, rule.component_ids[i], values[i]))
+        return violations
+
+
+def _switch_value(d) -> bool:
+    value = d.value
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else True
+    return bool(value)
@@ -0,0 +1,141 @@
+from collections import OrderedDict
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+
+
+class StateEstimator:
+    """
+        Linear weighted least squares state estimation with normalised residual bad data detection.
+
+        State: the voltage (per unit of the line's v_ref) of every bus and the signed current of every power line,
+        positive in the direction of the RTU configs (out of one bus, into the next).
+        Measurements: voltage and signed current of every meter, a zero current for lines with an open switch and
+        Kirchhoff's current law (sum of incoming = sum of outgoing current) as pseudo measurements. Kirchhoff rows are
+        only valid at zero injection buses, i.e. buses without load or generation.
+
+        The Jacobian H, the factorisation of the gain matrix G = H^T W H and the residual variances only depend on the
+        topology, i.e. on the open switches and the available measurements. They are cached per topology, so each
+        snapshot costs two sparse triangular solves.
+    """
+
+    def __init__(self, n_buses, n_lines, meter_bus, meter_line, kcl, sigma_voltage=0.01, sigma_current=0.005,
+                 sigma_kcl=1e-4, threshold=3.0, cache_size=8):
+        """
+            meter_bus/meter_line: bus and line index of each meter
+            kcl: list of (incoming line indices, outgoing line indices) per zero injection bus
+        """
+        self.n_buses = n_buses
+        self.n_lines = n_lines
+        self.meter_bus = np.asarray(meter_bus, dtype=np.int64)
+        self.meter_line = np.asarray(meter_line, dtype=np.int64)
+        self.threshold = threshold  # Normalised residuals above this value indicate bad data
+        self.__sigma_voltage = sigma_voltage
+        self.__sigma_current = sigma_current
+        self.__cache_size = cache_size
+        self.__cache = OrderedDict()
+
+        # Kirchhoff rows are the same for every topology
+        rows, cols, vals = [], [], []
+        for row, (lines_in, lines_out) in enumerate(kcl):
+            for line in lines_in:
+                rows.append(row), cols.append(n_buses + line), vals.append(1.0)
+            for line in lines_out:
+                rows.append(row), cols.append(n_buses + line), vals.append(-1.0)
+        self.__kcl = sp.csr_matrix((vals, (rows, cols)), shape=(len(kcl), n_buses + n_lines))
+        self.__kcl_weight = 1 / sigma_kcl ** 2
+
+    def __model(self, available, open_lines):
+        """Builds and factorises the model for one topology"""
+        n_states = self.n_buses + self.n_lines
+        meters = np.flatnonzero(available)
+
+        # Voltage rows, current rows and one row per open line
+        h_voltage = sp.csr_matrix((np.ones(len(meters)), (np.arange(len(meters)), self.meter_bus[meters])),
+                                  shape=(len(meters), n_states))
+        h_current = sp.csr_matrix((np.ones(len(meters)),
+                                   (np.arange(len(meters)), self.n_buses + self.meter_line[meters])),
+                                  shape=(len(meters), n_states))
+        open_lines = np.asarray(open_lines, dtype=np.int64)
+        h_open = sp.csr_matrix((np.ones(len(open_lines)), (np.arange(len(open_lines)), self.n_buses + open_lines)),
+                               shape=(len(open_lines), n_states))
+        h = sp.vstack([h_voltage, h_current, h_open, self.__kcl]).tocsc()
+
+        weights = np.concatenate([
+            np.full(len(meters), 1 / self.__sigma_voltage ** 2),
+            np.full(len(meters), 1 / self.__sigma_current ** 2),
+            np.full(len(open_lines) + self.__kcl.shape[0], self.__kcl_weight),
+        ])
+        w = sp.diags(weights)
+
+        # A tiny regularisation keeps unobservable states (e.g. buses without meters) from making G singular
+        gain = (h.T @ w @ h + sp.identity(n_states) * 1e-9).tocsc()
+        lu = spla.splu(gain)
+
+        # Residual variances: diag(R - H G^-1 H^T). Only the meter rows are needed.
+        n_rows = 2 * len(meters)
+        h_meters = h[:n_rows].toarray()
+        projected = lu.solve(h_meters.T)
+        variance = 1 / weights[:n_rows] - np.einsum('ij,ji->i', h_meters, projected)
+
+        return {"meters": meters, "h": h, "w": weights, "lu": lu, "variance": variance,
+                "n_pseudo": len(open_lines) + self.__kcl.shape[0]}
+
+    def __get_model(self, available, open_lines):
+        key = (available.tobytes(), tuple(open_lines))
+        model = self.__cache.get(key)
+        if model is None:
+            model = self.__model(available, open_lines)
+            self.__cache[key] = model
+            if len(self.__cache) > self.__cache_size:
+                self.__cache.popitem(last=False)
+        else:
+            self.__cache.move_to_end(key)
+        return model
+
+    def estimate(self, voltage_pu, current, available, open_lines=()):
+        """
+            Estimates the state for one snapshot.
+            voltage_pu/current: measurement of each meter, available: bool mask of usable meters
+            Returns (state, normalised residuals of the voltage measurements, of the current measurements), the
+            residuals as arrays over all meters (NaN where not available or not redundant).
+        """
+        model = self.__get_model(np.asarray(available, dtype=bool), sorted(open_lines))
+        meters = model["meters"]
+
+        z = np.concatenate([voltage_pu[meters], current[meters], np.zeros(model["n_pseudo"])])
+        h = model["h"]
+        state = model["lu"].solve(h.T @ (model["w"] * z))
+
+        n = len(meters)
+        residual = (z - h @ state)[:2 * n]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Measurements without redundancy (variance ~ 0) cannot be checked
+            variance = np.where(model["variance"] > 1e-12, model["variance"], np.nan)
+            normalised = np.abs(residual) / np.sqrt(variance)
+
+        r_voltage = np.full(len(self.meter_bus), np.nan)
+        r_current = np.full(len(self.meter_bus), np.nan)
+        r_voltage[meters] = normalised[:n]
+        r_current[meters] = normalised[n:]
+        return state, r_voltage, r_current
+
+    def bad_data(self, voltage_pu, current, available, open_lines=()):
+        """
+            Normalised residual test. A bad measurement also raises the residuals of the meters around it, so a meter
+            is only reported if its residual exceeds the threshold and is the largest among the meters at the same
+            bus and on the same line. Returns (indices of suspicious meters, largest normalised residual per meter).
+        """
+        _, r_voltage, r_current = self.estimate(voltage_pu, current, available, open_lines)
+        worst = np.fmax(r_voltage, r_current)
+        checked = np.nan_to_num(worst, nan=0.0)
+
+        bus_max = np.zeros(self.n_buses)
+        line_max = np.zeros(self.n_lines)
+        np.maximum.at(bus_max, self.meter_bus, checked)
+        np.maximum.at(line_max, self.meter_line, checked)
+
+        suspicious = (checked > self.threshold) & (checked >= bus_max[self.meter_bus]) & \
+                     (checked >= line_max[self.meter_line])
+        return np.flatnonzero(suspicious), worst
@@ -0,0 +1,129 @@
+import math
+import time
+
+import numpy as np
+
+# Metrics reported by the monitors in their UsageData
+METRICS = ("cpu_load", "memory_load", "cycle_time")
+
+# (resolution in seconds, number of buckets): 1 hour of seconds, 1 day of minutes, 30 days of hours
+TIERS = ((1, 3600), (60, 1440), (3600, 720))
+
+
+class TimeSeries:
+    """Fixed size ring buffer with one float32 column per metric"""
+
+    def __init__(self, resolution, capacity, metrics=METRICS):
+        self.resolution = resolution
+        self.timestamps = np.zeros(capacity, dtype=np.int64)
+        self.values = np.full((capacity, len(metrics)), np.nan, dtype=np.float32)
+        self.head = 0  # Next row to write
+        self.count = 0  # Number of valid rows
+
+    def append(self, timestamp, values) -> None:
+        self.timestamps[self.head] = timestamp
+        self.values[self.head] = values
+        self.head = (self.head + 1) % len(self.timestamps)
+        self.count = min(self.count + 1, len(self.timestamps))
+
+    def since(self, timestamp):
+        """Returns (timestamps, values) of all buckets later than timestamp in chronological order"""
+        order = np.arange(self.head - self.count, self.head) % len(self.timestamps)
+        timestamps = self.timestamps[order]
+        selected = timestamps > timestamp
+        return timestamps[selected], self.values[order][selected]
+
+
+class MonitorTelemetry:
+    """
+        Usage time series of one monitor in several resolutions.
+        Samples are averaged into the current bucket of each tier, a bucket is written to its ring buffer as soon as
+        the first sample of the next bucket arrives.
+    """
+
+    def __init__(self, monitor_type, tiers=TIERS, metrics=METRICS):
+        self.type = monitor_type
+        self.series = {resolution: TimeSeries(resolution, capacity, metrics) for resolution, capacity in tiers}
+        # Per tier: start of the current bucket, sum of the samples and number of samples per metric
+        self.__bucket = {resolution: None for resolution, _ in tiers}
+        self.__sums = {resolution: np.zeros(len(metrics)) for resolution, _ in tiers}
+        self.__counts = {resolution: np.zeros(len(metrics)) for resolution, _ in tiers}
+        self.latest = np.full(len(metrics), np.nan)
+
+    def add(self, timestamp, values) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        self.latest = values
+
+        for resolution, series in self.series.items():
+            bucket = int(timestamp // resolution) * resolution
+            if self.__bucket[resolution] != bucket:
+                self.__flush(resolution)
+                self.__bucket[resolution] = bucket
+            self.__sums[resolution][valid] += values[valid]
+            self.__counts[resolution][valid] += 1
+
+    def __flush(self, resolution) -> None:
+        if self.__bucket[resolution] is None:
+            return
+        counts = self.__counts[resolution]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(counts > 0, self.__sums[resolution] / counts, np.nan)
+        self.series[resolution].append(self.__bucket[resolution], mean)
+        self.__sums[resolution][:] = 0
+        counts[:] = 0
+
+
+class FleetTelemetry:
+    """Collects the usage data of all monitors known to the c2"""
+
+    def __init__(self, tiers=TIERS, metrics=METRICS):
+        self.tiers = tiers
+        self.metrics = metrics
+        self.__monitors = {}
+
+    def record(self, monitor_id, monitor_type, usage, timestamp=None) -> None:
+        """Adds a UsageData sample. Metrics a monitor does not report are stored as NaN."""
+        if timestamp is None:
+            timestamp = time.time()
+        monitor = self.__monitors.get(monitor_id)
+        if monitor is None:
+            monitor = self.__monitors[monitor_id] = MonitorTelemetry(monitor_type, self.tiers, self.metrics)
+
+        values = []
+        for metric in self.metrics:
+            value = getattr(usage, metric, None)
+            values.append(math.nan if value is None else value)
+        monitor.add(timestamp, values)
+
+    def forget(self, monitor_id) -> None:
+        self.__monitors.pop(monitor_id, None)
+
+    def query(self, resolution=1, since=0, monitor_ids=None) -> dict:
+        """
+            Returns all buckets of the given resolution later than since as json serializable dict:
+            {"type": "telemetry", "resolution", "monitors": {id: {"type", "latest", "timestamps", <metric>: [...]}}}
+        """
+        if resolution not in dict(self.tiers):
+            raise ValueError(f"Unknown resolution {resolution}. Available: {[r for r, _ in self.tiers]}")
+
+        result = {}
+        for monitor_id, monitor in self.__monitors.items():
+            if monitor_ids is not None and monitor_id not in monitor_ids:
+                continue
+            timestamps, values = monitor.series[resolution].since(since)
+            entry = {
+                "type": monitor.type,
+                "latest": dict(zip(self.metrics, to_json_list(monitor.latest))),
+                "timestamps": timestamps.tolist()
+            }
+            for i, metric in enumerate(self.metrics):
+                entry[metric] = to_json_list(values[:, i])
+            result[monitor_id] = entry
+
+        return {"type": "telemetry", "resolution": resolution, "monitors": result}
+
+
+def to_json_list(array) -> list:
+    """Converts a numpy array to a list, replacing NaN by None as json has no NaN"""
+    return [None if value != value else value for value in array.tolist()]
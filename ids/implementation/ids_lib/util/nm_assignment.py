@@ -0,0 +1,110 @@
+# Assignment of neighborhood monitors to local monitors based on the usage data reported by the monitors
+
+'''
+    Every LM is assigned a distinct NM which checks all border regions of that LM.
+    LMs with expensive border regions are assigned first and get the NMs with the least base load, i.e. the load an NM
+    has without the border regions of its current LM. The load caused by border regions moves with the LM, so moving an
+    LM only helps if the base loads differ: an LM keeps its current NM unless another NM's base load is lower by more
+    than the given threshold.
+'''
+
+
+def region_cost(region) -> int:
+    """Estimates the evaluation cost of a border region by the number of components that have to be checked."""
+    return len(region.get('meters', [])) + len(region.get('switches', [])) + len(region.get('power_lines', []))
+
+
+def nm_load(nm) -> float:
+    """Returns the last reported cpu load of an NM. NMs that have not reported yet count as idle."""
+    return nm.get('cpu_load') or 0.0
+
+
+def assigned_neighborhood_monitors(local_monitors) -> list:
+    """Returns the NMs currently assigned to an LM, spare NMs without an LM are left out"""
+    nms = []
+    for lm in local_monitors:
+        nm = lm.get('assigned_nm')
+        if nm is not None and all(nm is not other for other in nms):
+            nms.append(nm)
+    return nms
+
+
+def load_imbalance(local_monitors) -> float:
+    """Returns the difference between the most and the least loaded NM that is assigned to an LM"""
+    loads = [nm_load(nm) for nm in assigned_neighborhood_monitors(local_monitors)]
+    if len(loads) < 2:
+        return 0.0
+    return max(loads) - min(loads)
+
+
+def load_model(local_monitors, neighborhood_monitors, lm_costs):
+    """
+        Splits the load of the NMs into the load caused by the border regions of their LM and a base load.
+        The load per unit of cost is estimated from the assigned NM with the least load per cost, so that NM has no
+        base load and no base load is negative.
+        output: (load per unit of cost, {'<nm id>': <base load>})
+    """
+    cost_of = {}
+    for lm in local_monitors:
+        nm = lm.get('assigned_nm')
+        if nm is not None:
+            cost_of[nm['id']] = cost_of.get(nm['id'], 0) + lm_costs.get(lm['id'], 0)
+
+    rates = [nm_load(nm) / cost_of[nm['id']] for nm in neighborhood_monitors if cost_of.get(nm['id'])]
+    rate = min(rates) if rates else 0.0
+    base = {nm['id']: max(nm_load(nm) - rate * cost_of.get(nm['id'], 0), 0.0) for nm in neighborhood_monitors}
+    return rate, base
+
+
+def predicted_max_load(assignment, lm_costs, rate, base) -> float:
+    """Returns the expected load of the most loaded NM of an assignment {'<lm id>': <nm>}"""
+    loads = {}
+    for lm_id, nm in assignment.items():
+        loads[nm['id']] = loads.get(nm['id'], base.get(nm['id'], 0.0)) + rate * lm_costs.get(lm_id, 0)
+    return max(loads.values(), default=0.0)
+
+
+def assign_neighborhood_monitors(local_monitors, neighborhood_monitors, lm_costs, threshold, affinity=None):
+    """
+        input: local_monitors=[{'id', 'address', 'assigned_nm'},...], neighborhood_monitors=[{'id', 'address', ...}]
+               lm_costs={'<lm id>': <cost of all border regions of this lm>}, affinity={'<lm address>': '<nm address>'}
+        output: {'<lm id>': <nm>} with a distinct nm for each lm
+    """
+    if affinity is None:
+        affinity = {}
+
+    _, base = load_model(local_monitors, neighborhood_monitors, lm_costs)
+
+    def base_load(nm):
+        return base[nm['id']]
+
+    available = list(neighborhood_monitors)
+    assignment = {}
+
+    # Affinity hints from the configuration take precedence
+    for lm in local_monitors:
+        preferred = affinity.get(lm['address'])
+        for nm in available:
+            if nm['address'] == preferred:
+                assignment[lm['id']] = nm
+                available.remove(nm)
+                break
+
+    # Most expensive LMs choose first
+    remaining = [lm for lm in local_monitors if lm['id'] not in assignment]
+    remaining.sort(key=lambda lm: lm_costs.get(lm['id'], 0), reverse=True)
+
+    for lm in remaining:
+        least_loaded = min(available, key=base_load)
+        current = lm.get('assigned_nm')
+
+        # Stick to the current NM as long as its base load is not considerably higher than the best alternative
+        if current in available and base_load(current) - base_load(least_loaded) <= threshold:
+            chosen = current
+        else:
+            chosen = least_loaded
+
+        assignment[lm['id']] = chosen
+        available.remove(chosen)
+
+    return assignment
@@ -0,0 +1,68 @@
+# Partitioning of RTUs into federation regions based on the grid topology
+
+import json
+import math
+
+'''
+    input: configs=[{'id':'1', 'config':'<json>'},...], partitions=<number of regional c2s>
+    output: [['1', '3'], ['2', '4'], ...]
+
+    RTUs that share power lines end up in the same partition wherever possible, so only few border regions have
+    to be handled by the parent c2.
+'''
+
+
+def shared_power_lines(configs) -> dict:
+    """Returns the number of shared power lines for each pair of RTU ids that share at least one power line."""
+    # Index power lines by id so each pair of RTUs is only compared via their common lines
+    rtus_per_line = {}
+    for c in configs:
+        for line in json.loads(c['config'])['power_lines']:
+            rtus_per_line.setdefault(line['id'], []).append(c['id'])
+
+    weights = {}
+    for rtu_ids in rtus_per_line.values():
+        for i in range(len(rtu_ids)):
+            for j in range(i + 1, len(rtu_ids)):
+                pair = tuple(sorted((rtu_ids[i], rtu_ids[j])))
+                weights[pair] = weights.get(pair, 0) + 1
+    return weights
+
+
+def partition_rtus(configs, partitions) -> list:
+    """
+        Greedy agglomerative partitioning: starting with one partition per RTU, the two partitions sharing the most
+        power lines are merged until the requested number of partitions is reached. No partition grows beyond
+        ceil(#rtus / partitions) RTUs, so the load is spread evenly across the regional c2s.
+    """
+    ids = [c['id'] for c in configs]
+    if partitions <= 0:
+        raise ValueError("At least one partition is required")
+
+    max_size = math.ceil(len(ids) / partitions)
+    weights = shared_power_lines(configs)
+
+    member_of = {rtu_id: rtu_id for rtu_id in ids}
+    members = {rtu_id: [rtu_id] for rtu_id in ids}
+
+    while len(members) > partitions:
+        # Sum up the shared power lines between the current partitions
+        cut = {}
+        for (a, b), weight in weights.items():
+            pa, pb = member_of[a], member_of[b]
+            if pa != pb:
+                pair = tuple(sorted((pa, pb)))
+                cut[pair] = cut.get(pair, 0) + weight
+
+        candidates = [pair for pair in cut if len(members[pair[0]]) + len(members[pair[1]]) <= max_size]
+        if candidates:
+            keep, merge = max(candidates, key=lambda pair: cut[pair])
+        else:
+            # No connected partitions can be merged anymore, so merge the two smallest ones
+            keep, merge = sorted(members, key=lambda p: len(members[p]))[:2]
+
+        for rtu_id in members[merge]:
+            member_of[rtu_id] = keep
+        members[keep] += members.pop(merge)
+
+    return list(members.values())
@@ -8,7 +8,7 @@ Inheritates from the virtual_grid_region
 '''
 
 import json
-import asyncio
+import numpy as np
 from virtual_grid.virtual_components.power_line import power_line
 from virtual_grid.virtual_components.meter import meter
 from virtual_grid.virtual_components.switch import switch
@@ -28,6 +28,7 @@ class border_region(virtual_grid_region):
         self.__all_power_lines = []
         self.__all_switches = []
         self.__all_meters = []
+        self.__power_lines_by_id = {}  # Index built while loading the topology
 
         self.__name = name
         self.__config_file_name = topology
@@ -49,23 +50,16 @@ class border_region(virtual_grid_region):
         We added a tolerance range, because the simulation is not able to read and evaluate the given values as fast
         and as accurate as needed for a sensitive real-time system.
         '''
-        err = 0
-        for line in self.get_all_power_lines():
-            error = 0
-            for switch in line.get_assigned_switches():
-                if (switch.get_state()) == "False":
-                    for meter in line.get_assigned_meters():
-                        if meter.get_current():
-                            error = 1
-                            err += 1
-            
+        errors = self.lines_with_current_on_open_switch()
+        for i, line in enumerate(self.get_all_power_lines()):
+            error = int(errors[i])
             if error:
-                asyncio.run(self.report_violation(3, line))
-                
+                self.report_violation(3, line)
+
             if self.__detailed_print:
                 self.print_detailed_result(3, error, line)
         if not self.__detailed_print:
-            self.print_result(3, err)
+            self.print_result(3, int(errors.sum()))
 
     def check_req_4_neigh(self):
         '''
@@ -74,60 +68,42 @@ class border_region(virtual_grid_region):
         We added a tolerance range, because the simulation is not able to read and evaluate the given values as fast
         and as accurate as needed for a sensitive real-time system.
         '''
-        err = 0
-        for line in self.get_all_power_lines():
-            error = 0
-            if (line.get_assigned_meters()):
-
-                error_meter_voltage = []  # list(len(line.get_assigned_meters()))
-                error_meter_current = []  # list(len(line.get_assigned_meters()))
-
-                ref_current = round(float(line.get_assigned_meters()[0].get_current()), 2)
-                # rounding was added due to inaccuracy within the simulation, see the Evaluation Chapter for more details
-
-                ref_voltage = round(float(line.get_assigned_meters()[0].get_voltage()), 2)
-                # rounding was added due to inaccuracy within the simulation, see the Evaluation Chapter for more details
-
-                for meter in line.get_assigned_meters():
-                    # if round(float(meter.get_current()),2) != ref_current:
-                    if not (round(float(meter.get_current()), 2) >= ref_current - 0.05
-                            and round(float(meter.get_current()), 2) <= ref_current + 0.05):
-                        error_meter_current.append(meter.get_current())
-                        error = 1
-                        err += 1
-                    # deactivated due to inaccuracy within the simulation, see the Evaluation Chapter for more details
+        current_deviates, voltage_deviates = self.meters_deviating_on_line()
+        assigned = self.meter_line >= 0
+        errors = np.bincount(self.meter_line[assigned], weights=(current_deviates | voltage_deviates)[assigned],
+                             minlength=len(self.get_all_power_lines())) > 0
 
-                    #if round(float(meter.get_voltage()), 2) != ref_voltage:
-                    if not(round(float(meter.get_voltage()), 2) >= ref_voltage-0.05
-                            and round(float(meter.get_voltage()), 2) <= ref_voltage+0.05):
-
-                        error_meter_voltage.append(meter.get_voltage())
-                        error = 1
-                        err += 1
+        for i, line in enumerate(self.get_all_power_lines()):
+            error = int(errors[i])
             if error:
-                asyncio.run(self.report_violation(4, line))
-            
+                self.report_violation(4, line)
+
             if self.__detailed_print:
                 self.print_detailed_result(4, error, line)
 
-                if error_meter_current:
+                on_line = self.meter_line == i
+                reference = self.line_first_meter[i]
+                if current_deviates[on_line].any():
                     print("---- difference in current ----")
-                    for current in error_meter_current:
-                        print(str(current - ref_current) + " ampere")
+                    ref_current = round(float(self.current[reference]), 2)
+                    for current in self.current[on_line & current_deviates]:
+                        print(str(float(current) - ref_current) + " ampere")
 
-                if error_meter_voltage:
+                if voltage_deviates[on_line].any():
                     print("---- difference in voltage ----")
-                    for voltage in error_meter_voltage:
-                        print(str(voltage - ref_voltage) + " volts")
+                    ref_voltage = round(float(self.voltage[reference]), 2)
+                    for voltage in self.voltage[on_line & voltage_deviates]:
+                        print(str(float(voltage) - ref_voltage) + " volts")
 
         if not self.__detailed_print:
-            self.print_result(4, err)
+            self.print_result(4, int(current_deviates.sum() + voltage_deviates.sum()))
 
 
 # HELPER FUNCTIONS
 
     def load_topology(self):
         # loads the grid topology from the configuration files and creates the virtual representation of the border region
+        # components are resolved through an index of the power lines by id, so loading is linear in the region size
 
         with open(self.__config_file_name) as json_file:
             data = json.load(json_file)
@@ -138,47 +114,26 @@ class border_region(virtual_grid_region):
                                       power_line_['is_local'])
                 self.assign_power_line(new_line)
 
+            self.allocate_values(len(data['meters']), len(data['switches']))
+
             for switch_ in data['switches']:
                 # creation of switches
-                line_ = []
-                for l in self.get_all_power_lines():
-                    if l.get_name() == switch_['power_line_id']:
-                        line_ = l
-                new_switch = switch(switch_['id'], switch_['bus_id'], line_)
+                line_ = self.__power_lines_by_id.get(switch_['power_line_id'], [])
+                new_switch = switch(switch_['id'], switch_['bus_id'], line_, self, len(self.get_all_switches()))
                 self.assign_switch(new_switch)
+                if line_:
+                    line_.attach_switch(new_switch)
 
             for meter_ in data['meters']:
                 # creation of meters
-                line_ = []
-                for l in self.get_all_power_lines():
-                    if l.get_name() == meter_['power_line_id']:
-                        line_ = l
+                line_ = self.__power_lines_by_id.get(meter_['power_line_id'], [])
                 new_meter = meter(meter_['id'], meter_['bus_id'], line_,
-                                  meter_['s_current'], meter_['s_voltage'])
+                                  meter_['s_current'], meter_['s_voltage'], self, len(self.get_all_meters()))
                 self.assign_meter(new_meter)
+                if line_:
+                    line_.attach_meter(new_meter)
 
-            for line in self.get_all_power_lines():
-                for m in self.get_all_meters():
-                    if m.get_assinged_power_line() == line:
-                        line.attach_meter(m)
-                for s in self.get_all_switches():
-                    if s.get_assinged_power_line() == line:
-                        line.attach_switch(s)
-
-    def update_values(self, switches, meter_voltage, meter_current):
-        '''
-        Takes three arrays of data updates (switches, meter_voltage and meter_current) in order
-        and updates the values of the grid components
-        '''
-        i = 0
-        for switch in self.get_all_switches():
-            switch.update_state(switches[i])
-            i += 1
-        i = 0
-        for meter in self.get_all_meters():
-            meter.update_voltage(meter_voltage[i])
-            meter.update_current(meter_current[i])
-            i += 1
+            self.index_topology(self.get_all_power_lines(), self.get_all_switches(), self.get_all_meters())
 
     def assign_power_line(self, new_power_line):
         '''
@@ -186,6 +141,7 @@ class border_region(virtual_grid_region):
         '''
         if not new_power_line.is_local():
             self.__all_power_lines.append(new_power_line)
+            self.__power_lines_by_id[new_power_line.get_name()] = new_power_line
         else:
             raise ValueError(
                 "Tried to assign local power line to border region.")
@@ -8,7 +8,7 @@ Inheritates from the virtual_grid_region
 '''
 
 import json
-import asyncio
+import numpy as np
 from virtual_grid.virtual_components.power_line import power_line
 from virtual_grid.virtual_components.switch import switch
 from virtual_grid.virtual_components.meter import meter
@@ -30,6 +30,11 @@ class subgrid(virtual_grid_region):
         self.__all_buses = []
         self.__all_power_lines = []
 
+        # Indexes built while loading the topology
+        self.__power_lines_by_id = {}
+        self.__buses_by_id = {}
+        self.__meter_index = {}  # (power line id, bus id) -> first meter attached to both
+
         pass
 
     def check_local_requirements(self):
@@ -54,86 +59,58 @@ class subgrid(virtual_grid_region):
         REQ 1L: All buses have to have the same value for current incoming and outgoing
         (sum of incoming lines and sum of outgoing lines is calculated)
         '''
+        n_buses = len(self.get_all_buses())
+        sums_incoming = np.bincount(self.__bus_incoming[0], weights=self.current[self.__bus_incoming[1]],
+                                    minlength=n_buses)
+        sums_outgoing = np.bincount(self.__bus_outgoing[0], weights=self.current[self.__bus_outgoing[1]],
+                                    minlength=n_buses)
 
-        err = 0
-        for bus in self.get_all_buses():
-            error = 0
-            sum_current_incoming = 0
-            sum_current_outgoing = 0
-
-            for line in bus.get_incoming_lines():
-                meter = self.find_meter(line, bus)
-                if meter:
-                    sum_current_incoming += meter.get_current()
-
-            for line in bus.get_outgoing_lines():
-                meter = self.find_meter(line, bus)
-                if meter:
-                    sum_current_outgoing += meter.get_current()
-
-            #TODO The tolerance range is way too big (50 ampere) but it's the only way it's working with the live simulation
-            incoming_tolerance = [sum_current_incoming-0.05, sum_current_incoming+0.05]
-            outgoing_tolerance = [sum_current_outgoing-0.05, sum_current_outgoing+0.05]
-
-            #if sum_incoming_current is not within the tolerance range of sum_current_outgoing and vice versa an error will be registered
-            if not ((sum_current_incoming >= outgoing_tolerance[0] and sum_current_incoming <= outgoing_tolerance[1])
-                     or (sum_current_outgoing >= incoming_tolerance[0] and sum_current_outgoing <= incoming_tolerance[1])):
-                error = 1
-                err += 1
+        #TODO The tolerance range is way too big (50 ampere) but it's the only way it's working with the live simulation
+        #if sum_incoming_current is not within the tolerance range of sum_current_outgoing and vice versa an error will be registered
+        errors = ~(((sums_incoming >= sums_outgoing - 0.05) & (sums_incoming <= sums_outgoing + 0.05))
+                   | ((sums_outgoing >= sums_incoming - 0.05) & (sums_outgoing <= sums_incoming + 0.05)))
 
+        for i, bus in enumerate(self.get_all_buses()):
+            error = int(errors[i])
             if error:
-                asyncio.run(self.report_violation(1, bus))
-                
+                self.report_violation(1, bus)
+
             if self.__detailed_print:
                 self.print_detailed_result(1, error, bus)
                 if error:
                     print("---- incoming current ----")
-                    print(sum_current_incoming)
+                    print(float(sums_incoming[i]))
                     print("---- outgoing current ---")
-                    print(sum_current_outgoing)
+                    print(float(sums_outgoing[i]))
 
         if not self.__detailed_print:
-            self.print_result(1, err)
-
+            self.print_result(1, int(errors.sum()))
 
     def check_req_2(self):
         '''
         Function to check, if requirement 2L is violated
         REQ 2: All voltages measured by all meters of one bus are equal
         '''
-        err = 0
-        for bus in self.get_all_buses():
-            error = 0
-
-            if self.find_meter(bus.get_incoming_lines()[0], bus):
-                ref_voltage = round(
-                    float((self.find_meter(bus.get_incoming_lines()[0],
-                                           bus)).get_voltage()), 2
-                )  # rounding was added due to inaccuracy within the simulation, see the Evaluation Chapter for more details
-
-                for line in bus.get_incoming_lines():
-                    meter = self.find_meter(line, bus)
-                    if meter:
-                        if round(float(meter.get_voltage()), 2) != ref_voltage:
-                            error = 1
-                            err += 1
+        # rounding was added due to inaccuracy within the simulation, see the Evaluation Chapter for more details
+        rounded = np.round(self.voltage, 2)
+        has_reference = self.__bus_reference >= 0
+        ref_voltages = np.where(has_reference, rounded[self.__bus_reference], np.nan)
 
-                for line in bus.get_outgoing_lines():
-                    meter = self.find_meter(line, bus)
-                    if meter:
-                        if round(float(meter.get_voltage()), 2) != ref_voltage:
-                            error = 1
-                            err += 1
+        buses, meters = self.__bus_meters
+        mismatches = np.bincount(buses, weights=has_reference[buses] & (rounded[meters] != ref_voltages[buses]),
+                                 minlength=len(self.get_all_buses()))
 
+        for i, bus in enumerate(self.get_all_buses()):
+            error = int(mismatches[i] > 0)
             if error != 0:
-                asyncio.run(self.report_violation(2, bus))
-            
+                self.report_violation(2, bus)
+
             if self.__detailed_print:
                 self.print_detailed_result(2, error, bus)
                 if error!=0:
-                    print("---- Reference voltage was " + str(ref_voltage) + " volts, but " + bus.get_name() + " measured a different value. ----")
+                    print("---- Reference voltage was " + str(float(ref_voltages[i])) + " volts, but " + bus.get_name() + " measured a different value. ----")
         if not self.__detailed_print:
-            self.print_result(2, err)
+            self.print_result(2, int(mismatches.sum()))
 
     def check_req_3_loc(self):
         '''
@@ -142,24 +119,16 @@ class subgrid(virtual_grid_region):
         because there shouldnt be any curren to measure.
         (is only executed on local powerlines as REQ 3N is checked by the neighbourhood monitor)
         '''
-        err = 0
-        for line in self.get_all_power_lines():
-            error = 0
-            if line.is_local():
-                for switch in line.get_assigned_switches():
-                    if (switch.get_state()) == "False":
-                        for meter in line.get_assigned_meters():
-                            if meter.get_current():
-                                error = 1
-                                err += 1
-                                
+        errors = self.lines_with_current_on_open_switch() & self.__local_lines
+        for i, line in enumerate(self.get_all_power_lines()):
+            error = int(errors[i])
             if error and (line.is_local() == 1):
-                asyncio.run(self.report_violation(3, line))
-                
+                self.report_violation(3, line)
+
             if self.__detailed_print and (line.is_local() == 1):
                 self.print_detailed_result(3, error, line)
         if not self.__detailed_print:
-            self.print_result(3, err)
+            self.print_result(3, int(errors.sum()))
 
     def check_req_4_loc(self):
         '''
@@ -167,59 +136,45 @@ class subgrid(virtual_grid_region):
         REQ 4L: All meters of a power line measure the same current and voltage throughout the powerline
         (is only executed on local powerlines as REQ 3N is checked by the neighbourhood monitor)
         '''
-        err = 0
-        for line in self.get_all_power_lines():
-            error = 0
-            if line.is_local():
-                if (line.get_assigned_meters()):
-                    error_meter_voltage = [] #list(len(line.get_assigned_meters()))
-                    error_meter_current = [] #list(len(line.get_assigned_meters()))
-
-                    ref_current = round(
-                    float(line.get_assigned_meters()[0].get_current()), 2)
-                    # deactivated due to inaccuracy within the simulation, see the Evaluation Chapter for more details
-
-                    ref_voltage = round(
-                        float(line.get_assigned_meters()[0].get_voltage()), 2)
-
-                    for meter in line.get_assigned_meters():
-                        #if round(float(meter.get_current()), 2) != ref_current:
-                        #error = 1
-                        #err += 1
-                        if not (round(float(meter.get_current()), 2) >= ref_current - 0.05
-                                and round(float(meter.get_current()), 2) <= ref_current + 0.05):
-
-                            error_meter_current.append(meter.get_current())
-                            error = 1
-                            err += 1
-                        # deactivated due to inaccuracy within the simulation, see the Evaluation Chapter for more details
-
-                        # if the meter voltage is not in the tolerance range of 0.5 volts of the ref_voltage, then an error is thrown
-                        if not(round(float(meter.get_voltage()), 2) >= ref_voltage-0.05
-                                and round(float(meter.get_voltage()), 2) <= ref_voltage+0.05):
-
-                            error_meter_voltage.append(meter.get_voltage())
-                            error = 1
-                            err += 1
-            
+        current_deviates, voltage_deviates = self.meters_deviating_on_line()
+        local_meters = (self.meter_line >= 0) & self.__local_lines[self.meter_line]
+        current_deviates &= local_meters
+        voltage_deviates &= local_meters
+        n_lines = len(self.get_all_power_lines())
+        assigned = self.meter_line >= 0
+        errors = np.bincount(self.meter_line[assigned],
+                             weights=(current_deviates | voltage_deviates)[assigned], minlength=n_lines) > 0
+
+        for i, line in enumerate(self.get_all_power_lines()):
+            error = int(errors[i])
             if error and (line.is_local() == 1):
-                asyncio.run(self.report_violation(4, line))
-            
+                self.report_violation(4, line)
+
             if self.__detailed_print and (line.is_local() == 1):
                 self.print_detailed_result(4, error, line)
                 if error:
-                    if error_meter_current:
-                        print("---- difference in current ----")
-                        for current in error_meter_current:
-                            print(str(current - ref_current) + " ampere")
-
-                    if error_meter_voltage:
-                        print( "---- difference in voltage ----")
-                        for voltage in error_meter_voltage:
-                            print(str(voltage - ref_voltage) + " volts")
+                    self.__print_line_deviations(i, current_deviates, voltage_deviates)
 
         if not self.__detailed_print:
-            self.print_result(4, err)
+            self.print_result(4, int(current_deviates.sum() + voltage_deviates.sum()))
+
+    def __print_line_deviations(self, line_index, current_deviates, voltage_deviates):
+        '''
+        Prints the difference of each deviating meter of a power line to the first meter of the line
+        '''
+        on_line = self.meter_line == line_index
+        reference = self.line_first_meter[line_index]
+        if current_deviates[on_line].any():
+            print("---- difference in current ----")
+            ref_current = round(float(self.current[reference]), 2)
+            for current in self.current[on_line & current_deviates]:
+                print(str(float(current) - ref_current) + " ampere")
+
+        if voltage_deviates[on_line].any():
+            print( "---- difference in voltage ----")
+            ref_voltage = round(float(self.voltage[reference]), 2)
+            for voltage in self.voltage[on_line & voltage_deviates]:
+                print(str(float(voltage) - ref_voltage) + " volts")
 
     def check_req_7(self):
         '''
@@ -227,20 +182,16 @@ class subgrid(virtual_grid_region):
         REQ 7L: All meters should report a current that is equal or smaller than the amount of current that exceeds
         the safety threshold (it could be considered one of the most important requirements)
         '''
-        err = 0
-        for meter in self.get_all_meters():
-            error = 0
-            if float(meter.get_current()) >= float(meter.get_s_current()):
-                error = 1
-                err += 1
-            
+        errors = self.current >= self.s_current
+        for i, meter in enumerate(self.get_all_meters()):
+            error = int(errors[i])
             if error:
-                asyncio.run(self.report_violation(7, meter))
-                
+                self.report_violation(7, meter)
+
             if self.__detailed_print:
                 self.print_detailed_result(7, error, meter)
         if not self.__detailed_print:
-            self.print_result(7, err)
+            self.print_result(7, int(errors.sum()))
 
     def check_req_8(self):
         '''
@@ -248,27 +199,24 @@ class subgrid(virtual_grid_region):
         REQ 8L: All meters should report a voltage that is equal or smaller than the amount of voltage that exceeds
         the safety threshold (it could be considered one of the most important requirements)
         '''
-        err = 0
-        for meter in self.get_all_meters():
-            error = 0
-            if float(meter.get_voltage()) >= float(meter.get_s_voltage()):
-                error = 1
-                err += 1
-            
+        errors = self.voltage >= self.s_voltage
+        for i, meter in enumerate(self.get_all_meters()):
+            error = int(errors[i])
             if error:
-                asyncio.run(self.report_violation(8, meter))
-            
+                self.report_violation(8, meter)
+
             if self.__detailed_print:
                 self.print_detailed_result(8, error, meter)
         if not self.__detailed_print:
-            self.print_result(8, err)
+            self.print_result(8, int(errors.sum()))
 
 
 # HELPER FUNCTIONS
 
     def load_topology(self):
         '''
-        Loads the grid topology from the configuration files and creates the virtual representation of the grid
+        Loads the grid topology from the configuration files and creates the virtual representation of the grid.
+        Components are resolved through indexes by id, so loading is linear in the size of the grid.
         '''
         with open(self.__config_file_name) as json_file:
             data = json.load(json_file)
@@ -278,6 +226,8 @@ class subgrid(virtual_grid_region):
                                       power_line_['v_ref'],
                                       power_line_['is_local'])
                 self.assign_power_line(new_line)
+            # Position of each power line, the lines of a bus keep the order of the config
+            line_positions = {line.get_name(): i for i, line in enumerate(self.get_all_power_lines())}
 
             for bus_ in data['buses']:
                 # creation of buses
@@ -285,90 +235,82 @@ class subgrid(virtual_grid_region):
 
                 # TODO: Maybe change all ids to id and make them all arrays even if its only an element,
                 #  might reduce confusion
-                for line in self.get_all_power_lines():
-
-                    if 'id' in bus_['power_lines_in']:
-                        if line.get_name() == str(
-                                bus_['power_lines_in']['id']):
-                            new_bus.add_inc(line)
-                            continue
-                    elif 'ids' in bus_['power_lines_in']:
-                        for elem in bus_['power_lines_in']['ids']:
-                            if line.get_name() == str(elem):
-                                new_bus.add_inc(line)
-                                continue
-
-                for line in self.get_all_power_lines():
-                    if 'id' in bus_['power_lines_out']:
-                        if line.get_name() == str(
-                                bus_['power_lines_out']['id']):
-                            new_bus.add_outg(line)
-                            continue
-                    elif 'ids' in bus_['power_lines_out']:
-                        for elem in bus_['power_lines_out']['ids']:
-                            if line.get_name() == str(elem):
-                                new_bus.add_outg(line)
-                                continue
+                for line in self.__resolve_lines(bus_['power_lines_in'], line_positions):
+                    new_bus.add_inc(line)
+                for line in self.__resolve_lines(bus_['power_lines_out'], line_positions):
+                    new_bus.add_outg(line)
 
                 self.assign_bus(new_bus)
 
+            self.allocate_values(len(data['meters']), len(data['switches']))
+
             for switch_ in data['switches']:
                 # creation of switches
-                for b in self.get_all_buses():
-                    if b.get_name() == switch_['bus_id']:
-                        bus_ = b
-                line_ = []
-                for l in self.get_all_power_lines():
-                    if l.get_name() == switch_['power_line_id']:
-                        line_ = l
-                new_switch = switch(switch_['id'], bus_, line_)
+                bus_ = self.__buses_by_id.get(switch_['bus_id'], [])
+                line_ = self.__power_lines_by_id.get(switch_['power_line_id'], [])
+                new_switch = switch(switch_['id'], bus_, line_, self, len(self.get_all_switches()))
                 self.assign_switch(new_switch)
+                if line_:
+                    line_.attach_switch(new_switch)
 
             for meter_ in data['meters']:
                 # creation of meters
-                bus_ = []
-                for b in self.get_all_buses():
-                    if b.get_name() == meter_['bus_id']:
-                        bus_ = b
-                line_ = []
-                for l in self.get_all_power_lines():
-                    if l.get_name() == meter_['power_line_id']:
-                        line_ = l
+                bus_ = self.__buses_by_id.get(meter_['bus_id'], [])
+                line_ = self.__power_lines_by_id.get(meter_['power_line_id'], [])
                 new_meter = meter(meter_['id'], bus_, line_,
-                                  meter_['s_current'], meter_['s_voltage'])
+                                  meter_['s_current'], meter_['s_voltage'], self, len(self.get_all_meters()))
                 self.assign_meter(new_meter)
-
-            for line in self.get_all_power_lines():
-                for m in self.get_all_meters():
-                    if m.get_assinged_power_line() == line:
-                        line.attach_meter(m)
-                for s in self.get_all_switches():
-                    if s.get_assinged_power_line() == line:
-                        line.attach_switch(s)
-
-    def update_values(self, switches, meter_voltage, meter_current):
-        '''
-        Takes three arrays of data updates (switches, meter_voltage and meter_current) in order
-        and updates the values of the grid components
-        '''
-        i = 0
-        for switch in self.get_all_switches():
-            switch.update_state(switches[i])
-            i += 1
-        i = 0
-        for meter in self.get_all_meters():
-            meter.update_voltage(meter_voltage[i])
-            meter.update_current(meter_current[i])
-            i += 1
+                if line_:
+                    line_.attach_meter(new_meter)
+                    if bus_:
+                        # Only the first meter of a (line, bus) pair is used by the requirements
+                        self.__meter_index.setdefault((line_.get_name(), bus_.get_name()), new_meter)
+
+            self.index_topology(self.get_all_power_lines(), self.get_all_switches(), self.get_all_meters())
+            self.__index_buses()
+
+    def __index_buses(self):
+        '''
+        Compiles the meters of each bus into index arrays: (bus positions, meter positions) of the incoming and of the
+        outgoing lines (REQ 1), of all lines (REQ 2) and the reference meter of each bus (first incoming line, REQ 2)
+        '''
+        meter_positions = {id(m): i for i, m in enumerate(self.get_all_meters())}
+        incoming, outgoing = ([], []), ([], [])
+        self.__bus_reference = np.full(len(self.get_all_buses()), -1, dtype=np.int64)
+        for i, bus in enumerate(self.get_all_buses()):
+            for lines, entries in ((bus.get_incoming_lines(), incoming), (bus.get_outgoing_lines(), outgoing)):
+                for line in lines:
+                    meter = self.find_meter(line, bus)
+                    if meter:
+                        entries[0].append(i)
+                        entries[1].append(meter_positions[id(meter)])
+            if bus.get_incoming_lines() and self.find_meter(bus.get_incoming_lines()[0], bus):
+                self.__bus_reference[i] = meter_positions[id(self.find_meter(bus.get_incoming_lines()[0], bus))]
+
+        self.__bus_incoming = (np.array(incoming[0], dtype=np.int64), np.array(incoming[1], dtype=np.int64))
+        self.__bus_outgoing = (np.array(outgoing[0], dtype=np.int64), np.array(outgoing[1], dtype=np.int64))
+        self.__bus_meters = (np.concatenate(self.__bus_incoming[0:1] + self.__bus_outgoing[0:1]),
+                             np.concatenate(self.__bus_incoming[1:] + self.__bus_outgoing[1:]))
+        self.__local_lines = np.array([line.is_local() == 1 for line in self.get_all_power_lines()], dtype=bool)
+
+    def __resolve_lines(self, power_lines, line_positions):
+        '''
+        Returns the power lines referenced by a bus ({'id': ...} or {'ids': [...]}) in the order of the config
+        '''
+        if 'id' in power_lines:
+            ids = [power_lines['id']]
+        elif 'ids' in power_lines:
+            ids = power_lines['ids']
+        else:
+            ids = []
+        positions = sorted({line_positions[str(elem)] for elem in ids if str(elem) in line_positions})
+        return [self.get_all_power_lines()[i] for i in positions]
 
     def find_meter(self, line, bus):
         '''
-        Finds all meters which are attached to 'line' as well as to 'bus'
+        Finds the first meter which is attached to 'line' as well as to 'bus'
         '''
-        for meter in self.get_all_meters():
-            if meter.get_assinged_power_line() is line:
-                if meter.get_assigned_bus() is bus:
-                    return meter
+        return self.__meter_index.get((line.get_name(), bus.get_name()))
 
     def print_subgrid_values(self):
         '''
@@ -408,6 +350,7 @@ class subgrid(virtual_grid_region):
         adds 'new_bus' to the array of buses in the grid
         '''
         self.get_all_buses().append(new_bus)
+        self.__buses_by_id[new_bus.get_name()] = new_bus
 
     def get_all_meters(self):
         '''
@@ -432,3 +375,4 @@ class subgrid(virtual_grid_region):
         adds 'new_power_line' to the array of power lines in the grid
         '''
         self.get_all_power_lines().append(new_power_line)
+        self.__power_lines_by_id[new_power_line.get_name()] = new_power_line
@@ -0,0 +1,99 @@
+# violation_reporter.py
+'''
+Violation reporter
+Sends the violations found by the virtual grid regions to the websocket of the c2 over one long-lived connection
+'''
+import asyncio
+import json
+import queue
+import threading
+import time
+
+import websockets
+
+
+class violation_reporter():
+    '''
+    Reports are appended to a bounded queue without blocking the check loops. A background thread with its own event
+    loop keeps one websocket connection open and sends the queued reports as JSON arrays. If the connection fails it
+    is reopened with exponential backoff, reports queued in the meantime are kept as long as the queue has space.
+    '''
+    def __init__(self, url="ws://websocket:8777", queue_size=1024, batch_size=64, max_backoff=30):
+        self.url = url
+        self.batch_size = batch_size  # Maximum number of reports sent in one message
+        self.max_backoff = max_backoff  # Maximum seconds between two connection attempts
+        self.dropped = 0  # Reports dropped because the queue was full
+
+        self.__queue = queue.Queue(maxsize=queue_size)
+        self.__thread = None
+        self.__lock = threading.Lock()
+
+    def report(self, req, component_id):
+        '''
+        Queues a report, starts the background connection on first use. Never blocks, drops the report if the queue
+        is full.
+        '''
+        self.__start()
+        report = {"type": "report", "timestamp": int(time.time()), "requirement": req, "component_id": component_id}
+        try:
+            self.__queue.put_nowait(report)
+        except queue.Full:
+            self.dropped += 1
+
+    def __start(self):
+        if self.__thread is not None:
+            return
+        with self.__lock:
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=lambda: asyncio.run(self.__run()), daemon=True,
+                                                 name="violation_reporter")
+                self.__thread.start()
+
+    def __next_batch(self, timeout):
+        '''
+        Waits up to 'timeout' seconds for the first report and takes all reports queued until then (up to batch_size)
+        '''
+        try:
+            batch = [self.__queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.__queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    async def __run(self):
+        backoff = 1
+        pending = []  # Batch that could not be sent yet
+        while True:
+            try:
+                async with websockets.connect(self.url) as websocket:
+                    backoff = 1
+                    while True:
+                        if not pending:
+                            # queue.Queue blocks, so wait for reports in the default executor
+                            pending = await asyncio.get_event_loop().run_in_executor(None, self.__next_batch, 1.0)
+                            if not pending:
+                                # Keeps a broken connection from going unnoticed while idle
+                                await websocket.ping()
+                                continue
+                        await websocket.send(json.dumps(pending))
+                        pending = []
+            except Exception:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+
+_reporter = None
+
+
+def get_reporter():
+    '''
+    Returns the reporter shared by all regions of this process
+    '''
+    global _reporter
+    if _reporter is None:
+        _reporter = violation_reporter()
+    return _reporter
@@ -14,6 +14,8 @@ class bus(component):
     '''
     A virtual bus between various powerlines that can be observed and checked in the monitoring system
     '''
+    __slots__ = ('__incoming_lines', '__outgoing_lines')
+
     def __init__(self, name, inc, outg):
         super().__init__(name)
 
@@ -11,6 +11,8 @@ class component():
     '''
     Component super class
     '''
+    __slots__ = ('id',)
+
     def __init__(self, name):
         self.id = name
         pass
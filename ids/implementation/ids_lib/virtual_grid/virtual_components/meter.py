@@ -14,8 +14,11 @@ class meter(component):
     Virtual meter in the monitoring system.
     A meter is assigned/attached to a bus and a powerline and is given a security threshold for measuring the
     current (s_current) and voltage (s_voltage).
+    The measured values are stored in the columns of the region (region.current / region.voltage at 'index').
     '''
-    def __init__(self, name, bus, power_line, s_current, s_voltage):
+    __slots__ = ('__assigned_bus', '__assigned_power_line', '__s_current', '__s_voltage', '__region', '__index')
+
+    def __init__(self, name, bus, power_line, s_current, s_voltage, region, index):
         super().__init__(name)
         self.__assigned_bus = bus
         self.__assigned_power_line = power_line
@@ -23,17 +26,17 @@ class meter(component):
         self.__s_current = s_current
         self.__s_voltage = s_voltage
 
-        self.__voltage = 0
-        self.__current = 0
+        self.__region = region
+        self.__index = index
         pass
 
     def update_current(self, new_current):
         '''Set the current of the meter to new_current'''
-        self.__current = new_current
+        self.__region.current[self.__index] = new_current
 
     def update_voltage(self, new_voltage):
         '''Set the voltage of the meter to new_voltage'''
-        self.__voltage = new_voltage
+        self.__region.voltage[self.__index] = new_voltage
 
     def get_s_current(self):
         '''Returns the set point current for the meter'''
@@ -45,11 +48,11 @@ class meter(component):
 
     def get_current(self):
         '''Returns the current current'''
-        return self.__current
+        return float(self.__region.current[self.__index])
 
     def get_voltage(self):
         '''Returns the current voltage'''
-        return self.__voltage
+        return float(self.__region.voltage[self.__index])
 
     def get_assigned_bus(self):
         '''Returns the bus, that the meter is attached to'''
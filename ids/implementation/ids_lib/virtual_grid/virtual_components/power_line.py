@@ -16,6 +16,8 @@ class power_line(component):
     if the powerline is only local or if it crosses another region and therefore is in a border region (is_local)
     Also it is assigned various meters and switches
     '''
+    __slots__ = ('__i_max', '__v_ref', '__is_local', '__assigned_meters', '__assigned_switches')
+
     def __init__(self, name, i_max, v_ref, is_local):
         super().__init__(name)
         self.__i_max = i_max
@@ -9,6 +9,7 @@ import virtual_grid.virtual_components.power_line
 import virtual_grid.virtual_components.bus
 
 from virtual_grid.virtual_components.component import component
+from virtual_grid.virtual_grid_region import closed_states
 
 
 class switch(component):
@@ -16,22 +17,25 @@ class switch(component):
     Virtual respresentaion of switches.
     Switches carry a name and are assigned/attached to a bus and a powerline.
     The state is a value that can be set to 0, which means it's open and any other number, to close it.
-    TODO: Might be better to use a bool here instead of number? I mean there are only two states for a switch anyway.
+    The state is stored as a boolean (True = closed) in the column region.switch_closed at 'index'.
     '''
-    def __init__(self, name, bus, power_line):
+    __slots__ = ('__assigned_bus', '__assigned_power_line', '__region', '__index')
+
+    def __init__(self, name, bus, power_line, region, index):
         super().__init__(name)
         self.__assigned_bus = bus
         self.__assigned_power_line = power_line
-        self.__state = 0
+        self.__region = region
+        self.__index = index
         pass
 
     def update_state(self, new_state):
         '''Sets the state of the switch to 'new_state'''
-        self.__state = new_state
+        self.__region.switch_closed[self.__index] = closed_states([new_state])[0]
 
     def get_state(self):
-        '''Returns the current state of the switch'''
-        return self.__state
+        '''Returns the current state of the switch (True = closed)'''
+        return bool(self.__region.switch_closed[self.__index])
 
     def get_assigned_bus(self):
         '''Returns the bus, that the switch is assigned to'''
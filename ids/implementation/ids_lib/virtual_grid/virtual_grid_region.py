@@ -5,25 +5,92 @@
 virtual_grid_region
 This class is the base class for all virtual representation of an electrical grid region within the monitoring system. 
 '''
-import time
-import asyncio
-import websockets
-import json
+import numpy as np
 from termcolor import colored, cprint
 
+from virtual_grid.violation_reporter import get_reporter
+
+
+def closed_states(states):
+    '''
+    Converts switch states into booleans (True = closed). A state is open if it is 0, False or "False".
+    '''
+    states = np.asarray(states)
+    if states.dtype.kind in 'US':
+        return states != "False"
+    return states.astype(bool)
+
 
 class virtual_grid_region():
-    def __init__(self, name, topology, scope):
+    def __init__(self, name, topology, scope, reporter=None):
         self.id = name
         self.__config_file_name = topology
         self.__scope_name = scope
+        self.__reporter = reporter if reporter is not None else get_reporter()
+
+    def allocate_values(self, n_meters, n_switches):
+        '''
+        Creates the columnar value store of the region: one entry per meter and switch, indexed by the position of
+        the component. Meters and switches are views on these columns.
+        '''
+        self.voltage = np.zeros(n_meters)
+        self.current = np.zeros(n_meters)
+        self.switch_closed = np.zeros(n_switches, dtype=bool)
+
+    def index_topology(self, power_lines, switches, meters):
+        '''
+        Compiles the assignment of meters and switches to power lines into index arrays for the column based checks.
+        Components that are not assigned to a power line of the region get the line index -1.
+        '''
+        line_positions = {id(line): i for i, line in enumerate(power_lines)}
+        self.meter_line = np.array([line_positions.get(id(m.get_assinged_power_line()), -1) for m in meters],
+                                   dtype=np.int64)
+        self.switch_line = np.array([line_positions.get(id(s.get_assinged_power_line()), -1) for s in switches],
+                                    dtype=np.int64)
+        self.s_current = np.array([float(m.get_s_current()) for m in meters])
+        self.s_voltage = np.array([float(m.get_s_voltage()) for m in meters])
+        # First meter of each power line (-1 if the line has no meter), the reference of requirement 4
+        self.line_first_meter = np.full(len(power_lines), -1, dtype=np.int64)
+        for i in reversed(range(len(meters))):
+            if self.meter_line[i] >= 0:
+                self.line_first_meter[self.meter_line[i]] = i
+        self.__n_lines = len(power_lines)
 
-    def update_values(self):
+    def update_values(self, switches, meter_voltage, meter_current):
         '''
-        Stud and reminder that every virtual region needs to realize one 'update_values' function to update
-        the values of every of their components
+        Takes three arrays of data updates (switches, meter_voltage and meter_current) in the order of the components
+        and writes them into the value columns
         '''
-        pass
+        self.switch_closed[:] = closed_states(switches)
+        self.voltage[:] = np.asarray(meter_voltage, dtype=np.float64)
+        self.current[:] = np.asarray(meter_current, dtype=np.float64)
+
+    def lines_with_current_on_open_switch(self):
+        '''
+        Returns a boolean array over the power lines: True if the line has an open switch and a meter measuring current
+        '''
+        assigned_switches = self.switch_line >= 0
+        assigned_meters = self.meter_line >= 0
+        open_switches = np.bincount(self.switch_line[assigned_switches],
+                                    weights=~self.switch_closed[assigned_switches], minlength=self.__n_lines)
+        with_current = np.bincount(self.meter_line[assigned_meters],
+                                   weights=self.current[assigned_meters] != 0, minlength=self.__n_lines)
+        return (open_switches > 0) & (with_current > 0)
+
+    def meters_deviating_on_line(self, tolerance=0.05):
+        '''
+        Compares the rounded current and voltage of every meter with the first meter of its power line.
+        Returns (current deviates, voltage deviates) as boolean arrays over the meters.
+        rounding was added due to inaccuracy within the simulation, see the Evaluation Chapter for more details
+        '''
+        assigned = self.meter_line >= 0
+        reference = self.line_first_meter[np.where(assigned, self.meter_line, 0)]
+        deviations = []
+        for values in (self.current, self.voltage):
+            rounded = np.round(values, 2)
+            ref = rounded[reference]
+            deviations.append(assigned & ~((rounded >= ref - tolerance) & (rounded <= ref + tolerance)))
+        return deviations[0], deviations[1]
 
     def print_result(self, req, err):
         '''
@@ -50,11 +117,8 @@ class virtual_grid_region():
             cprint("REQ " + str(req) + " " + str(self.__scope_name) +
                 "  OK for " + str(component.get_name()), 'green')
     
-    async def report_violation(self, req, component):
-        try:
-            async with websockets.connect("ws://websocket:8777") as websocket:
-                print('connected to websoc')
-                report = { "type": "report", "timestamp": int(time.time()), "requirement": req, "component_id": component.id }
-                await websocket.send(json.dumps(report))
-        except Exception:
-            pass
\ No newline at end of file
+    def report_violation(self, req, component):
+        '''
+        Queues a violation report for the c2, the report is sent in the background (see violation_reporter)
+        '''
+        self.__reporter.report(req, component.id)
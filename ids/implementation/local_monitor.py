@@ -20,6 +20,21 @@ def run_lm():
     config.private_key_password = os.getenv('IDS_PRIVATE_KEY_PASSWORD')
     config.rtu_modbus_host = os.getenv('IDS_RTU_MODBUS_HOST')
     config.rtu_modbus_port = os.getenv('IDS_RTU_MODBUS_PORT')
+    generation_register = os.getenv('IDS_RTU_GENERATION_REGISTER')
+    config.rtu_generation_register = int(generation_register) if generation_register else None
+    config.rules_file = os.getenv('IDS_RULES_FILE', config.rules_file)
+    # Format: <requirement>=<seconds>,<requirement>=<seconds>,...
+    config.req_periods = {int(req): float(period) for req, period in
+                          (pair.split('=', 1) for pair in os.getenv('IDS_REQ_PERIODS', '').split(',') if pair)}
+    config.cycle_budget = float(os.getenv('IDS_CYCLE_BUDGET', config.cycle_budget))
+    config.baseline_detection = os.getenv('IDS_BASELINE_DETECTION', 'false').lower() in ('1', 'true')
+    config.baseline_cusum_threshold = float(os.getenv('IDS_BASELINE_CUSUM_THRESHOLD', config.baseline_cusum_threshold))
+    config.baseline_max_run = int(os.getenv('IDS_BASELINE_MAX_RUN', config.baseline_max_run))
+    config.baseline_warmup = int(os.getenv('IDS_BASELINE_WARMUP', config.baseline_warmup))
+    config.baseline_noise_floor_current = float(os.getenv('IDS_BASELINE_NOISE_FLOOR_CURRENT',
+                                                          config.baseline_noise_floor_current))
+    config.baseline_noise_floor_voltage = float(os.getenv('IDS_BASELINE_NOISE_FLOOR_VOLTAGE',
+                                                          config.baseline_noise_floor_voltage))
 
     with open(os.getenv('IDS_RTU_CONFIG_FILE'), 'r') as file:
         config.rtu_config = file.read()
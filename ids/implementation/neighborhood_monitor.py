@@ -18,6 +18,7 @@ def run_nm():
     config.cert = os.getenv('IDS_CERT')
     config.private_key = os.getenv('IDS_PRIVATE_KEY')
     config.private_key_password = os.getenv('IDS_PRIVATE_KEY_PASSWORD')
+    config.rules_file = os.getenv('IDS_RULES_FILE', config.rules_file)
 
     # Run monitor forever
     asyncio.run(opc_neighborhood_monitor.main(config))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The tests import ids_lib like the entry scripts in this directory do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,26 @@
+import numpy as np
+
+from ids_lib.baseline_detector import BaselineDetector
+
+
+def alarms(currents, voltage=10500.0):
+    detector = BaselineDetector(1)
+    count = 0
+    for current in currents:
+        drift, smooth = detector.update(np.array([[current], [voltage]]))
+        count += drift.sum() + smooth.sum()
+    return count
+
+
+def test_load_steps_pass():
+    # Piecewise constant readings like from Modbus: load levels around 100 A, held for 10 to 60 readings
+    rng = np.random.default_rng(0)
+    currents = []
+    while len(currents) < 600:
+        currents += [100 + rng.uniform(-5, 5)] * int(rng.integers(10, 60))
+    assert alarms(currents[:600]) == 0
+
+
+def test_ramp_is_reported():
+    currents = [100.0] * 100 + [100 + 0.1 * k for k in range(300)]
+    assert alarms(currents) > 0
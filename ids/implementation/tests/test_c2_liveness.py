@@ -0,0 +1,35 @@
+import asyncio
+import logging
+
+from ids_lib import opc_c2server
+from ids_lib.config.config_c2 import C2Config
+
+
+def test_failed_removal_keeps_watching(monkeypatch):
+    monkeypatch.setattr(opc_c2server, "logger", logging.getLogger(__name__), raising=False)
+    config = C2Config()
+    config.lm_suspect_after = 0.01
+    config.lm_dead_after = 0.02
+    config.liveness_check_interval = 0.01
+    config.global_check_interval = 0
+    c2 = opc_c2server.C2(config)
+    tracker = c2._C2__liveness_tracker
+
+    removed = []
+
+    async def delete_monitor(monitor_id):
+        removed.append(monitor_id)
+        raise ConnectionError("LM connection is dead")
+    c2.delete_monitor = delete_monitor
+
+    async def scenario():
+        task = asyncio.ensure_future(c2.watch_liveness())
+        tracker.watch("lm_1", "LM")
+        await asyncio.sleep(0.1)
+        tracker.watch("lm_2", "LM")
+        await asyncio.sleep(0.1)
+        assert not task.done()
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert removed == ["lm_1", "lm_2"]
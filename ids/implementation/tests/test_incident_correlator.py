@@ -0,0 +1,19 @@
+import time
+
+from ids_lib.incident_correlator import ComponentGraph, IncidentCorrelator
+
+
+def test_query_closes_incidents_without_new_reports():
+    correlator = IncidentCorrelator(ComponentGraph(), window=10)
+    correlator.add({"timestamp": int(time.time()) - 60, "requirement": 7, "component_id": "meter_1"})
+
+    incidents = correlator.incidents_since(0)
+    assert [i['open'] for i in incidents] == [False]
+
+
+def test_recent_incident_stays_open():
+    correlator = IncidentCorrelator(ComponentGraph(), window=10)
+    correlator.add({"timestamp": int(time.time()), "requirement": 7, "component_id": "meter_1"})
+
+    incidents = correlator.incidents_since(0)
+    assert [i['open'] for i in incidents] == [True]
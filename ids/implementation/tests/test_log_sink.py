@@ -0,0 +1,26 @@
+from ids_lib.log_sink import LogSink
+
+
+def record(severity, message):
+    return {"time": "", "source": "LM", "uuid": "lm_1", "severity": severity, "message": message}
+
+
+def run_sink(sink, records):
+    sink.start()
+    for r in records:
+        sink.submit(r)
+    sink.stop()
+
+
+def test_tail_prints_all_lines_by_default(capsys):
+    run_sink(LogSink(flush_interval=0.01), [record("INFO", "line {}".format(i)) for i in range(100)])
+    out = capsys.readouterr().out
+    assert out.count("[INFO]") == 100
+
+
+def test_rate_limited_tail_keeps_errors(capsys):
+    records = [record("INFO", "line {}".format(i)) for i in range(100)] + [record("ERROR", "no heartbeat")]
+    run_sink(LogSink(tail_rate=1, flush_interval=0.01), records)
+    out = capsys.readouterr().out
+    assert "no heartbeat" in out
+    assert "log lines not shown" in out
@@ -0,0 +1,39 @@
+from ids_lib.util.nm_assignment import assign_neighborhood_monitors, load_imbalance, load_model, predicted_max_load
+
+
+def monitors(loads, costs):
+    nms = [{'id': "nm_{}".format(i), 'address': "nm_{}".format(i), 'cpu_load': load} for i, load in enumerate(loads)]
+    lms = [{'id': "lm_{}".format(i), 'address': "lm_{}".format(i), 'assigned_nm': nms[i]} for i in range(len(costs))]
+    lm_costs = {lm['id']: cost for lm, cost in zip(lms, costs)}
+    return lms, nms, lm_costs
+
+
+def rebalance(lms, nms, lm_costs, threshold=25):
+    rate, base = load_model(lms, nms, lm_costs)
+    current = {lm['id']: lm['assigned_nm'] for lm in lms}
+    proposed = assign_neighborhood_monitors(lms, nms, lm_costs, threshold)
+    return proposed, predicted_max_load(proposed, lm_costs, rate, base), predicted_max_load(current, lm_costs, rate,
+                                                                                            base)
+
+
+def test_spare_nm_does_not_count():
+    # nm_2 has no LM
+    lms, nms, _ = monitors([40, 30, 0], [10, 8])
+    assert load_imbalance(lms) == 10
+
+
+def test_load_of_regions_is_not_moved_back_and_forth():
+    # The load of nm_0 comes from the expensive border regions of lm_0, moving them only moves the load
+    lms, nms, lm_costs = monitors([40, 10, 0], [10, 2])
+    assert load_imbalance(lms) > 25
+    proposed, proposed_max, current_max = rebalance(lms, nms, lm_costs)
+    assert proposed == {lm['id']: lm['assigned_nm'] for lm in lms}
+    assert not proposed_max < current_max
+
+
+def test_base_load_is_rebalanced():
+    # nm_0 is busy with something else, the border regions of both LMs cost the same
+    lms, nms, lm_costs = monitors([80, 10, 5], [10, 10])
+    proposed, proposed_max, current_max = rebalance(lms, nms, lm_costs)
+    assert proposed['lm_0'] is not nms[0] and proposed['lm_1'] is not nms[0]
+    assert proposed_max < current_max
@@ -0,0 +1,38 @@
+import json
+import logging
+import queue
+from types import SimpleNamespace
+
+from ids_lib.req_checker_global import ReqCheckerGlobal
+
+
+def req_5_of_bus(zero_injection):
+    # Current enters b1 on l0 and leaves on l1, the difference is injected at b1 unless it is a zero injection bus
+    rtu = {'buses': [{'id': "b1", 'power_lines_in': {'id': "l0"}, 'power_lines_out': {'id': "l1"},
+                      'zero_injection': zero_injection}],
+           'power_lines': [{'id': "l0", 'v_ref': 10500}, {'id': "l1", 'v_ref': 10500}],
+           'meters': [{'id': "m0", 'power_line_id': "l0", 'bus_id': "b1"},
+                      {'id': "m1", 'power_line_id': "l1", 'bus_id': "b1"}],
+           'switches': []}
+    violations = queue.SimpleQueue()
+    checker = ReqCheckerGlobal(violations, logging.getLogger(__name__))
+    checker.set_local_monitors([{'id': "lm_0", 'rtu_config': json.dumps(rtu)}])
+    meters = [SimpleNamespace(id="m0", current=3.0, voltage=10500.0),
+              SimpleNamespace(id="m1", current=5.0, voltage=10500.0)]
+    checker.update("lm_0", SimpleNamespace(ts=0.0, meters=meters, switches=[]), 0.0)
+    checker.check_requirements()
+
+    req_5 = []
+    while not violations.empty():
+        violation = violations.get_nowait()
+        if violation['req_id'] == 5:
+            req_5.append(violation['component_id'])
+    return req_5
+
+
+def test_unbalanced_zero_injection_grid_is_reported():
+    assert req_5_of_bus(True) == ["grid"]
+
+
+def test_injection_inside_grid_is_not_reported():
+    assert req_5_of_bus(False) == []
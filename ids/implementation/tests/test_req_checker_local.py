@@ -0,0 +1,36 @@
+import json
+import logging
+import os
+import queue
+from types import SimpleNamespace
+
+from ids_lib.req_checker_local import ReqCheckerLocal
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "contrib", "development_configs")
+
+
+def shipped_checker():
+    with open(os.path.join(CONFIG_DIR, "rtu_0.json")) as in_stream:
+        rtu_config = json.load(in_stream)
+    violations = queue.SimpleQueue()
+    return rtu_config, violations, ReqCheckerLocal(rtu_config, violations, logging.getLogger(__name__))
+
+
+def test_meter_within_thresholds_passes():
+    rtu_config, violations, checker = shipped_checker()
+    for m in rtu_config["meters"]:
+        meter = SimpleNamespace(id=m["id"], current=0.0, voltage=0.0)
+        assert not checker.check_meter_thresholds(meter)
+
+
+def test_meter_above_threshold_is_reported():
+    rtu_config, violations, checker = shipped_checker()
+    m = rtu_config["meters"][-1]
+    meter = SimpleNamespace(id=m["id"], current=float(m["s_current"]) + 1, voltage=0.0)
+    found = checker.check_meter_thresholds(meter)
+    assert [(rule.id, component_id) for rule, component_id, _ in found] == [(7, m["id"])]
+    # Nothing is queued until the reading is accepted
+    assert violations.empty()
+    checker.report_thresholds(found)
+    assert violations.get_nowait() == {"req_id": 7, "component_id": m["id"]}
+    assert violations.empty()
@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+import queue
+from types import SimpleNamespace
+
+import numpy as np
+
+from ids_lib.req_checker_global import ReqCheckerGlobal
+from ids_lib.state_estimator import StateEstimator
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "contrib", "development_configs")
+
+
+def chain_estimator():
+    # b0 -l0-> b1 -l1-> b2, b1 has neither load nor generation
+    # Meters: (bus, line) = l0 at b0 and b1, l1 at b1 and b2
+    return StateEstimator(3, 2, [0, 1, 1, 2], [0, 0, 1, 1], [([0], [1])])
+
+
+def test_consistent_chain_passes():
+    estimator = chain_estimator()
+    voltage = np.array([1.0, 0.999, 0.999, 0.998])
+    current = np.array([5.0, 5.0, 5.0, 5.0])
+    suspicious, residuals = estimator.bad_data(voltage, current, np.ones(4, dtype=bool))
+    assert len(suspicious) == 0
+    assert np.nanmax(residuals) < 1e-3
+
+
+def test_manipulated_meter_in_chain_is_reported():
+    estimator = chain_estimator()
+    voltage = np.array([1.0, 0.999, 0.999, 0.998])
+    current = np.array([5.0, 5.0, 5.0, 8.0])
+    suspicious, residuals = estimator.bad_data(voltage, current, np.ones(4, dtype=bool))
+    assert 3 in suspicious
+    assert np.nanargmax(residuals) == 3
+
+
+def shipped_monitors():
+    monitors = []
+    for i in (0, 1):
+        with open(os.path.join(CONFIG_DIR, "rtu_{}.json".format(i))) as in_stream:
+            monitors.append({'id': "lm_{}".format(i), 'rtu_config': in_stream.read()})
+    return monitors
+
+
+def consistent_snapshot(rtu_config, bus_voltage, line_current):
+    conf = json.loads(rtu_config)
+    meters = [SimpleNamespace(id=m['id'], current=line_current[m['power_line_id']], voltage=bus_voltage[m['bus_id']])
+              for m in conf['meters']]
+    switches = [SimpleNamespace(id=s['id'], value=[True]) for s in conf['switches']]
+    return SimpleNamespace(ts=0.0, meters=meters, switches=switches)
+
+
+def test_consistent_shipped_grid_passes():
+    monitors = shipped_monitors()
+    violations = queue.SimpleQueue()
+    checker = ReqCheckerGlobal(violations, logging.getLogger(__name__), state_estimation=True)
+    checker.set_local_monitors(monitors)
+
+    rtus = [json.loads(lm['rtu_config']) for lm in monitors]
+    buses = sorted({m['bus_id'] for rtu in rtus for m in rtu['meters']})
+    lines = sorted({m['power_line_id'] for rtu in rtus for m in rtu['meters']})
+    # Every meter on a line / at a bus agrees, the currents differ between lines (loads at the buses)
+    bus_voltage = {bus: 10500 * (1 - 1e-4 * i) for i, bus in enumerate(buses)}
+    line_current = {line: 0.01 * (i + 1) for i, line in enumerate(lines)}
+    for lm, rtu in zip(monitors, rtus):
+        checker.update(lm['id'], consistent_snapshot(lm['rtu_config'], bus_voltage, line_current), 0.0)
+    checker.check_requirements()
+
+    req_9 = []
+    while not violations.empty():
+        violation = violations.get_nowait()
+        if violation['req_id'] == 9:
+            req_9.append(violation['component_id'])
+    assert req_9 == []
+
+
+def split_chain_monitors():
+    # b0 -l0-> b1 -l1-> b2 split between two RTUs, l1 and b2 are only defined by the second one
+    rtu_a = {'buses': [{'id': "b0", 'power_lines_in': None, 'power_lines_out': {'id': "l0"}},
+                       {'id': "b1", 'power_lines_in': {'id': "l0"}, 'power_lines_out': {'id': "l1"},
+                        'zero_injection': True}],
+             'power_lines': [{'id': "l0", 'v_ref': 10500}],
+             'meters': [{'id': "m0", 'power_line_id': "l0", 'bus_id': "b0"},
+                        {'id': "m1", 'power_line_id': "l0", 'bus_id': "b1"}],
+             'switches': []}
+    rtu_b = {'buses': [{'id': "b2", 'power_lines_in': {'id': "l1"}, 'power_lines_out': None}],
+             'power_lines': [{'id': "l1", 'v_ref': 10500}],
+             'meters': [{'id': "m2", 'power_line_id': "l1", 'bus_id': "b1"},
+                        {'id': "m3", 'power_line_id': "l1", 'bus_id': "b2"}],
+             'switches': []}
+    return [{'id': "lm_a", 'rtu_config': json.dumps(rtu_a)}, {'id': "lm_b", 'rtu_config': json.dumps(rtu_b)}]
+
+
+def req_9_of_split_chain(monitors, manipulated=None):
+    violations = queue.SimpleQueue()
+    checker = ReqCheckerGlobal(violations, logging.getLogger(__name__), state_estimation=True)
+    checker.set_local_monitors(monitors)
+    bus_voltage = {"b0": 10500, "b1": 10490, "b2": 10480}
+    line_current = {"l0": 5.0, "l1": 5.0}
+    for lm in monitors:
+        snapshot = consistent_snapshot(lm['rtu_config'], bus_voltage, line_current)
+        for meter in snapshot.meters:
+            if meter.id == manipulated:
+                meter.current = 8.0
+        checker.update(lm['id'], snapshot, 0.0)
+    checker.check_requirements()
+
+    req_9 = []
+    while not violations.empty():
+        violation = violations.get_nowait()
+        if violation['req_id'] == 9:
+            req_9.append(violation['component_id'])
+    return req_9
+
+
+def test_split_chain_does_not_depend_on_lm_order():
+    monitors = split_chain_monitors()
+    for order in (monitors, monitors[::-1]):
+        assert req_9_of_split_chain(order) == []
+        assert "m1" in req_9_of_split_chain(order, manipulated="m1")
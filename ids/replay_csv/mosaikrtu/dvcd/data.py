@@ -10,8 +10,11 @@ from pymodbus3.datastore import ModbusSlaveContext
 from pymodbus3.payload import BinaryPayloadBuilder
 from pymodbus3.payload import BinaryPayloadDecoder
 from pymodbus3.constants import Endian
+from operator import itemgetter
 
 import os
+import struct
+import threading
 
 # logging options
 import logging
@@ -40,20 +43,200 @@ class Objecttype(Enum):
     IR = "ir"
 
 
-class DataBlock(object):
+# struct formats of the register datatypes, a register is a big endian 16 bit word
+FORMATS = {
+    '16bit_int': 'h',
+    '16bit_uint': 'H',
+    '32bit_int': 'i',
+    '32bit_uint': 'I',
+    '64bit_int': 'q',
+    '64bit_uint': 'Q',
+    '32bit_float': 'f',
+    '64bit_float': 'd',
+    None: 'H',  # one raw register
+}
+
+
+class Snapshots(object):
+    """
+    The published contents of several BufferedBlocks. They are replaced together by one assignment, so a reader
+    always gets the blocks of the same step without taking a lock. Only writers are serialized.
     """
-    Chromik:
-    Not locked at the moment! =)
+    def __init__(self):
+        self.fronts = ()
+        self.lock = threading.Lock()
+
+    def add(self, front):
+        with self.lock:
+            self.fronts += (front,)
+            return len(self.fronts) - 1
+
 
-    Locking Datablock.
-    Can't be simultaniously read from and/or written to. Threads beyond the first would get in line.
+class BufferedBlock(ModbusSequentialDataBlock):
     """
+    Sequential block backed by a bytearray, so that adjacent addresses can be encoded with a single struct.pack_into
+    (see RegisterLayout).
+    The simulation writes to 'buffer', Modbus clients read the immutable snapshot published by DataBlock.publish, so
+    they never see a partially written step. Writes through set_values (Modbus clients, DataBlock.set) go to both
+    and are visible right away.
+    """
+    width = None  # Bytes per address
+    item = None  # struct format of one address
 
-    def __init__(self):
-        self.di = ModbusSequentialDataBlock(0x00, [0] * 0xFF)
-        self.co = ModbusSequentialDataBlock(0x00, [0] * 0xFF)
-        self.hr = ModbusSequentialDataBlock(0x00, [0] * 0xFF)
-        self.ir = ModbusSequentialDataBlock(0x00, [0] * 0xFF)
+    def __init__(self, address, count, snapshots=None):
+        self.address = address
+        self.buffer = bytearray(self.width * count)
+        self.default_value = 0
+        self.snapshots = snapshots or Snapshots()
+        self.slot = self.snapshots.add(bytes(self.buffer))
+
+    @property
+    def front(self):
+        return self.snapshots.fronts[self.slot]
+
+    @property
+    def values(self):
+        return list(struct.unpack('>%d%s' % (len(self.buffer) // self.width, self.item), self.front))
+
+    @values.setter
+    def values(self, values):
+        self.set_values(self.address, list(values))
+
+    def validate(self, address, count=1):
+        return self.address <= address and self.address + len(self.buffer) // self.width >= address + count
+
+    def get_values(self, address, count=1):
+        return list(struct.unpack_from('>%d%s' % (count, self.item), self.front, self.width * (address - self.address)))
+
+    def set_values(self, address, values):
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        fmt = '>%d%s' % (len(values), self.item)
+        offset = self.width * (address - self.address)
+        with self.snapshots.lock:
+            struct.pack_into(fmt, self.buffer, offset, *values)
+            front = bytearray(self.snapshots.fronts[self.slot])
+            struct.pack_into(fmt, front, offset, *values)
+            fronts = list(self.snapshots.fronts)
+            fronts[self.slot] = bytes(front)
+            self.snapshots.fronts = tuple(fronts)
+
+
+class RegisterBlock(BufferedBlock):
+    """
+    Block of 16 bit registers (holding and input registers), stored as big endian words.
+    """
+    width = 2
+    item = 'H'
+
+
+class BitBlock(BufferedBlock):
+    """
+    Block of single bits (coils and discrete inputs), stored as one byte per bit.
+    """
+    width = 1
+    item = '?'
+
+
+class RegisterLayout(object):
+    """
+    A vector of registers resolved once to (block, offset, struct format). set_many/get_many encode/decode the whole
+    vector with one struct call per run of adjacent registers (one for a densely numbered block).
+    set_many writes to the simulation side of the blocks, the values are visible to Modbus clients after
+    DataBlock.publish. Create with DataBlock.layout.
+    """
+    def __init__(self, datablock, registers):
+        """
+        :param datablock: DataBlock holding the registers
+        :param registers: (type, address, datatype) of each value, datatype None is one raw register or bit like in
+                          DataBlock.get/set without datatype
+        """
+        self.size = len(registers)
+        entries = []  # (type, address, format, position in the vector)
+        for position, (_type, address, datatype) in enumerate(registers):
+            if _type in ("co", "di"):
+                if datatype not in (None, 'bool'):
+                    raise ValueError("Datatype {} of {}{} is not a bit".format(datatype, _type, address))
+                fmt = '?'
+            elif _type in ("hr", "ir"):
+                if datatype not in FORMATS:
+                    raise ValueError("Datatype {} of {}{} is not supported".format(datatype, _type, address))
+                fmt = FORMATS[datatype]
+            else:
+                raise ValueError("Unknown register type {}".format(_type))
+            # the blocks are addressed with an offset of one, see _set_hr
+            entries.append((_type, address + 1, fmt, position))
+
+        # Merge adjacent registers of a block into runs
+        runs = []
+        for _type, address, fmt, position in sorted(entries):
+            count = struct.calcsize('>' + fmt) // getattr(datablock, _type).width
+            run = runs[-1] if runs else None
+            if run is not None and run['type'] == _type and run['end'] > address:
+                raise ValueError("Register {}{} overlaps the previous register".format(_type, address - 1))
+            if run is None or run['type'] != _type or run['end'] != address:
+                run = {'type': _type, 'start': address, 'end': address, 'format': '>', 'positions': []}
+                runs.append(run)
+            run['end'] += count
+            run['format'] += fmt
+            run['positions'].append(position)
+
+        self._runs = []  # (buffer, byte offset, struct, getter of the run's values, positions)
+        for run in runs:
+            block = getattr(datablock, run['type'])
+            if not block.validate(run['start'], run['end'] - run['start']):
+                raise ValueError("Registers {}{}-{} are out of range".format(run['type'], run['start'] - 1,
+                                                                             run['end'] - 2))
+            positions = run['positions']
+            getter = itemgetter(*positions) if len(positions) > 1 else lambda values, p=positions[0]: (values[p],)
+            self._runs.append((block.buffer, block.width * (run['start'] - block.address), struct.Struct(run['format']),
+                               getter, positions))
+
+    def set_many(self, values):
+        """
+        Encodes values (one per register of the layout, in layout order) into the registers.
+        """
+        for buffer, offset, packer, getter, _ in self._runs:
+            packer.pack_into(buffer, offset, *getter(values))
+
+    def get_many(self):
+        """
+        Decodes all registers of the layout (including values set but not yet published), returns the values in
+        layout order.
+        """
+        values = [None] * self.size
+        for buffer, offset, packer, _, positions in self._runs:
+            for position, value in zip(positions, packer.unpack_from(buffer, offset)):
+                values[position] = value
+        return values
+
+
+class DataBlock(object):
+    """
+    Double buffered Datablock.
+    Values set by the simulation (set_many of a RegisterLayout) become visible to Modbus clients together when publish
+    is called, readers never lock and always see the registers of one published step. Values set with set (and by
+    Modbus clients) are visible right away.
+    Each publish increments the generation. If a generation register is configured, the generation is written to the
+    two holding registers at that index (32 bit unsigned, big endian), so clients can detect readings spanning two
+    steps. Writes of Modbus clients do not change the generation.
+    """
+
+    def __init__(self, generation_register=None):
+        """
+        :param generation_register: Index of the two holding registers the generation is published in.
+                                    None = not published
+        """
+        self.snapshots = Snapshots()
+        self.di = BitBlock(0x00, 0xFF, self.snapshots)
+        self.co = BitBlock(0x00, 0xFF, self.snapshots)
+        self.hr = RegisterBlock(0x00, 0xFF, self.snapshots)
+        self.ir = RegisterBlock(0x00, 0xFF, self.snapshots)
+
+        self.generation = 0  # Number of published steps
+        self.generation_register = generation_register  # Index of the holding registers holding the generation
+        if generation_register is not None:
+            self.layout([("hr", generation_register, '32bit_uint')])  # Validates the index
 
         self.store = ModbusSlaveContext(
             di=self.di,  # Single Bit, Read-Only
@@ -158,6 +341,27 @@ class DataBlock(object):
                 elif _type == Objecttype.IR:
                     self._set_ir(address, payload)
 
+    def publish(self):
+        """
+        Makes all values set since the last publish visible to Modbus clients at once and increments the generation.
+        """
+        blocks = (self.di, self.co, self.hr, self.ir)
+        with self.snapshots.lock:
+            self.generation = (self.generation + 1) & 0xFFFFFFFF
+            if self.generation_register is not None:
+                struct.pack_into('>I', self.hr.buffer, 2 * (self.generation_register + 1 - self.hr.address),
+                                 self.generation)
+            self.snapshots.fronts = tuple(bytes(block.buffer) for block in blocks)
+
+    def layout(self, registers):
+        """
+        Compiles a RegisterLayout for bulk access to registers.
+        :param registers: (type, address, datatype) of each value, e.g. the first three entries of the registers of
+                          an RTU configuration
+        :return: RegisterLayout with set_many/get_many
+        """
+        return RegisterLayout(self, registers)
+
     def _get_di(self, address, count):
         values = self.di.get_values(address + 1, count)
         return values
@@ -1,4 +1,6 @@
+import argparse
 import csv
+import os
 import time
 import pprint
 import logging
@@ -7,139 +9,168 @@ import logging.handlers
 # logging.basicConfig(level=logging.DEBUG)
 # logging.getLogger().addHandler(logging.StreamHandler())
 
-from mosaikrtu.rtu_model import create_server, create_cache, create_datablock, load_rtu
+from mosaikrtu.rtu_model import host_rtu, create_cache, create_datablock, load_rtu
+from mosaikrtu.dvcd.data import FORMATS
 
 
 # TODO: translate comments into english
 
-class Replay:
-
-    def __init__(self):
-        self.server = []
-        self.datablocks = []
-        self.configs = []
-        # self.caches = []
-        self.scenario_length = 21
-        self.scenario = []
-        self.amnt_switches = [1, 2]  # TODO: set automatically depending on config
-        self.amnt_sensors = [12, 13]  # TODO: set automatically depending on config
-
-    def load_scenario(self, x):
-        print("Lade Szenario")
-
-        # Konfiguration des Testbeds aus XML lesen
-        for i in [0, 1]:
-            self.configs.append(load_rtu("replay_csv/data/new_rtu_{}.xml".format(i)))
-
-        # CSV Dateien laden
-        for i in [0, 1]:
-            with open("replay_csv/data/scenario_{}_subgrid_{}.csv".format(x, i), "r") as csv_file:
-                csv_reader = csv.reader(csv_file, delimiter=";")
-                self.scenario.append([])
-
-                # skip header row
-                csv_reader.__next__()
-
-                # Daten Zeile für Zeile auslesen
-                # for j in range(self.scenario_length):
-                for row in csv_reader:
-                    self.scenario[i].append(row)
-                # try:
-                #    while 1:
-                #        self.scenario[i].append(csv_reader.__next__())
-                # except StopIteration:
-                #    pass
+DATA_DIR = "replay_csv/data"
+RTU_FILE = "new_rtu_{subgrid}.xml"  # Configuration XML of each subgrid
+CSV_FILE = "scenario_{scenario}_subgrid_{subgrid}.csv"  # Rows of each scenario and subgrid
+END_WAIT = 5  # Seconds the servers keep running after the last row
+SCENARIO_WAIT = 10  # Seconds between two scenarios
+
+
+def parse_value(value, datatype):
+    """Converts a CSV cell into the value written to a register of the given datatype"""
+    if datatype == 'bool':
+        return value == "True"
+    if FORMATS.get(datatype, 'd') in ('f', 'd'):
+        return float(value)
+    return int(float(value))
+
+
+class Subgrid:
+    """
+    One RTU of the replay: its configuration, datablock and CSV file. The rows are read lazily, the i-th non-empty cell
+    of a row is written to the i-th register of the configuration.
+    """
+
+    def __init__(self, rtu_file, csv_file):
+        self.config = load_rtu(rtu_file)
+        self.datablock = create_datablock(self.config)
+        self.csv_file = csv_file
+        self.registers = [register[:3] for register in self.config['registers'].values()]
+        self.datatypes = [register[2] for register in self.registers]
+        self.layouts = {}  # number of values -> RegisterLayout of the first registers
+
+    def layout(self, count):
+        # Register Layout der ersten <count> Register, wird pro Anzahl Werte nur einmal kompiliert
+        if count not in self.layouts:
+            self.layouts[count] = self.datablock.layout(self.registers[:count])
+        return self.layouts[count]
+
+    def rows(self):
+        """Yields (register layout, parsed values) per CSV row"""
+        with open(self.csv_file, "r") as csv_file:
+            csv_reader = csv.reader(csv_file, delimiter=";")
+            # skip header row
+            next(csv_reader)
+            for row in csv_reader:
+                # leere Zellen werden uebersprungen, die Werte fuellen die Register der Reihe nach
+                values = [value for value in row if value != ""]
+                yield self.layout(len(values)), [parse_value(value, datatype)
+                                                 for value, datatype in zip(values, self.datatypes)]
+
+    def apply(self, layout, values):
+        layout.set_many(values)
+        # Zeile fuer die Modbus Clients auf einmal sichtbar machen
+        self.datablock.publish()
 
-        # Cache erstellen
-        # for i in [0, 1]:
-        #    self.caches.append(create_cache(self.configs[i]))
 
-        # Datablock erstellen
-        for i in [0, 1]:
-            self.datablocks.append(create_datablock(self.configs[i]))
+class Replay:
 
-        # Modbus Server erstellen
-        for i in [0, 1]:
-            self.server.append(create_server(self.configs[i], self.datablocks[i]))
+    def __init__(self):
+        self.host = None  # ServerHost serving the datablocks of all RTUs
+        self.subgrids = []
 
-        print("Server erstellt")
+    def load_scenario(self, x, subgrids=2, data_dir=DATA_DIR, rtu_file=RTU_FILE, csv_file=CSV_FILE):
+        print("Lade Szenario")
 
-    def run_scenario(self, sleeptime):
+        # Konfiguration, Datablock und CSV Datei jedes Subgrids
+        for i in range(subgrids):
+            self.subgrids.append(Subgrid(os.path.join(data_dir, rtu_file.format(subgrid=i)),
+                                         os.path.join(data_dir, csv_file.format(scenario=x, subgrid=i))))
+
+    def run_scenario(self, sleeptime, speed=1.0):
+        """
+        Replays the rows of all subgrids, row n is applied at start + n * sleeptime / speed (monotonic clock), so the
+        period does not drift with the time needed for the writes. speed 0 replays as fast as possible.
+        :return: Dictionary with the rows replayed, the requested and achieved rate (rows per second) and the largest
+                 delay of a row behind its deadline
+        """
         print("Szenario wird gestartet")
 
-        # Modbus Server starten
-        for i in [0, 1]:
-            self.server[i].start()
-            # self.server[i].run()
-            print("Started server {}".format(i))
-
-        # debug prints
-        # for a in range(3):
-        #     print("----------------------------- \n")
-        # print('configs [%s]' % ', '.join(map(str, self.configs)))
-        # for a in range(3):
-        #     print("----------------------------- \n")
-        # print('scenario [%s]' % ', '.join(map(str, self.scenario)))
-        # for a in range(3):
-        #     print("----------------------------- \n")
-
-        # Modbus Server (synchron) im 2 Sekundentakt mit Daten aus CSV Datei aktualisieren
-        y = 0
-        while y < len(self.scenario[0]):
-            #print("Refreshing datasets")
-            # update values
-            for i in [0, 1]:
-                index_register = 0
-                for value in self.scenario[i][y]:
-                    if value != "":
-                        config_item = list(self.configs[i]['registers'].values())[index_register]
-
-                        # set register
-                        self.datablocks[i].set(
-                            config_item[0],
-                            config_item[1],
-                            value,
-                            config_item[2],
-                        )
-                        index_register += 1
-
-            # wait <sleeptime> seconds
-            time.sleep(sleeptime)
-
-            # increase "time" aka csv row index
-            y += 1
-
-        time.sleep(5)
+        # Modbus Server starten, ein ServerHost bedient alle RTUs
+        for subgrid in self.subgrids:
+            self.host = host_rtu(subgrid.config, subgrid.datablock)
+            print("Started server {}".format(subgrid.config["label"]))
+
+        # Modbus Server (synchron) im <sleeptime> Sekundentakt mit Daten aus den CSV Dateien aktualisieren
+        interval = sleeptime / speed if speed > 0 else 0.0
+        rows = 0
+        max_lateness = 0.0
+        start = time.monotonic()
+        # eine Zeile pro Subgrid, endet mit der kuerzesten CSV Datei
+        for y, row in enumerate(zip(*(subgrid.rows() for subgrid in self.subgrids))):
+            # wait until the deadline of csv row y
+            deadline = start + y * interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif interval > 0:
+                max_lateness = max(max_lateness, -delay)
+
+            # set registers
+            for subgrid, (layout, values) in zip(self.subgrids, row):
+                subgrid.apply(layout, values)
+            rows += 1
+
+        # the last row is kept for a full period as well
+        delay = start + rows * interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        elapsed = time.monotonic() - start
+
+        result = {
+            'rows': rows,
+            'requested_rate': 1 / interval if interval > 0 else float('inf'),
+            'achieved_rate': rows / elapsed if elapsed > 0 else float('inf'),
+            'max_lateness': max_lateness,
+        }
+        print("Replayed {} rows in {:.3f}s: {:.3f} rows/s (requested {:.3f} rows/s), max. {:.1f}ms behind".format(
+            rows, elapsed, result['achieved_rate'], result['requested_rate'], 1000 * max_lateness))
+
+        time.sleep(END_WAIT)
 
         print("No more data available, stopping server")
 
-        # Server wieder anhalten
-        for i in [0, 1]:
-            self.server[i].stop()
+        # Zaehler ausgeben und Server wieder anhalten
+        for label, counters in sorted(self.host.stats().items()):
+            print("{}: {}".format(label, counters))
+        self.host.stop()
 
         print("Servers stopped")
-
-
-if __name__ == '__main__':
-    for i in [1, 2, 3, 4]:
-        for j in [1, 3, 5]:
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay CSV scenarios through the Modbus servers of the RTUs")
+    parser.add_argument("--scenario", type=int, nargs="+", default=[1, 2, 3, 4], help="scenarios to replay")
+    parser.add_argument("--period", type=float, nargs="+", default=[1, 3, 5],
+                        help="seconds between two rows, each scenario is replayed with every period")
+    parser.add_argument("--speed", type=float, default=1.0, help="speed factor, 0 = as fast as possible")
+    parser.add_argument("--subgrids", type=int, default=2, help="number of subgrids (RTUs)")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="directory of the configuration and CSV files")
+    parser.add_argument("--rtu-file", default=RTU_FILE, help="configuration XML of a subgrid, {subgrid} is replaced")
+    parser.add_argument("--csv-file", default=CSV_FILE,
+                        help="CSV file of a scenario and subgrid, {scenario} and {subgrid} are replaced")
+    args = parser.parse_args()
+
+    for i in args.scenario:
+        for j in args.period:
             print("starting scenario {} mit time {}".format(i, j))
 
             replay = Replay()
-            replay.load_scenario(i)
-            replay.run_scenario(j)
+            replay.load_scenario(i, args.subgrids, args.data_dir, args.rtu_file, args.csv_file)
+            replay.run_scenario(j, args.speed)
 
             #TODO: aufgenommene Zeiten als csv in die Konsole printen
 
-
             print("finished scenario {}".format(i))
-            time.sleep(10)
+            time.sleep(SCENARIO_WAIT)
 
 
-            #csv dateien
-            # with open('Salary_Data.csv') as file:
-            #     content = file.readlines()
-            # header = content[:1]
-            # rows = content[1:]
-            # print(header)
-            # print(rows)
+if __name__ == '__main__':
+    main()